@@ -0,0 +1,4 @@
+# Author: RockMan
+# CreateTime: 2026/10/19
+# FileName: __init__
+# Description: This package contains the benchmark suite of the core analytics paths, run against synthetic data.
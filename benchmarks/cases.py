@@ -0,0 +1,111 @@
+# Author: RockMan
+# CreateTime: 2026/10/19
+# FileName: cases
+# Description: This module contains the benchmark cases of the core analytics paths.
+
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, List, Tuple
+
+from bond_tx import BondTx
+from fund_tx import Repo
+from utils.db_util import Constants as C, create_conn, _query, _query_arrow
+from utils.time_util import TimeUtil
+from utils.web_data import FundDataHandler, SecurityDataHandler, OverviewDataHandler
+
+
+def windows(moment: datetime = None) -> Tuple[Tuple[date, date], Tuple[date, date]]:
+    """
+    与页面默认值一致的统计区间。
+
+    Args:
+        moment (datetime, optional): 基准时间，默认为当前时间。
+
+    Returns:
+        Tuple[Tuple[date, date], Tuple[date, date]]: (上个月, 今年初至上月末)。
+    """
+
+    moment = moment if moment is not None else datetime.now()
+
+    _, last_month_start, last_month_end = TimeUtil.get_current_and_last_month_dates(moment)
+    this_year_start, _ = TimeUtil.get_current_and_last_year(moment)
+
+    return (last_month_start.date(), last_month_end.date()), (this_year_start.date(), last_month_end.date())
+
+
+def benchmark_cases(moment: datetime = None) -> List[Tuple[str, Callable[[], Any], Callable[[Any], Any]]]:
+    """
+    全部基准测试用例：
+        - 资金交易（正回购，上个月）：FundTx.daily_data, FundTx.groupby_column, FundDataHandler.get_monthly_summary
+          （今年初至上月末，与页面一致按交易区间直接计算）。
+        - 债券（今年初至上月末）：BondTx的构造函数（含查询），get_all_profit_data, _yield_cum_by（按债券代码），
+          cal_period_yield_cum（全部债券），SecurityDataHandler.get_monthly_summary。
+        - 业务总览：OverviewDataHandler.all_reports_yoy，今年和上一年的全部报告，不使用月度统计存储，
+          资金交易按交易区间直接计算。
+
+    Args:
+        moment (datetime, optional): 基准时间，默认为当前时间。
+
+    Returns:
+        List[Tuple[str, Callable[[], Any], Callable[[Any], Any]]]: (用例名, 准备函数, 被测函数)的列表，
+        准备函数不计入耗时，其返回值传给被测函数。
+    """
+
+    moment = moment if moment is not None else datetime.now()
+    (month_start, month_end), (year_start, year_end) = windows(moment)
+
+    def fund_handler():
+        handler = FundDataHandler(Repo(year_start, year_end))
+        handler.set_direction(C.REPO)
+        return handler
+
+    def security_handler():
+        return SecurityDataHandler(BondTx(year_start, year_end))
+
+    def yield_data():
+        handler = security_handler()
+        return handler, handler.daily_yield_all()
+
+    return [
+        ('FundTx.daily_data', lambda: Repo(month_start, month_end), lambda tx: tx.daily_data(4)),
+        ('FundTx.groupby_column', lambda: Repo(month_start, month_end),
+         lambda tx: [tx.groupby_column(column, 4) for column in [C.NAME, C.TERM_TYPE]]),
+        ('FundDataHandler.get_monthly_summary', fund_handler,
+         lambda handler: handler.get_monthly_summary(direct=True, moment=moment)),
+        ('SecurityTx.__init__', lambda: None, lambda _: BondTx(year_start, year_end)),
+        ('SecurityTx.get_all_profit_data', lambda: BondTx(year_start, year_end),
+         lambda tx: tx.get_all_profit_data()),
+        ('SecurityDataHandler._yield_cum_by', security_handler,
+         lambda handler: handler._yield_cum_by(year_start, year_end, C.BOND_CODE)),
+        ('SecurityDataHandler.cal_period_yield_cum', yield_data,
+         lambda args: SecurityDataHandler.cal_period_yield_cum(args[1], year_start, year_end)),
+        ('SecurityDataHandler.get_monthly_summary', security_handler,
+         lambda handler: handler.get_monthly_summary(moment)),
+        ('OverviewDataHandler.all_reports_yoy',
+         lambda: OverviewDataHandler(moment.year, direct_monthly=True, moment=moment),
+         lambda handler: handler.all_reports_yoy(max_workers=1)),
+    ]
+
+
+def fetch_cases(moment: datetime = None) -> List[Tuple[str, Callable[[], Any], Callable[[Any], Any]]]:
+    """
+    查询结果读取方式的用例：截至昨天一年的core_carrybondholds，分别用get_raw默认的逐行转换（_query）
+    和Arrow列式读取（_query_arrow）。直接查询数据库，不经过缓存，回放数据源不适用。
+
+    Args:
+        moment (datetime, optional): 基准时间，默认为当前时间。
+
+    Returns:
+        List[Tuple[str, Callable[[], Any], Callable[[Any], Any]]]: 同benchmark_cases。
+    """
+
+    moment = moment if moment is not None else datetime.now()
+    end = moment.date() - timedelta(days=1)
+
+    sql = f"select * from {C.COMP_DBNAME}.core_carrybondholds " \
+          f"where {C.CARRY_DATE} >= '{(end - timedelta(days=365)).strftime('%Y-%m-%d')}' " \
+          f"and {C.CARRY_DATE} <= '{end.strftime('%Y-%m-%d')}'"
+
+    return [
+        ('get_raw fetch (records)', create_conn, lambda conn: _query(conn, sql)),
+        ('get_raw fetch (arrow)', create_conn, lambda conn: _query_arrow(conn, sql)),
+    ]
@@ -0,0 +1,79 @@
+# Author: RockMan
+# CreateTime: 2026/10/19
+# FileName: compare
+# Description: This module compares two benchmark result files written by benchmarks.run.
+
+import argparse
+import json
+
+import pandas as pd
+
+
+def load(path: str) -> dict:
+    """
+    读取benchmarks.run写入的结果文件。
+    """
+
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(base: dict, new: dict) -> pd.DataFrame:
+    """
+    按(规模, 用例)比较两次结果的耗时和内存峰值，只比较两次都有的用例。
+
+    Args:
+        base (dict): 基准结果。
+        new (dict): 新结果。
+
+    Returns:
+        pd.DataFrame: 以(scale, case)为索引，[base_s, new_s, time_ratio, base_mb, new_mb, peak_ratio]，
+        比值为新结果 / 基准结果，大于1表示变慢或内存增加。
+    """
+
+    rows = []
+
+    for scale, data in new['scales'].items():
+        base_results = base['scales'].get(scale, {}).get('results', {})
+
+        for case, result in data['results'].items():
+            if case not in base_results:
+                continue
+
+            b = base_results[case]
+            rows.append({
+                'scale': scale,
+                'case': case,
+                'base_s': b['seconds'],
+                'new_s': result['seconds'],
+                'time_ratio': result['seconds'] / b['seconds'] if b['seconds'] else float('nan'),
+                'base_mb': b['peak_mb'],
+                'new_mb': result['peak_mb'],
+                'peak_ratio': result['peak_mb'] / b['peak_mb'] if b['peak_mb'] else float('nan'),
+            })
+
+    return pd.DataFrame(rows, columns=['scale', 'case', 'base_s', 'new_s', 'time_ratio', 'base_mb', 'new_mb',
+                                       'peak_ratio']).set_index(['scale', 'case'])
+
+
+if __name__ == '__main__':
+    # 比较两次基准测试结果，耗时或内存峰值超过基准threshold倍的用例标记为退化，有退化时返回1：
+    # python -m benchmarks.compare .fm_cache/benchmarks/a1b2c3d.json .fm_cache/benchmarks/e4f5a6b.json
+    parser = argparse.ArgumentParser(description='比较两次基准测试结果')
+    parser.add_argument('base', help='基准结果文件')
+    parser.add_argument('new', help='新结果文件')
+    parser.add_argument('--threshold', type=float, default=1.1, help='判定为退化的比值，默认为1.1')
+    args = parser.parse_args()
+
+    base_report, new_report = load(args.base), load(args.new)
+    result = compare(base_report, new_report)
+
+    result['regression'] = (result['time_ratio'] > args.threshold) | (result['peak_ratio'] > args.threshold)
+    result['regression'] = result['regression'].map({True: '!', False: ''})
+
+    print(f"base: {base_report['commit']} ({base_report['time']})  new: {new_report['commit']} ({new_report['time']})")
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', 200,
+                           'display.float_format', '{:.3f}'.format):
+        print(result)
+
+    raise SystemExit(1 if (result['regression'] == '!').any() else 0)
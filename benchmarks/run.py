@@ -0,0 +1,292 @@
+# Author: RockMan
+# CreateTime: 2026/10/19
+# FileName: run
+# Description: This module runs the benchmark cases at several data scales and writes the results as JSON.
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from utils.db_util import Constants as C
+
+# 项目根目录，子进程在此目录下执行
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 数据规模：回购（拆借同量）的交易笔数和债券数量
+SCALES = {
+    'small': {'trades': 10_000, 'bonds': 50, 'counterparties': 100},
+    'medium': {'trades': 100_000, 'bonds': 500, 'counterparties': 500},
+    'large': {'trades': 1_000_000, 'bonds': 2000, 'counterparties': 2000},
+}
+
+# 模拟数据和结果文件的目录
+BENCH_DIR = os.path.join(C.LOCAL_DIR, 'benchmarks')
+
+
+def commit_id() -> str:
+    """
+    当前代码的提交号，有未提交的修改时加'-dirty'。
+    """
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+    return f"{commit}-dirty" if dirty else commit
+
+
+def prepare_data(scale: str, seed: int = 0, regenerate: bool = False) -> str:
+    """
+    生成指定规模的模拟数据，参数和截止日不变时复用已生成的数据。
+
+    Args:
+        scale (str): 数据规模，SCALES的键。
+        seed (int, optional): 随机数种子，默认为0。
+        regenerate (bool, optional): 是否强制重新生成，默认为False。
+
+    Returns:
+        str: 模拟数据目录，作为FM_DATA_MIRROR_DIR。
+    """
+
+    from utils.synthetic import SyntheticData
+
+    params = SCALES[scale]
+    path = os.path.join(BENCH_DIR, 'data', f"{scale}-{seed}")
+    meta_file = os.path.join(path, 'meta.json')
+
+    data = SyntheticData(params['bonds'], 1, params['counterparties'], years=2, seed=seed)
+    data.trades_per_day = max(1, round(params['trades'] / len(data.days)))
+    meta = {**params, 'seed': seed, 'end': data.end.strftime('%Y-%m-%d'), 'trades_per_day': data.trades_per_day}
+
+    if not regenerate:
+        try:
+            with open(meta_file, encoding='utf-8') as f:
+                if json.load(f) == meta:
+                    return path
+        except (OSError, ValueError):
+            pass
+
+    print(f"Generating {scale} data into {path} ...", file=sys.stderr)
+    data.write(path)
+    with open(meta_file, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+
+    return path
+
+
+def run_cases(names: List[str] = None, repeat: int = 3, moment: datetime = None,
+              suite: str = 'analytics') -> Dict[str, Dict]:
+    """
+    在当前进程中执行基准测试用例，数据源由环境变量决定。
+
+    每个用例先执行repeat次计时，再在tracemalloc下执行一次统计内存峰值；每次执行前清空进程内查询缓存，
+    准备函数不计入耗时和内存峰值。
+
+    Args:
+        names (List[str], optional): 要执行的用例名，默认为全部。
+        repeat (int, optional): 计时的次数，默认为3。
+        moment (datetime, optional): 确定统计区间的基准时间，默认为当前时间。
+        suite (str, optional): 'analytics'为核心计算的用例（benchmark_cases），'fetch'为查询结果读取方式的用例
+            （fetch_cases），默认为'analytics'。
+
+    Returns:
+        Dict[str, Dict]: 用例名 -> {seconds, min_seconds, runs, peak_mb}，seconds为中位数。
+    """
+
+    from benchmarks.cases import benchmark_cases, fetch_cases
+    from utils.db_util import memory_cache
+
+    results = {}
+
+    for name, setup, run in (fetch_cases if suite == 'fetch' else benchmark_cases)(moment):
+        if names and name not in names:
+            continue
+
+        runs = []
+        for _ in range(repeat):
+            memory_cache.clear()
+            args = setup()
+            start = time.perf_counter()
+            run(args)
+            runs.append(time.perf_counter() - start)
+
+        memory_cache.clear()
+        args = setup()
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        run(args)
+        peak = tracemalloc.get_traced_memory()[1] - base
+        tracemalloc.stop()
+
+        results[name] = {
+            'seconds': round(statistics.median(runs), 4),
+            'min_seconds': round(min(runs), 4),
+            'runs': len(runs),
+            'peak_mb': round(peak / 1024 ** 2, 2),
+        }
+        print(f"  {name}: {results[name]['seconds']:.3f}s, {results[name]['peak_mb']:.1f}MB", file=sys.stderr)
+
+    return results
+
+
+def _run_worker(env: Dict[str, str], names: List[str] = None, repeat: int = 3, moment: str = None,
+                suite: str = 'analytics') -> Dict:
+    # 在独立的子进程中执行，避免不同数据源之间共享连接和缓存
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, 'results.json')
+        cmd = [sys.executable, '-m', 'benchmarks.run', '--worker', '--output', output, '--repeat', str(repeat),
+               '--suite', suite]
+        if names:
+            cmd += ['--cases', *names]
+        if moment:
+            cmd += ['--moment', moment]
+
+        subprocess.run(cmd, cwd=ROOT, env=env, check=True)
+
+        with open(output, encoding='utf-8') as f:
+            return json.load(f)
+
+
+def run_scale(scale: str, names: List[str] = None, repeat: int = 3, seed: int = 0, regenerate: bool = False,
+              moment: str = None, record_dir: str = None, suite: str = 'analytics') -> Dict:
+    """
+    在独立的子进程中对一个数据源执行基准测试，不使用本地Parquet缓存。数据源包括：
+        - SCALES中的规模：对应规模的模拟数据。
+        - 'production'：当前配置的数据库（环境变量FM_DATA_DB），同时设置FM_DATA_RECORD=1时记录全部查询结果。
+        - 'replay'：回放record_dir中记录的查询结果，不需要数据库；记录时和回放时的moment应当相同。
+
+    Args:
+        scale (str): 数据源。
+        names (List[str], optional): 要执行的用例名，默认为全部。
+        repeat (int, optional): 计时的次数，默认为3。
+        seed (int, optional): 模拟数据的随机数种子，默认为0。
+        regenerate (bool, optional): 是否强制重新生成模拟数据，默认为False。
+        moment (str, optional): 确定统计区间的基准日期，'YYYY-MM-DD'，默认为今天。
+        record_dir (str, optional): 回放的记录目录，默认为C.RECORD_DIR。
+        suite (str, optional): 用例集，见run_cases。
+
+    Returns:
+        Dict: {params, results}，results同run_cases。
+    """
+
+    env = dict(os.environ, FM_DATA_DISK_CACHE='0', FM_DATA_VALUE_STORE='0')
+    env.pop('FM_DATA_QUERY_LOG', None)
+
+    if scale in SCALES:
+        path = prepare_data(scale, seed, regenerate)
+        env.update(FM_DATA_DB=C.MIRROR_DBNAME, FM_DATA_MIRROR_DIR=path, FM_DATA_RECORD='0')
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            params = json.load(f)
+    elif scale == 'replay':
+        record_dir = record_dir if record_dir is not None else C.RECORD_DIR
+        env.update(FM_DATA_DB=C.REPLAY_DBNAME, FM_DATA_RECORD_DIR=record_dir, FM_DATA_RECORD='0')
+        params = {'record_dir': record_dir}
+    else:
+        params = {'db': env.get('FM_DATA_DB', C.COMP_DBNAME), 'record': env.get('FM_DATA_RECORD', '0') == '1'}
+
+    params['moment'] = moment if moment is not None else datetime.now().strftime('%Y-%m-%d')
+
+    print(f"Running {scale} ...", file=sys.stderr)
+
+    return {'params': params, 'results': _run_worker(env, names, repeat, params['moment'], suite)}
+
+
+def run(scales: List[str], names: List[str] = None, repeat: int = 3, seed: int = 0, regenerate: bool = False,
+        output: str = None, moment: str = None, record_dir: str = None, suite: str = 'analytics') -> str:
+    """
+    执行基准测试并写入结果文件。
+
+    结果文件格式：
+        {commit, time, python, pandas, numpy, platform, suite, scales: {规模: {params, results: {用例名: {seconds,
+        min_seconds, runs, peak_mb}}}}}
+
+    Args:
+        scales (List[str]): 数据源，见run_scale。
+        names (List[str], optional): 要执行的用例名，默认为全部。
+        repeat (int, optional): 计时的次数，默认为3。
+        seed (int, optional): 随机数种子，默认为0。
+        regenerate (bool, optional): 是否强制重新生成模拟数据，默认为False。
+        output (str, optional): 结果文件，默认为BENCH_DIR下的'<提交号>.json'。
+        moment (str, optional): 确定统计区间的基准日期，'YYYY-MM-DD'，默认为今天。
+        record_dir (str, optional): 回放的记录目录，默认为C.RECORD_DIR。
+        suite (str, optional): 用例集，见run_cases。
+
+    Returns:
+        str: 结果文件路径。
+    """
+
+    commit = commit_id()
+    report = {
+        'commit': commit,
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'suite': suite,
+        'scales': {scale: run_scale(scale, names, repeat, seed, regenerate, moment, record_dir, suite)
+                   for scale in scales},
+    }
+
+    name = commit if suite == 'analytics' else f"{commit}-{suite}"
+    output = output if output is not None else os.path.join(BENCH_DIR, f"{name}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    return output
+
+
+if __name__ == '__main__':
+    # 执行基准测试，结果写入.fm_cache/benchmarks/<提交号>.json，再用benchmarks.compare比较两次结果，例如：
+    # python -m benchmarks.run small medium
+    # python -m benchmarks.run large --cases SecurityTx.__init__ --repeat 1
+    # python -m benchmarks.compare .fm_cache/benchmarks/a1b2c3d.json .fm_cache/benchmarks/e4f5a6b.json
+    # 在生产库上记录查询结果，再离线回放同一基准日期的统计区间：
+    # FM_DATA_RECORD=1 FM_DATA_RECORD_ANONYMIZE=1 python -m benchmarks.run production --repeat 1 --moment 2026-10-19
+    # python -m benchmarks.run replay --moment 2026-10-19
+    # 比较get_raw的逐行转换和Arrow列式读取：
+    # python -m benchmarks.run medium large --suite fetch
+    parser = argparse.ArgumentParser(description='在模拟数据上执行核心计算的基准测试')
+    parser.add_argument('scales', nargs='*', default=['small'],
+                        help=f"数据源，默认为small：{', '.join(SCALES)}, production, replay")
+    parser.add_argument('--cases', nargs='*', default=None, help='要执行的用例名，默认为全部')
+    parser.add_argument('--repeat', type=int, default=3, help='计时的次数，默认为3')
+    parser.add_argument('--seed', type=int, default=0, help='模拟数据的随机数种子，默认为0')
+    parser.add_argument('--regenerate', action='store_true', help='强制重新生成模拟数据')
+    parser.add_argument('--suite', choices=['analytics', 'fetch'], default='analytics',
+                        help='用例集：analytics为核心计算，fetch为查询结果的读取方式，默认为analytics')
+    parser.add_argument('--moment', default=None, help='确定统计区间的基准日期，YYYY-MM-DD，默认为今天')
+    parser.add_argument('--record-dir', default=None, help='回放的记录目录，默认为.fm_cache/recordings')
+    parser.add_argument('--output', default=None, help='结果文件，默认为.fm_cache/benchmarks/<提交号>.json')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(run_cases(args.cases, args.repeat,
+                                datetime.strptime(args.moment, '%Y-%m-%d') if args.moment else None, args.suite), f)
+        raise SystemExit(0)
+
+    unknown = [scale for scale in args.scales if scale not in [*SCALES, 'production', 'replay']]
+    if unknown:
+        parser.error(f"unknown scales: {', '.join(unknown)}")
+
+    print(run(args.scales, args.cases, args.repeat, args.seed, args.regenerate, args.output, args.moment,
+              args.record_dir, args.suite))
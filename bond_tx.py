@@ -3,10 +3,40 @@
 # FileName: bond_tx
 # Description: This module contains classes for handling security transactions, specifically for bonds and CDs.
 import datetime
+import functools
+from typing import Callable, Optional
+
 import pandas as pd
 
 from utils.db_util import get_raw, create_conn
 from utils.db_util import Constants as C
+from utils.memory_cache import MemoryCache
+from utils.bond_ref import bond_reference
+from utils.profiler import stage as profile_stage
+from utils.time_util import TimeUtil
+from utils.value_store import valuation_store
+
+
+def per_bond_cache(method: Callable[..., pd.DataFrame]) -> Callable[..., pd.DataFrame]:
+    """
+    单支债券方法的记忆化：调用enable_bond_cache后，按(方法名, 债券代码)缓存在交易对象的bond_cache中，
+    重复和嵌套的调用直接返回缓存结果的副本；未开启时直接计算.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, bond_code: str) -> pd.DataFrame:
+        if self.bond_cache is None:
+            return method(self, bond_code)
+
+        key = (method.__name__, bond_code)
+        data = self.bond_cache.get(key)
+        if data is None:
+            data = method(self, bond_code)
+            self.bond_cache.put(key, data)
+
+        return data
+
+    return wrapper
 
 
 class SecurityTx:
@@ -37,9 +67,21 @@ class SecurityTx:
             每日持仓
         capital : pandas.DataFrame
             持有期间的资本利得
+        bond_type : pandas.Series
+            持仓债券的代码 -> 债券类型
+        held_trades_only : bool
+            是否只查询持仓债券的交易，子类只统计持仓债券时设为True
+        bond_cache : MemoryCache
+            单支债券方法的结果缓存，调用enable_bond_cache后开启，默认为None
 
     """
 
+    # 交易数据只在持仓债券范围内使用时，查询时即按持仓债券筛选
+    held_trades_only = False
+
+    # 单支债券方法的结果缓存，默认不开启
+    bond_cache = None
+
     def __init__(self, start_time: datetime.date, end_time: datetime.date) -> None:
         """
                 构造函数.
@@ -56,39 +98,138 @@ class SecurityTx:
         self.end_time = end_time
         self.conn = create_conn()
 
-        self.secondary_trades = self._sum_secondary_trades()
-        self.holded_bonds_info = self._holded_bonds_info()
+        # 各步骤在测试页面的性能分析中作为一个阶段显示，没有运行StageProfiler时不做统计
+        # 持仓只查询一次，持有的债券和每日持仓都由其得到
+        with profile_stage('SecurityTx._holdings_all') as stage:
+            holdings = self._holdings_all()
+            stage.frame(holdings=holdings)
+
+        with profile_stage('SecurityTx._holded_bonds_info') as stage:
+            self.holded_bonds_info = self._holded_bonds_info(holdings)
+
+            # 债券代码 -> 债券类型，各数据按代码映射出类型列，子类在加载时即按类型筛选，之后的数据只加载选中的债券
+            self.bond_type = pd.Series(dtype='float64')
+            if not self.holded_bonds_info.empty:
+                self.bond_type = self.holded_bonds_info.drop_duplicates(C.BOND_CODE).set_index(C.BOND_CODE)[
+                    C.BOND_TYPE_NUM]
+                self.holded_bonds_info = self._select_type(self.holded_bonds_info, tag=False)
+            stage.frame(holded_bonds_info=self.holded_bonds_info)
+
+        # 只统计持仓债券的子类只查询持仓债券的一级和二级交易
+        with profile_stage('SecurityTx._sum_secondary_trades') as stage:
+            trade_codes = None
+            if self.held_trades_only:
+                trade_codes = [] if self.holded_bonds_info.empty else self.holded_bonds_info[C.BOND_CODE].unique()
+            self.secondary_trades = self._select_type(self._sum_secondary_trades(trade_codes))
+            stage.frame(secondary_trades=self.secondary_trades)
+
+        with profile_stage('SecurityTx._primary_trades') as stage:
+            primary_trades = self._primary_trades(trade_codes)
+            if not primary_trades.empty:
+                primary_trades = self._select_type(primary_trades.reset_index(drop=False))
+            self.primary_trades = primary_trades
+            stage.frame(primary_trades=self.primary_trades)
+
+        with profile_stage('SecurityTx._inst_cash_flow_all') as stage:
+            self.insts_flow_all = self._select_type(self._inst_cash_flow_all())
+            stage.frame(insts_flow_all=self.insts_flow_all)
+
+        with profile_stage('SecurityTx._daily_value_all') as stage:
+            self.value = self._select_type(self._daily_value_all())
+            stage.frame(value=self.value)
+
+        with profile_stage('SecurityTx._daily_holded_all') as stage:
+            self.holded = self._select_type(self._daily_holded_all(holdings))
+            stage.frame(holded=self.holded)
+
+        with profile_stage('SecurityTx._capital_gains_all') as stage:
+            self.capital = self._select_type(self._capital_gains_all())
+            stage.frame(capital=self.capital)
+
+        # 单支债券的查询按行位置取数，不再扫描整个DataFrame
+        with profile_stage('SecurityTx.__init__ (index bonds)'):
+            self._index_bonds()
+
+    def _index_bonds(self) -> None:
+
+        """
+        按债券代码建立holded, value, insts_flow_all, capital的行位置索引和持仓债券的代码集合，在构造的最后执行.
+        """
+
+        self._bond_rows = {}
+        for name in ('holded', 'value', 'insts_flow_all', 'capital'):
+            frame = getattr(self, name)
+            self._bond_rows[name] = frame.groupby(C.BOND_CODE, sort=False).indices if not frame.empty else {}
+
+        self._holded_codes = set() if self.holded_bonds_info.empty else set(self.holded_bonds_info[C.BOND_CODE])
+
+    def enable_bond_cache(self, max_bytes: int = 256 * 1024 ** 2) -> None:
+
+        """
+        开启单支债券方法（daily_holded_bond, get_inst_flow, get_daily_value, get_daily_insts, get_capital_gains,
+        get_net_profit, sum_profits）的结果缓存，只在本对象内有效，超过大小上限时淘汰最久未使用的结果.
+
+        Args:
+            max_bytes (int, optional): 缓存总大小上限（字节），默认为256MB.
+        """
+
+        self.bond_cache = MemoryCache(max_bytes)
+
+    def _bond_frame(self, name: str, bond_code: str) -> pd.DataFrame:
+
+        """
+        按行位置索引取单支债券的数据.
+
+        Args:
+            name (str): 数据的属性名，见_index_bonds.
+            bond_code (str): 债券代码.
+
+        Returns:
+            pd.DataFrame: 该债券的行，没有时为空.
+        """
 
-        bond_type = pd.DataFrame({})
-        if not self.holded_bonds_info.empty:
-            bond_type = self.holded_bonds_info[[C.BOND_CODE, C.BOND_TYPE_NUM]]
+        return getattr(self, name).iloc[self._bond_rows[name].get(bond_code, [])]
 
-        self.primary_trades = self._primary_trades()
-        self.insts_flow_all = self._inst_cash_flow_all()
-        self.value = self._daily_value_all()
-        self.holded = self._daily_holded_all()
-        self.capital = self._capital_gains_all()
+    def _type_mask(self, bond_type: pd.Series) -> Optional[pd.Series]:
 
-        if not bond_type.empty:
+        """
+        子类按债券类型选择数据的条件，默认选择全部.
 
-            if not self.primary_trades.empty:
-                self.primary_trades = self.primary_trades.reset_index(drop=False)
-                self.primary_trades = pd.merge(self.primary_trades, bond_type, on=C.BOND_CODE, how='left')
+        Args:
+            bond_type (pd.Series): 每行的债券类型，不在持仓中的债券为空值.
 
-            if not self.secondary_trades.empty:
-                self.secondary_trades = pd.merge(self.secondary_trades, bond_type, on=C.BOND_CODE, how='left')
+        Returns:
+            Optional[pd.Series]: 选中的行，None表示全部.
+        """
 
-            if not self.insts_flow_all.empty:
-                self.insts_flow_all = pd.merge(self.insts_flow_all, bond_type, on=C.BOND_CODE, how='left')
+        return None
 
-            if not self.value.empty:
-                self.value = pd.merge(self.value, bond_type, on=C.BOND_CODE, how='left')
+    def _select_type(self, frame: pd.DataFrame, tag: bool = True) -> pd.DataFrame:
 
-            if not self.holded.empty:
-                self.holded = pd.merge(self.holded, bond_type, on=C.BOND_CODE, how='left')
+        """
+        按债券代码映射出债券类型列，并按子类的条件筛选。映射不复制原有的列，全部选中时不再复制.
 
-            if not self.capital.empty:
-                self.capital = pd.merge(self.capital, bond_type, on=C.BOND_CODE, how='left')
+        Args:
+            frame (pd.DataFrame): 含C.BOND_CODE列的数据.
+            tag (bool, optional): 是否加上C.BOND_TYPE_NUM列，已有该列时为False.
+
+        Returns:
+            pd.DataFrame: 加上类型列并筛选后的数据.
+        """
+
+        if frame.empty:
+            return frame
+
+        if tag:
+            # 浅复制后加列，不修改查询缓存中的原数据
+            frame = frame.copy(deep=False)
+            frame[C.BOND_TYPE_NUM] = frame[C.BOND_CODE].map(self.bond_type)
+
+        mask = self._type_mask(frame[C.BOND_TYPE_NUM])
+        if mask is None or mask.all():
+            return frame
+
+        return frame.loc[mask]
 
     def _get_raw_data(self, sql: str) -> pd.DataFrame:
 
@@ -110,10 +251,33 @@ class SecurityTx:
 
         return raw
 
-    def _holded_bonds_info(self) -> pd.DataFrame:
+    def _query_start(self, padding: int) -> datetime.date:
+
+        """
+        估值和持仓查询的开始日期：统计开始前的最近一个工作日，用于补齐开始日的估值和获取开始日前一天的成本净价.
+
+        Args:
+            padding (int): 工作日日历中没有更早的日期时，向前延长的天数.
+
+        Returns:
+            datetime.date: 查询的开始日期.
+        """
+
+        first = TimeUtil.prev_business_day(self.start_time)
+
+        if pd.isna(first):
+            return self.start_time - datetime.timedelta(days=padding)
+
+        return first.date()
+
+    def _holded_bonds_info(self, holdings: pd.DataFrame) -> pd.DataFrame:
 
         """
-        交易期间持有的债券信息，不包括早期的收益凭证。
+        交易期间持有的债券信息，不包括早期的收益凭证。持有的债券取自全部持仓，基础信息取自进程内共享的缓存。
+
+        Args:
+            holdings (pd.DataFrame): _holdings_all的全部持仓.
+
         Returns:
             pd.DataFrame: [C.BOND_NAME, C.BOND_FULL_NAME, C.BOND_CODE, C.BOND_TYPE_NUM, C.BOND_TYPE, C.ISSUE_DATE},
             C.MATURITY, C.COUPON_RATE_CURRENT, C.COUPON_RATE_ISSUE, C.ISSUE_AMT, C.ISSUE_PRICE, C.ISSUE_ORG,
@@ -121,38 +285,23 @@ class SecurityTx:
 
         """
 
-        if self.start_time > self.end_time:
+        if self.start_time > self.end_time or holdings.empty:
             return pd.DataFrame({})
 
-        sql = f"select distinct " \
-              f"cc.{C.BOND_NAME}, " \
-              f"bi.{C.BOND_FULL_NAME}, " \
-              f"cc.{C.BOND_CODE}, " \
-              f"bi.{C.BOND_TYPE_NUM}, " \
-              f"bi.{C.BOND_TYPE}, " \
-              f"bi.{C.ISSUE_DATE}, " \
-              f"bi.{C.MATURITY}, " \
-              f"bi.{C.COUPON_RATE_CURRENT}, " \
-              f"bi.{C.COUPON_RATE_ISSUE}, " \
-              f"bi.{C.ISSUE_AMT}, " \
-              f"bi.{C.ISSUE_PRICE}, " \
-              f"bi.{C.ISSUE_ORG}, " \
-              f"bi.{C.BOND_TERM}, " \
-              f"cc.{C.MARKET_CODE} " \
-              f"from {C.COMP_DBNAME}.core_carrybondholds cc " \
-              f"left join {C.COMP_DBNAME}.basic_bondbasicinfos bi " \
-              f"on cc.{C.BOND_CODE} = bi.{C.BOND_CODE} " \
-              f"where date(cc.{C.CARRY_DATE}) >= '" + \
-              self.start_time.strftime('%Y-%m-%d') + \
-              f"' and date(cc.{C.CARRY_DATE}) <= '" + \
-              self.end_time.strftime('%Y-%m-%d') + \
-              f"' and cc.{C.CARRY_TYPE} = 3; "
-
-        raw = self._get_raw_data(sql)
+        # 统计区间内持有的债券，含全部组合
+        mask = ((holdings[C.DATE] >= pd.Timestamp(self.start_time)) &
+                (holdings[C.DATE] < pd.Timestamp(self.end_time) + pd.Timedelta(days=1)))
+        bonds = holdings.loc[mask, [C.BOND_NAME, C.BOND_CODE, C.MARKET_CODE]].drop_duplicates()
 
-        if raw.empty:
+        if bonds.empty:
             return pd.DataFrame({})
 
+        info = bond_reference.info(bonds[C.BOND_CODE].unique())
+        raw = pd.merge(bonds, info, on=C.BOND_CODE, how='left')
+        raw = raw[[C.BOND_NAME, C.BOND_FULL_NAME, C.BOND_CODE, C.BOND_TYPE_NUM, C.BOND_TYPE, C.ISSUE_DATE, C.MATURITY,
+                   C.COUPON_RATE_CURRENT, C.COUPON_RATE_ISSUE, C.ISSUE_AMT, C.ISSUE_PRICE, C.ISSUE_ORG, C.BOND_TERM,
+                   C.MARKET_CODE]]
+
         # 如果当期利率为空，则取发行利率
         mask = pd.isna(raw.loc[:, C.COUPON_RATE_CURRENT])
         raw.loc[mask, C.COUPON_RATE_CURRENT] = raw.loc[mask, C.COUPON_RATE_ISSUE]
@@ -204,29 +353,17 @@ class SecurityTx:
         if self.start_time > self.end_time or self.holded_bonds_info.empty:
             return pd.DataFrame({})
 
-        # 只取区间内持仓的债券利息现金流
-        bonds_code_str = ', '.join([f"'{item}'" for item in (self.holded_bonds_info[C.BOND_CODE]).tolist()])
+        # 只取区间内持仓的债券利息现金流，全部计息期取自进程内共享的缓存，再按统计区间筛选
+        cashflows = bond_reference.cashflows(self.holded_bonds_info[C.BOND_CODE].unique())
 
-        sql = f"select " \
-              f"bb.{C.BOND_CODE}, " \
-              f"bb.{C.BOND_NAME}, " \
-              f"bb.{C.INST_START_DATE}, " \
-              f"bb.{C.INST_END_DATE}, " \
-              f"bb.{C.ACCRUAL_DAYS}, " \
-              f"bb.{C.PERIOD_INST} " \
-              f"from {C.COMP_DBNAME}.basic_bondcashflows bb " \
-              f"where {C.BOND_CODE} in (" + bonds_code_str + ") " + \
-              f"and date(bb.{C.INST_END_DATE}) >= '" + \
-              self.start_time.strftime('%Y-%m-%d') + \
-              f"' and date(bb.{C.INST_START_DATE}) <= '" + \
-              self.end_time.strftime('%Y-%m-%d') + \
-              f"' order by bb.{C.BOND_CODE};"
-
-        raw = self._get_raw_data(sql)
+        mask = ((cashflows[C.INST_END_DATE] >= pd.Timestamp(self.start_time)) &
+                (cashflows[C.INST_START_DATE] < pd.Timestamp(self.end_time) + pd.Timedelta(days=1)))
+        raw = cashflows.loc[mask].reset_index(drop=True)
 
         return raw
 
     # 1.2 单只债券利息现金流
+    @per_bond_cache
     def get_inst_flow(self, bond_code: str) -> pd.DataFrame:
 
         """
@@ -244,16 +381,16 @@ class SecurityTx:
 
         """
 
-        if self.insts_flow_all.empty or (bond_code not in self.insts_flow_all[C.BOND_CODE].tolist()):
+        if bond_code not in self._bond_rows['insts_flow_all']:
             return pd.DataFrame({})
 
-        bond = self.insts_flow_all.loc[self.insts_flow_all[C.BOND_CODE] == bond_code]
+        bond = self._bond_frame('insts_flow_all', bond_code)
 
         # 初始化
         inst_daily = pd.DataFrame(columns=[C.DATE, C.INST_A_DAY])
 
         # 取持仓时间段
-        inst_daily[C.DATE] = self.holded.loc[self.holded[C.BOND_CODE] == bond_code, C.DATE]
+        inst_daily[C.DATE] = self._bond_frame('holded', bond_code)[C.DATE]
         # 补充下缺失的日期
         inst_daily = inst_daily.set_index(C.DATE).resample('D').asfreq().reset_index()
         inst_daily[C.INST_A_DAY] = 0.0
@@ -274,7 +411,7 @@ class SecurityTx:
     def _daily_value_all(self) -> pd.DataFrame:
 
         """
-        查询全量每日估值，日期范围在两端各延长 60 天
+        查询全量每日估值，日期范围从统计开始前的最近一个工作日至统计截止日，另加每支债券在此之前60天内的最后一个估值
 
         Returns
         -------
@@ -285,27 +422,75 @@ class SecurityTx:
         if self.start_time > self.end_time or self.holded_bonds_info.empty:
             return pd.DataFrame({})
 
-        # 由于数据库表对于非工作日没有估值，所以查询的时间区间前后各增加60个工作日，避免数据缺失
+        # 由于数据库表对于非工作日没有估值，所以从开始日前的最近一个工作日开始查询，用于补齐开始日的估值；
+        # 工作日日历是全市场的，单支债券在该日可能没有估值，因此另取每支债券在此之前60天内的最后一个估值
+        first = self._query_start(60)
+        lookback = self.start_time - datetime.timedelta(days=60)
+
+        # 优先使用本地估值存储，只从数据库读取缺失的部分
+        if valuation_store is not None and valuation_store.usable(self.conn):
+            raw = valuation_store.get(self.conn, self.holded_bonds_info[C.BOND_CODE].unique(), min(lookback, first),
+                                      self.end_time)
+            return self._last_before(raw, first)
+
         bonds_code_str = ', '.join([f"'{item}'" for item in (self.holded_bonds_info[C.BOND_CODE]).tolist()])
-        sql = f"select " \
-              f"bv.{C.DEAL_DATE} as {C.DATE}, " \
-              f"bv.{C.BOND_CODE}, " \
-              f"bv.{C.BOND_NAME}, " \
-              f"bv.{C.VALUE_TYPE}, " \
-              f"bv.{C.VALUE_NET_PRICE} " \
+        columns = f"bv.{C.DEAL_DATE} as {C.DATE}, " \
+                  f"bv.{C.BOND_CODE}, " \
+                  f"bv.{C.BOND_NAME}, " \
+                  f"bv.{C.VALUE_TYPE}, " \
+                  f"bv.{C.VALUE_NET_PRICE} "
+        sql = f"select " + columns + \
               f"from {C.COMP_DBNAME}.basic_bondvaluations bv " \
               f"where {C.BOND_CODE} in (" + bonds_code_str + ") " + \
               f" and date(bv.{C.DEAL_DATE}) >= '" + \
-              (self.start_time - datetime.timedelta(days=60)).strftime('%Y-%m-%d') + \
+              first.strftime('%Y-%m-%d') + \
               f"' and date(bv.{C.DEAL_DATE}) <= '" + \
-              (self.end_time + datetime.timedelta(days=60)).strftime('%Y-%m-%d') + \
-              f"' order by bv.{C.BOND_CODE}, bv.{C.DEAL_DATE};"
+              self.end_time.strftime('%Y-%m-%d') + \
+              f"' union all select " + columns + \
+              f"from {C.COMP_DBNAME}.basic_bondvaluations bv " \
+              f"join (select {C.BOND_CODE}, max({C.DEAL_DATE}) as last_date " \
+              f"from {C.COMP_DBNAME}.basic_bondvaluations " \
+              f"where {C.BOND_CODE} in (" + bonds_code_str + ") " + \
+              f" and {C.VALUE_NET_PRICE} is not null" \
+              f" and date({C.DEAL_DATE}) >= '" + \
+              lookback.strftime('%Y-%m-%d') + \
+              f"' and date({C.DEAL_DATE}) < '" + \
+              first.strftime('%Y-%m-%d') + \
+              f"' group by {C.BOND_CODE}) lv " \
+              f"on bv.{C.BOND_CODE} = lv.{C.BOND_CODE} and bv.{C.DEAL_DATE} = lv.last_date " \
+              f"order by {C.BOND_CODE}, {C.DATE};"
 
         raw = self._get_raw_data(sql)
 
         return raw
 
+    @staticmethod
+    def _last_before(raw: pd.DataFrame, first: datetime.date) -> pd.DataFrame:
+
+        """
+        保留first及之后的估值，以及每支债券在first之前的最后一个非空估值.
+
+        Args:
+            raw (pd.DataFrame): 估值，按债券代码和日期排序.
+            first (datetime.date): 查询的开始日期.
+
+        Returns:
+            pd.DataFrame: 与raw的列相同.
+        """
+
+        if raw.empty:
+            return raw
+
+        before = raw[C.DATE] < pd.Timestamp(first)
+        valued = before & raw[C.VALUE_NET_PRICE].notna()
+        last = raw.loc[valued].groupby(C.BOND_CODE, sort=False)[C.DATE].transform('max')
+        mask = ~before
+        mask.loc[last.index] = raw.loc[last.index, C.DATE] == last
+
+        return raw.loc[mask].reset_index(drop=True)
+
     # 2.2 获取单支债券估值，注意源源数据库部分债券数据缺失不全
+    @per_bond_cache
     def get_daily_value(self, bond_code: str) -> pd.DataFrame:
 
         """
@@ -322,48 +507,46 @@ class SecurityTx:
             [C.DATE, C.VALUE_NET_PRICE]
         """
 
-        if (self.start_time > self.end_time or self.holded_bonds_info.empty or
-                (bond_code not in self.holded_bonds_info[C.BOND_CODE].tolist())):
+        if self.start_time > self.end_time or bond_code not in self._holded_codes:
             return pd.DataFrame({})
 
         value_daily = pd.DataFrame(columns=[C.DATE])
-        value_daily[C.DATE] = self.holded.loc[self.holded[C.BOND_CODE] == bond_code, C.DATE]
+        value_daily[C.DATE] = self._bond_frame('holded', bond_code)[C.DATE]
 
         # 如果数据库中没有估值，则默认为100
-        if self.value.empty or (bond_code not in self.value[C.BOND_CODE].tolist()):
+        if bond_code not in self._bond_rows['value']:
             value_daily[C.VALUE_NET_PRICE] = 100
             return value_daily
 
-        bond = self.value.loc[self.value[C.BOND_CODE] == bond_code]
+        bond = self._bond_frame('value', bond_code)
         bond = bond.drop_duplicates(C.DATE)
 
-        # 非工作日数据缺失，取前一个工作日的估值
+        # 非工作日数据缺失，取之前最近一个有估值的日期的估值，截止日为非工作日或开始日前一个工作日缺失估值时同样适用
         # todo 如果中间有缺失，估值100会造成收益率曲线波动，取最后一个非空值是否更好
-        bond = bond.set_index(C.DATE).resample('D').asfreq().reset_index()
-        bond.ffill(inplace=True)
-
-        value_daily = pd.merge(value_daily, bond[[C.DATE, C.VALUE_NET_PRICE]], on=C.DATE, how='left')
+        bond = bond.dropna(subset=[C.VALUE_NET_PRICE])
+        value_daily = pd.merge_asof(value_daily.sort_values(C.DATE), bond[[C.DATE, C.VALUE_NET_PRICE]],
+                                    on=C.DATE, direction='backward')
 
         # 如果数据库中没有估值，则默认为100；但如果中间有缺失，估值100会造成收益率曲线波动
         value_daily.fillna(100, inplace=True)
 
         return value_daily
 
-    def _daily_holded_all(self) -> pd.DataFrame:
+    def _holdings_all(self) -> pd.DataFrame:
 
         """
-        查询每日持仓数据，日期范围在两端各延长 60 天，不含委托投资
+        查询全部持仓数据，日期范围从统计开始前的最近一个工作日至统计截止日，含全部组合
 
         Returns
         -------
         pd.DataFrame
-              [C.DATE, C.BOND_NAME, C.BOND_CODE, C.MARKET_CODE, C.HOLD_AMT, C.COST_FULL_PRICE, C.COST_NET_PRICE]
+              [C.DATE, C.BOND_NAME, C.BOND_CODE, C.MARKET_CODE, C.HOLD_AMT, C.COST_FULL_PRICE, C.COST_NET_PRICE,
+              C.PORTFOLIO_NO]
         """
 
-        if self.start_time > self.end_time or self.holded_bonds_info.empty:
+        if self.start_time > self.end_time:
             return pd.DataFrame({})
 
-        # 注意：由于基础信息不全，这里排除了“委托投资”的持仓
         sql = f"select " \
               f"cc.{C.CARRY_DATE} as {C.DATE}, " \
               f"cc.{C.BOND_NAME}, " \
@@ -371,20 +554,47 @@ class SecurityTx:
               f"cc.{C.MARKET_CODE}, " \
               f"cc.{C.HOLD_AMT}, " \
               f"cc.{C.COST_FULL_PRICE}, " \
-              f"cc.{C.COST_NET_PRICE} " \
+              f"cc.{C.COST_NET_PRICE}, " \
+              f"cc.{C.PORTFOLIO_NO} " \
               f"from {C.COMP_DBNAME}.core_carrybondholds cc " \
               f"where date(cc.{C.CARRY_DATE}) >= '" + \
-              (self.start_time - datetime.timedelta(days=10)).strftime('%Y-%m-%d') + \
+              self._query_start(10).strftime('%Y-%m-%d') + \
               f"' and date(cc.{C.CARRY_DATE}) <= '" + \
-              (self.end_time + datetime.timedelta(days=10)).strftime('%Y-%m-%d') + \
+              self.end_time.strftime('%Y-%m-%d') + \
               f"' and cc.{C.CARRY_TYPE} = 3 " \
-              f"and cc.{C.PORTFOLIO_NO} not in ('Portfolio-20170919-008', 'Portfolio-20170713-023') " \
               f"order by cc.{C.CARRY_DATE};"
 
         raw = self._get_raw_data(sql)
 
         return raw
 
+    def _daily_holded_all(self, holdings: pd.DataFrame) -> pd.DataFrame:
+
+        """
+        每日持仓数据，不含委托投资
+
+        Parameters
+        ----------
+        holdings : pd.DataFrame
+            _holdings_all的全部持仓
+
+        Returns
+        -------
+        pd.DataFrame
+              [C.DATE, C.BOND_NAME, C.BOND_CODE, C.MARKET_CODE, C.HOLD_AMT, C.COST_FULL_PRICE, C.COST_NET_PRICE]
+        """
+
+        if self.start_time > self.end_time or self.holded_bonds_info.empty:
+            return pd.DataFrame({})
+
+        # 注意：由于基础信息不全，这里排除了“委托投资”的持仓
+        mask = ~holdings[C.PORTFOLIO_NO].isin(['Portfolio-20170919-008', 'Portfolio-20170713-023'])
+        raw = holdings.loc[mask, [C.DATE, C.BOND_NAME, C.BOND_CODE, C.MARKET_CODE, C.HOLD_AMT, C.COST_FULL_PRICE,
+                                  C.COST_NET_PRICE]].reset_index(drop=True)
+
+        return raw
+
+    @per_bond_cache
     def daily_holded_bond(_self, bond_code: str) -> pd.DataFrame:
 
         """
@@ -401,18 +611,22 @@ class SecurityTx:
             [C.DATE, C.BOND_NAME, C.BOND_CODE, C.MARKET_CODE, C.HOLD_AMT, C.COST_FULL_PRICE, C.COST_NET_PRICE]
         """
 
-        if (_self.start_time > _self.end_time or _self.holded_bonds_info.empty or
-                (bond_code not in _self.holded_bonds_info[C.BOND_CODE].tolist())):
+        if _self.start_time > _self.end_time or bond_code not in _self._holded_codes:
             return pd.DataFrame({})
 
-        bond = _self.holded.loc[_self.holded[C.BOND_CODE] == bond_code]
+        bond = _self._bond_frame('holded', bond_code)
 
         return bond
 
-    def _primary_trades(self) -> pd.DataFrame:
+    def _primary_trades(self, bond_codes: list = None) -> pd.DataFrame:
 
         """
-        查询一级交易数据（全市场）
+        查询一级交易数据，默认为全市场
+
+        Parameters
+        ----------
+        bond_codes : list, optional
+            只查询这些债券的分销认购，默认为全部债券
 
         Returns
         -------
@@ -420,9 +634,14 @@ class SecurityTx:
               [C.DATE, C.BOND_NAME, C.BOND_CODE, C.MARKET_CODE, C.DIRECTION, C.NET_PRICE, C.BOND_AMT_CASH]
         """
 
-        if self.start_time > self.end_time:
+        if self.start_time > self.end_time or (bond_codes is not None and len(bond_codes) == 0):
             return pd.DataFrame({})
 
+        codes = ''
+        if bond_codes is not None:
+            bonds_code_str = ', '.join([f"'{item}'" for item in bond_codes])
+            codes = f"and tc.{C.BOND_CODE} in ({bonds_code_str}) "
+
         sql = f"select " \
               f"tc.{C.TRADE_DATE} as {C.DATE}, " \
               f"tc.{C.BOND_NAME}, " \
@@ -436,25 +655,26 @@ class SecurityTx:
               self.start_time.strftime('%Y-%m-%d') + \
               f"' and date(tc.{C.TRADE_DATE}) <= '" + \
               self.end_time.strftime('%Y-%m-%d') + \
-              f"' and tc.{C.CHECK_STATUS} = 1 " \
+              f"' and tc.{C.CHECK_STATUS} = 1 {codes}" \
               f"order by tc.{C.TRADE_DATE};"
 
         bonds = self._get_raw_data(sql)
 
-        # 可能出现当天多笔分销认购，作汇总处理
-        bonds_group = bonds.groupby([C.DATE, C.BOND_CODE, C.MARKET_CODE, C.DIRECTION, C.BOND_NAME]).agg({
-
-            # 理论上中标的价格是一致的
-            C.NET_PRICE: lambda x: x.iloc[0],
-            C.BOND_AMT_CASH: lambda x: x.sum(),
-        })
+        # 可能出现当天多笔分销认购，作汇总处理；理论上中标的价格是一致的，取第一笔（价格为空时不跳过）
+        grouped = bonds.groupby([C.DATE, C.BOND_CODE, C.MARKET_CODE, C.DIRECTION, C.BOND_NAME])
+        bonds_group = pd.DataFrame({C.NET_PRICE: grouped[C.NET_PRICE].first(skipna=False),
+                                    C.BOND_AMT_CASH: grouped[C.BOND_AMT_CASH].sum()})
 
         return bonds_group
 
-    def _bank_trades(_self) -> pd.DataFrame:
-
+    def _sum_secondary_trades(self, bond_codes: list = None) -> pd.DataFrame:
         """
-        查询银行间市场的二级交易数据
+        银行间和交易所市场的二级交易数据，两个市场的列名在查询中统一，一次查询返回
+
+        Parameters
+        ----------
+        bond_codes : list, optional
+            只查询这些债券的交易，默认为全部债券
 
         Returns
         -------
@@ -463,9 +683,16 @@ class SecurityTx:
               C.ACCRUED_INST_CASH, C.TRADE_AMT, C.SETTLE_AMT]
         """
 
-        if _self.start_time > _self.end_time:
+        if self.start_time > self.end_time or (bond_codes is not None and len(bond_codes) == 0):
             return pd.DataFrame({})
 
+        start, end = self.start_time.strftime('%Y-%m-%d'), self.end_time.strftime('%Y-%m-%d')
+        codes = ''
+        if bond_codes is not None:
+            bonds_code_str = ', '.join([f"'{item}'" for item in bond_codes])
+            codes = f"and tc.{C.BOND_CODE} in ({bonds_code_str}) "
+
+        # 银行间市场按成交时间、交易所市场按交易日期筛选和排序，market_order和trade_order只用于排序
         sql = f"select " \
               f"tc.{C.SETTLEMENT_DATE} as {C.DATE}, " \
               f"tc.{C.BOND_NAME}, " \
@@ -477,33 +704,13 @@ class SecurityTx:
               f"tc.{C.BOND_AMT_CASH}, " \
               f"tc.{C.ACCRUED_INST_CASH}, " \
               f"tc.{C.TRADE_AMT}, " \
-              f"tc.{C.SETTLE_AMT} " \
+              f"tc.{C.SETTLE_AMT}, " \
+              f"0 as market_order, " \
+              f"tc.{C.TRADE_TIME} as trade_order " \
               f"from {C.COMP_DBNAME}.trade_cashbonds tc " \
-              f"where date(tc.{C.TRADE_TIME}) >= '" + \
-              _self.start_time.strftime('%Y-%m-%d') + \
-              f"' and date(tc.{C.TRADE_TIME}) <= '" + \
-              _self.end_time.strftime('%Y-%m-%d') + \
-              f"' and tc.{C.CHECK_STATUS} = 1 " \
-              f"order by tc.{C.TRADE_TIME};"
-
-        return _self._get_raw_data(sql)
-
-    def _exchange_trades(self) -> pd.DataFrame:
-
-        """
-        查询交易所市场的二级交易数据
-
-        Returns
-        -------
-        pd.DataFrame
-              [C.DATE, C.BOND_NAME, C.BOND_CODE, C.MARKET_CODE, C.DIRECTION, C.NET_PRICE, C.FULL_PRICE, C.BOND_AMT_CASH,
-              C.ACCRUED_INST_CASH, C.TRADE_AMT, C.SETTLE_AMT]
-        """
-
-        if self.start_time > self.end_time:
-            return pd.DataFrame({})
-
-        sql = f"select " \
+              f"where date(tc.{C.TRADE_TIME}) >= '{start}' and date(tc.{C.TRADE_TIME}) <= '{end}' " \
+              f"and tc.{C.CHECK_STATUS} = 1 {codes}" \
+              f"union all select " \
               f"tc.{C.TRADE_DATE} as {C.DATE}, " \
               f"tc.{C.BOND_NAME}, " \
               f"tc.{C.BOND_CODE}, " \
@@ -512,46 +719,22 @@ class SecurityTx:
               f"tc.{C.NET_PRICE}, " \
               f"tc.{C.FULL_PRICE}, " \
               f"tc.{C.BOND_AMT_CASH2} as {C.BOND_AMT_CASH}, " \
-              f"tc.{C.TRADE_AMT}, " \
               f"tc.{C.ACCRUED_INST_CASH2} as {C.ACCRUED_INST_CASH}, " \
-              f"tc.{C.SETTLE_AMT} " \
+              f"tc.{C.TRADE_AMT}, " \
+              f"tc.{C.SETTLE_AMT}, " \
+              f"1 as market_order, " \
+              f"tc.{C.TRADE_DATE} as trade_order " \
               f"from {C.COMP_DBNAME}.trade_exchgcashbonds tc " \
-              f"where date(tc.{C.TRADE_DATE}) >= '" + \
-              self.start_time.strftime('%Y-%m-%d') + \
-              f"' and date(tc.{C.TRADE_DATE}) <= '" + \
-              self.end_time.strftime('%Y-%m-%d') + \
-              f"' and tc.{C.CHECK_STATUS} = 1 " \
-              f"order by tc.{C.TRADE_DATE};"
+              f"where date(tc.{C.TRADE_DATE}) >= '{start}' and date(tc.{C.TRADE_DATE}) <= '{end}' " \
+              f"and tc.{C.CHECK_STATUS} = 1 {codes}" \
+              f"order by market_order, trade_order;"
 
-        return self._get_raw_data(sql)
-
-    def _sum_secondary_trades(self) -> pd.DataFrame:
-        """
-        汇总银行间和交易所市场的二级交易市场数据
-
-        Returns
-        -------
-        pd.DataFrame
-              [C.DATE, C.BOND_NAME, C.BOND_CODE, C.MARKET_CODE, C.DIRECTION, C.NET_PRICE, C.FULL_PRICE, C.BOND_AMT_CASH,
-              C.ACCRUED_INST_CASH, C.TRADE_AMT, C.SETTLE_AMT]
-        """
-
-        if self.start_time > self.end_time:
-            return pd.DataFrame({})
-
-        bank = self._bank_trades()
-        exchange = self._exchange_trades()
+        raw = self._get_raw_data(sql)
 
-        if exchange.empty and bank.empty:
+        if raw.empty:
             return pd.DataFrame({})
 
-        if exchange.empty:
-            return bank
-
-        if bank.empty:
-            return exchange
-
-        return pd.concat([bank, exchange], ignore_index=True)
+        return raw.drop(columns=['market_order', 'trade_order'])
 
     # 3.1 全量资本利得获取
     def _capital_gains_all(self) -> pd.DataFrame:
@@ -583,17 +766,14 @@ class SecurityTx:
         # 当日的交易加权净价
         raw_group[C.WEIGHT_NET_PRICE] = raw_group[C.TRADE_AMT] / raw_group[C.BOND_AMT_CASH] * 100
 
-        # Create a copy of self.holded to avoid modifying the original DataFrame
-        holded_copy = self.holded.copy()
-
-        # 3.2 从C.DATE列加一天，获取前一天的成本净价
-        # add one day from the C.DATE column，get previous day's net cost price
-        holded_copy[C.DATE] = holded_copy[C.DATE] + pd.Timedelta(days=1)
+        # 3.2 取交易日前一天的成本净价，持仓按自然日结转；前一天没有持仓时（如当日买入当日卖出）不取更早的持仓
+        raw_group = raw_group.reset_index().sort_values(C.DATE, kind='stable')
+        holded = self.holded[[C.DATE, C.BOND_CODE, C.MARKET_CODE, C.BOND_NAME, C.COST_NET_PRICE]].sort_values(
+            C.DATE, kind='stable')
 
-        # Merge raw_group with the modified holded_copy
-        raw_group = pd.merge(raw_group,
-                             holded_copy[[C.DATE, C.BOND_CODE, C.MARKET_CODE, C.BOND_NAME, C.COST_NET_PRICE]],
-                             on=[C.DATE, C.BOND_CODE, C.BOND_NAME], how='left')
+        raw_group = pd.merge_asof(raw_group, holded, on=C.DATE, by=[C.BOND_CODE, C.BOND_NAME],
+                                  direction='backward', allow_exact_matches=False,
+                                  tolerance=pd.Timedelta(days=1)).reset_index(drop=True)
 
         # 3.3 理论上前一天的成本净价没有空值，但是源数据库数据有问题(20161219,160010)，暂时做此处理
         raw_group[C.COST_NET_PRICE] = raw_group[C.COST_NET_PRICE].fillna(100)
@@ -606,6 +786,7 @@ class SecurityTx:
         return raw_group
 
     # 4.1 计算单只债券的利息
+    @per_bond_cache
     def get_daily_insts(_self, bond_code: str) -> pd.DataFrame:
 
         """
@@ -646,6 +827,7 @@ class SecurityTx:
         return raw_inst
 
     # 4.2 计算单只债券的资本利得
+    @per_bond_cache
     def get_capital_gains(self, bond_code: str) -> pd.DataFrame:
 
         """
@@ -663,15 +845,15 @@ class SecurityTx:
             C.COST_NET_PRICE, C.CAPITAL_GAINS]
         """
 
-        if self.start_time > self.end_time or self.capital.empty or bond_code not in self.capital[C.BOND_CODE].tolist():
+        if self.start_time > self.end_time or bond_code not in self._bond_rows['capital']:
             return pd.DataFrame({})
 
-        mask = (self.capital[C.BOND_CODE] == bond_code)
-        capital = self.capital.loc[mask, :]
+        capital = self._bond_frame('capital', bond_code)
 
         return capital
 
     # 4.3 计算单只债券的净价浮盈
+    @per_bond_cache
     def get_net_profit(_self, bond_code: str) -> pd.DataFrame:
 
         """
@@ -705,6 +887,7 @@ class SecurityTx:
         return raw_value
 
     # 4.4 计算单只债券的总收益
+    @per_bond_cache
     def sum_profits(self, bond_code: str) -> pd.DataFrame:
         """
         汇总利息收入、资本利得和净价浮盈，计算总收益
@@ -721,8 +904,7 @@ class SecurityTx:
             C.BOND_TYPE, C.CAPITAL_GAINS, C.INST_A_DAY,C.VALUE_NET_PRICE, C.NET_PROFIT, C.TOTAL_PROFIT,C.CAPITAL_OCCUPY]
         """
 
-        if (self.start_time > self.end_time or self.holded_bonds_info.empty or
-                bond_code not in self.holded_bonds_info[C.BOND_CODE].tolist()):
+        if self.start_time > self.end_time or bond_code not in self._holded_codes:
             return pd.DataFrame({})
 
         # 如果有该债券的持仓，这两项一定不会是空值
@@ -797,24 +979,11 @@ class CDTx(SecurityTx):
     存单交易类
     """
 
-    def __init__(self, start_time: datetime.date, end_time: datetime.date) -> None:
-        super().__init__(start_time, end_time)
-
-        if not self.primary_trades.empty:
-            self.primary_trades = self.primary_trades.loc[self.primary_trades[C.BOND_TYPE_NUM] == 26, :]
-        if not self.secondary_trades.empty:
-            self.secondary_trades = self.secondary_trades.loc[self.secondary_trades[C.BOND_TYPE_NUM] == 26, :]
-        if not self.insts_flow_all.empty:
-            self.insts_flow_all = self.insts_flow_all.loc[self.insts_flow_all[C.BOND_TYPE_NUM] == 26, :]
-        if not self.value.empty:
-            self.value = self.value.loc[self.value[C.BOND_TYPE_NUM] == 26, :]
-        if not self.holded.empty:
-            self.holded = self.holded.loc[self.holded[C.BOND_TYPE_NUM] == 26, :]
-        if not self.capital.empty:
-            self.capital = self.capital.loc[self.capital[C.BOND_TYPE_NUM] == 26, :]
+    # 按持仓债券的类型筛选存单，不在持仓中的债券的交易不会被使用
+    held_trades_only = True
 
-        if not self.holded_bonds_info.empty:
-            self.holded_bonds_info = self.holded_bonds_info.loc[self.holded_bonds_info[C.BOND_TYPE_NUM] == 26, :]
+    def _type_mask(self, bond_type: pd.Series) -> Optional[pd.Series]:
+        return bond_type == 26
 
 
 class BondTx(SecurityTx):
@@ -822,23 +991,6 @@ class BondTx(SecurityTx):
     债券交易类
     """
 
-    def __init__(self, start_time: datetime.date, end_time: datetime.date) -> None:
-        super().__init__(start_time, end_time)
-
-        # with pd.option_context('display.max_rows', None, 'display.max_columns', None):
-        #     print(self.holded_bonds_info[[C.BOND_TYPE_NUM, C.BOND_NAME]])
-
-        if not self.primary_trades.empty:
-            self.primary_trades = self.primary_trades.loc[self.primary_trades[C.BOND_TYPE_NUM] != 26, :]
-        if not self.secondary_trades.empty:
-            self.secondary_trades = self.secondary_trades.loc[self.secondary_trades[C.BOND_TYPE_NUM] != 26, :]
-        if not self.insts_flow_all.empty:
-            self.insts_flow_all = self.insts_flow_all.loc[self.insts_flow_all[C.BOND_TYPE_NUM] != 26, :]
-        if not self.value.empty:
-            self.value = self.value.loc[self.value[C.BOND_TYPE_NUM] != 26, :]
-        if not self.holded.empty:
-            self.holded = self.holded.loc[self.holded[C.BOND_TYPE_NUM] != 26, :]
-        if not self.capital.empty:
-            self.capital = self.capital.loc[self.capital[C.BOND_TYPE_NUM] != 26, :]
-        if not self.holded_bonds_info.empty:
-            self.holded_bonds_info = self.holded_bonds_info.loc[self.holded_bonds_info[C.BOND_TYPE_NUM] != 26, :]
+    def _type_mask(self, bond_type: pd.Series) -> Optional[pd.Series]:
+        # 不在持仓中的债券类型为空值，同样保留
+        return bond_type != 26
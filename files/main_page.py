@@ -5,12 +5,16 @@
 import streamlit as st
 import streamlit_echarts
 
-from utils.web_data import OverviewDataHandler
+from utils.summary_store import MonthlySummaryStore
+from utils.web_data import OverviewDataHandler, FundDataHandler
 
 from datetime import datetime
 from utils.db_util import Constants as C
 from utils.web_view import main_page_by_type, main_page_all_profit
 
+# 并行生成月度报告的worker数量，为1时按顺序执行
+REPORT_WORKERS = 6
+
 st.set_page_config(page_title="业务总览",
                    page_icon="📈",
                    layout="wide",
@@ -44,21 +48,19 @@ with st.form("summary"):
 if txn_submit:
 
     with st.spinner('生成底层业务数据...'):
-        tx = OverviewDataHandler(year_num)
-
-    with st.spinner('生成回购业务数据...'):
-        repo = tx.fund_monthly_report_yoy(C.REPO, mark_rate, mark_rate)
-        repl = tx.fund_monthly_report_yoy(C.REPL)
-
-    with st.spinner('生成拆借业务数据...'):
-        ibo = tx.fund_monthly_report_yoy(C.IBO, mark_rate, mark_rate)
-        ibl = tx.fund_monthly_report_yoy(C.IBL)
+        # 已结束月份的统计数据从本地存储读取，只重新计算未结束的月份
+        tx = OverviewDataHandler(year_num, MonthlySummaryStore(), direct_monthly=True)
 
-    with st.spinner('生成债券业务数据...'):
-        bond = tx.security_monthly_report_yoy(C.BOND)
+    # 6类业务 × 2年的月度报告相互独立，并行生成
+    with st.spinner('生成各业务月度数据...'):
+        tx_data = tx.all_reports_yoy(mark_rate, mark_rate, max_workers=REPORT_WORKERS)
 
-    with st.spinner('生成存单业务数据...'):
-        cd = tx.security_monthly_report_yoy(C.CD)
+    repo = tx_data[C.REPO]
+    repl = tx_data[C.REPL]
+    ibo = tx_data[C.IBO]
+    ibl = tx_data[C.IBL]
+    bond = tx_data[C.BOND]
+    cd = tx_data[C.CD]
 
     df = tx.asset_debt_data()
 
@@ -72,6 +74,24 @@ if txn_submit:
 
     # todo 补充回购及拆借业务的套息收入，业务明细
 
+    def show_carry(data, title: str, key: str):
+        """
+        按基准利率测算资金融入的套息收入，只使用已生成的月度数据，调整利率时无需重新查询
+        """
+
+        carry_rate = st.slider(f"{title}套息测算的基准利率（%）", min_value=0.0, max_value=5.0,
+                               value=float(mark_rate), step=0.05, key=key)
+
+        # 以选定利率为中心，上下各5档，每档10bp
+        rates = [round(carry_rate + step * 0.1, 2) for step in range(-5, 6)]
+        carry = FundDataHandler.carry_income(data, rates) / 10000
+        carry.index = carry.index.strftime('%Y-%m')
+        carry.loc['合计'] = carry.sum()
+        carry.columns = [f'{rate:.2f}%' for rate in rates]
+
+        st.write(f"#### {title}套息收入测算（万元）")
+        st.dataframe(carry.style.format('{:,.2f}'), use_container_width=True)
+
     @st.fragment
     def show_main_page():
 
@@ -88,6 +108,8 @@ if txn_submit:
                                                                  '利息支出（万元）', C.INST_DAYS, '加权利率（%）',
                                                                  C.WEIGHT_RATE), height='500px')
 
+                show_carry(repo, '正回购', 'repo_carry_rate')
+
                 streamlit_echarts.st_pyecharts(main_page_by_type(repl, '逆回购', '日均余额（亿元）', C.AVG_AMT,
                                                                  '利息收入（万元）', C.INST_DAYS, '加权利率（%）',
                                                                  C.WEIGHT_RATE), height='500px')
@@ -96,6 +118,8 @@ if txn_submit:
                                                                  '利息支出（万元）', C.INST_DAYS, '加权利率（%）',
                                                                  C.WEIGHT_RATE), height='500px')
 
+                show_carry(ibo, '同业拆入', 'ibo_carry_rate')
+
                 streamlit_echarts.st_pyecharts(main_page_by_type(ibl, '同业拆出', '日均余额（亿元）', C.AVG_AMT,
                                                                  '利息收入（万元）', C.INST_DAYS, '加权利率（%）',
                                                                  C.WEIGHT_RATE), height='500px')
@@ -3,12 +3,19 @@
 # FileName: bond
 # Description: simple introduction of the code
 
+from datetime import datetime
+
 import streamlit as st
+import streamlit_echarts
 
-from bond_tx import SecurityTx
+from bond_tx import SecurityTx, BondTx, CDTx
+from fund_tx import Repo, IBO
+from utils.db_util import Constants as C
+from utils.profiler import StageProfiler, stage as profile_stage
 from utils.time_util import TimeUtil
 from utils.txn_factory import TxFactory
-from utils.web_data import SecurityDataHandler
+from utils.web_data import SecurityDataHandler, FundDataHandler
+from utils.web_view import security_line, fund_line_global, profile_waterfall, profile_memory_bar
 
 # set_page_config必须放在开头，不然会报错
 st.set_page_config(page_title="数据测试",
@@ -20,98 +27,200 @@ st.set_page_config(page_title="数据测试",
 st.markdown("## 🍳 数据测试")
 st.divider()
 
-txn = None
-
-# 按时间段查询的form
-with st.form("test"):
-    txn_start_time, txn_end_time, txn_cps_type = st.columns([1, 1, 3])
-    with txn_start_time:
-        start_time = st.date_input(
-            "⏱起始时间",
-            value=TimeUtil.get_current_and_last_month_dates()[1],
-            # 要明确每个组件的key，不然会共用一个组件
-            key='test_start_time'
-        )
-
-    with txn_end_time:
-        end_time = st.date_input(
-            "⏱结束时间",
-            value=TimeUtil.get_current_and_last_month_dates()[2],
-            key='test_end_time'
-        )
-
-    with txn_cps_type:
-        pass
-
-    txn_submit = st.form_submit_button('查  询')
-
-if txn_submit:
-    # txn = SecurityTx(start_time, end_time)
-    txn = TxFactory(SecurityTx).create_txn(start_time, end_time)
-
-bond_code = '112303195.IB'
-
-if txn is not None:
-    st.write('## 债券业务')
-    st.divider()
-
-    st.write('### 债券持仓记录')
-    st.write('#### 所有债券的基础信息, get_holded_bonds_info()，不包括收益凭证')
-    st.dataframe(txn.holded_bonds_info)
-
-    st.write('#### 持仓区间明细, get_holded_bonds')
-    st.dataframe(txn.holded)
-    # #
-    st.write('#### ' + bond_code + '的每日持仓, daily_holded_bond(bond_code)')
-    st.dataframe(txn.daily_holded_bond(bond_code))
-    st.divider()
-
-    st.write('### 利息计算')
-    st.write('#### 区间内持仓债券利息现金流, get_inst_flow_all()')
-    st.dataframe(txn.insts_flow_all)
-    #
-    st.write('#### ' + bond_code + '的利息现金流, inst_cash_flow(bond_code)')
-    st.dataframe(txn.get_inst_flow(bond_code))
-
-    st.write('#### ' + bond_code + '每日利息, get_daily_insts(bond_code)')
-    st.dataframe(txn.get_daily_insts(bond_code), use_container_width=True)
-    st.divider()
-
-    st.write('### 净价浮盈')
-    st.write('#### 区间内持仓债券估值get_daily_value_all()，若无估值，则在daily_value(bond_code)置为100')
-    st.dataframe(txn.value)
-
-    st.write('#### ' + bond_code + '的估值, get_daily_value(bond_code)')
-    st.dataframe(txn.get_daily_value(bond_code))
-
-    st.write('#### 净价浮盈, get_net_profit(bond_code)')
-    df7 = txn.get_net_profit(bond_code)
-    st.dataframe(df7, use_container_width=True)
-    st.divider()
-
-    st.write('### 资本利得')
-    st.write('#### 交易记录')
-    st.write('#### 一级申购，request_distributions()')
-    st.dataframe(txn.primary_trades)
-
-    st.write('#### 二级交易, get_all_trades()')
-    st.dataframe(txn.secondary_trades)
-
-    st.write('#### 资本利得, get_capital_all()')
-    st.dataframe(txn.capital, use_container_width=True)
-    st.divider()
-
-    st.write('### 综合收益汇总')
-    st.write('#### ' + bond_code + '的综合收益, sum_all_profit(bond_code)')
-    st.dataframe(txn.sum_profits(bond_code), use_container_width=True)
-
-    d = SecurityDataHandler(txn)
-
-    st.write('#### 每日收益合计, daily_yield_all()')
-    st.dataframe(d.daily_yield_all(), use_container_width=True)
-
-    st.write('#### 所有债券的总收益yield_all_cum_by_code(start_time, end_time)')
-    st.dataframe(d.yield_cum_by_code(start_time, end_time), use_container_width=True)
-
-    # st.write('#### ' + bond_code + '的总收益period_yield_bond(bond_code)')
-    # st.dataframe(d.period_yield_bond(bond_code), use_container_width=True)
+option = st.sidebar.selectbox(
+    "选择测试类型",
+    ("性能分析", "数据明细"),
+    key='test_option'
+)
+
+# 性能分析的交易类型：名称 -> (交易类, 资金业务的方向)
+PROFILE_TYPES = {
+    '全部固收': (SecurityTx, None),
+    '债券': (BondTx, None),
+    '存单': (CDTx, None),
+    '正回购': (Repo, C.REPO),
+    '逆回购': (Repo, C.REPL),
+    '同业拆入': (IBO, C.IBO),
+    '同业拆出': (IBO, C.IBL),
+}
+
+
+def run_profile(tx_name: str, start_time, end_time) -> StageProfiler:
+    """
+    按页面的调用顺序执行一次查询和计算，记录各阶段的耗时和内存
+    """
+    tx_class, direction = PROFILE_TYPES[tx_name]
+
+    with StageProfiler() as profiler:
+        with profile_stage(f"{tx_class.__name__}.__init__") as s:
+            txn = TxFactory(tx_class).create_txn(start_time, end_time)
+            s.frame(raw=getattr(txn, 'raw', None))
+
+        if direction is None:
+            dh = SecurityDataHandler(txn)
+
+            if not dh.raw.empty:
+                daily_all_cum = dh.period_yield_all_cum(start_time, end_time)
+                dh.period_yield_inst_cum(start_time, end_time)
+                dh.period_yield_credit_cum(start_time, end_time)
+                dh.yield_cum_by_code(start_time, end_time)
+
+                with profile_stage('chart: security_line'):
+                    security_line(daily_all_cum)
+        else:
+            with profile_stage('FundDataHandler.all_data_show') as s:
+                fh = FundDataHandler(txn)
+                fh.set_direction(direction)
+                data = fh.all_data_show()
+                s.frame(holded=data['holded'], party=data['party'])
+
+            if not data['holded'].empty:
+                with profile_stage('chart: fund_line_global'):
+                    fund_line_global(data['holded'], C.AS_DT, C.TRADE_AMT, "日均余额（亿元）")
+
+    return profiler
+
+
+if option == '性能分析':
+
+    with st.form("profile"):
+        txn_start_time, txn_end_time, txn_type = st.columns([1, 1, 3])
+        with txn_start_time:
+            start_time = st.date_input(
+                "⏱起始时间",
+                value=TimeUtil.get_current_and_last_month_dates()[1],
+                min_value=datetime(2013, 1, 1).date(),
+                key='profile_start_time'
+            )
+
+        with txn_end_time:
+            end_time = st.date_input(
+                "⏱结束时间",
+                value=TimeUtil.get_current_and_last_month_dates()[2],
+                min_value=datetime(2013, 1, 1).date(),
+                key='profile_end_time'
+            )
+
+        with txn_type:
+            tx_name = st.selectbox('交易类型', list(PROFILE_TYPES), key='profile_tx_type')
+
+        profile_submit = st.form_submit_button('分  析')
+
+    if profile_submit:
+        with st.spinner('性能分析中...'):
+            stages = run_profile(tx_name, start_time, end_time).to_frame()
+
+        top = stages[stages['depth'] == 0]
+        col1, col2, col3 = st.columns(3)
+        col1.metric("总耗时（秒）", '{:.3f}'.format(top['seconds'].sum()))
+        col2.metric("最大内存峰值增量（MB）", '{:.2f}'.format(stages['peak_mb'].max()))
+        col3.metric("SQL查询次数", int(stages['stage'].str.startswith('SQL ').sum()))
+
+        st.write("### 各阶段耗时")
+        st.caption("SQL阶段括号内为缓存情况：memory为进程内缓存，disk为本地Parquet缓存，miss为查询数据库。"
+                   "内存由tracemalloc统计，分析期间执行速度会变慢。")
+        streamlit_echarts.st_pyecharts(profile_waterfall(stages), height=f"{max(400, 28 * len(stages))}px")
+
+        st.write("### 各阶段内存")
+        streamlit_echarts.st_pyecharts(profile_memory_bar(stages), height=f"{max(400, 36 * len(stages))}px")
+
+        st.expander('详细数据').dataframe(stages, use_container_width=True)
+
+if option == '数据明细':
+    txn = None
+
+    # 按时间段查询的form
+    with st.form("test"):
+        txn_start_time, txn_end_time, txn_cps_type = st.columns([1, 1, 3])
+        with txn_start_time:
+            start_time = st.date_input(
+                "⏱起始时间",
+                value=TimeUtil.get_current_and_last_month_dates()[1],
+                # 要明确每个组件的key，不然会共用一个组件
+                key='test_start_time'
+            )
+
+        with txn_end_time:
+            end_time = st.date_input(
+                "⏱结束时间",
+                value=TimeUtil.get_current_and_last_month_dates()[2],
+                key='test_end_time'
+            )
+
+        with txn_cps_type:
+            pass
+
+        txn_submit = st.form_submit_button('查  询')
+
+    if txn_submit:
+        # txn = SecurityTx(start_time, end_time)
+        txn = TxFactory(SecurityTx).create_txn(start_time, end_time)
+        # 下面按同一支债券多次调用单支债券的方法，开启结果缓存
+        txn.enable_bond_cache()
+
+    bond_code = '112303195.IB'
+
+    if txn is not None:
+        st.write('## 债券业务')
+        st.divider()
+
+        st.write('### 债券持仓记录')
+        st.write('#### 所有债券的基础信息, get_holded_bonds_info()，不包括收益凭证')
+        st.dataframe(txn.holded_bonds_info)
+
+        st.write('#### 持仓区间明细, get_holded_bonds')
+        st.dataframe(txn.holded)
+        # #
+        st.write('#### ' + bond_code + '的每日持仓, daily_holded_bond(bond_code)')
+        st.dataframe(txn.daily_holded_bond(bond_code))
+        st.divider()
+
+        st.write('### 利息计算')
+        st.write('#### 区间内持仓债券利息现金流, get_inst_flow_all()')
+        st.dataframe(txn.insts_flow_all)
+        #
+        st.write('#### ' + bond_code + '的利息现金流, inst_cash_flow(bond_code)')
+        st.dataframe(txn.get_inst_flow(bond_code))
+
+        st.write('#### ' + bond_code + '每日利息, get_daily_insts(bond_code)')
+        st.dataframe(txn.get_daily_insts(bond_code), use_container_width=True)
+        st.divider()
+
+        st.write('### 净价浮盈')
+        st.write('#### 区间内持仓债券估值get_daily_value_all()，若无估值，则在daily_value(bond_code)置为100')
+        st.dataframe(txn.value)
+
+        st.write('#### ' + bond_code + '的估值, get_daily_value(bond_code)')
+        st.dataframe(txn.get_daily_value(bond_code))
+
+        st.write('#### 净价浮盈, get_net_profit(bond_code)')
+        df7 = txn.get_net_profit(bond_code)
+        st.dataframe(df7, use_container_width=True)
+        st.divider()
+
+        st.write('### 资本利得')
+        st.write('#### 交易记录')
+        st.write('#### 一级申购，request_distributions()')
+        st.dataframe(txn.primary_trades)
+
+        st.write('#### 二级交易, get_all_trades()')
+        st.dataframe(txn.secondary_trades)
+
+        st.write('#### 资本利得, get_capital_all()')
+        st.dataframe(txn.capital, use_container_width=True)
+        st.divider()
+
+        st.write('### 综合收益汇总')
+        st.write('#### ' + bond_code + '的综合收益, sum_all_profit(bond_code)')
+        st.dataframe(txn.sum_profits(bond_code), use_container_width=True)
+
+        d = SecurityDataHandler(txn)
+
+        st.write('#### 每日收益合计, daily_yield_all()')
+        st.dataframe(d.daily_yield_all(), use_container_width=True)
+
+        st.write('#### 所有债券的总收益yield_all_cum_by_code(start_time, end_time)')
+        st.dataframe(d.yield_cum_by_code(start_time, end_time), use_container_width=True)
+
+        # st.write('#### ' + bond_code + '的总收益period_yield_bond(bond_code)')
+        # st.dataframe(d.period_yield_bond(bond_code), use_container_width=True)
@@ -4,6 +4,7 @@
 # Description: This module contains classes for handling transactions.
 import datetime
 
+import numpy as np
 import pandas as pd
 
 from utils.db_util import Constants as C, create_conn, get_raw
@@ -86,11 +87,12 @@ class FundTx:
 
         return raw
 
-    def daily_data(self, direction: int) -> pd.DataFrame:
+    def daily_data(self, direction: int, raw: pd.DataFrame = None) -> pd.DataFrame:
         """
         获取统计区间内每日持仓的统计数据.
 
         :param direction: 交易方向，资金融入4，资金融出1
+        :param raw: 已按交易方向筛选的源数据，为None时由raw_by_direction(direction)生成
 
         Returns:
             pd.DataFrame: [AS_DT, C.TRADE_AMT, C.INST_DAYS, C.WEIGHT_RATE]
@@ -100,7 +102,7 @@ class FundTx:
         if self.raw.empty:
             return pd.DataFrame({})
 
-        r = self.raw.loc[self.raw[C.DIRECTION] == direction, :]
+        r = self.raw_by_direction(direction) if raw is None else raw
 
         if r.empty:
             return r
@@ -134,6 +136,57 @@ class FundTx:
 
         return daily
 
+    def monthly_data(self, direction: int) -> pd.DataFrame:
+        """
+        获取统计区间内每月的统计数据，不展开为每日数据.
+
+        按每笔交易的[C.AS_DT, C.AE_DT)与各自然月的交集天数直接计算月度积数和利息，结果与daily_data按月汇总一致.
+
+        :param direction: 交易方向，资金融入4，资金融出1
+
+        Returns:
+            pd.DataFrame: 以各月最后一天C.AS_DT为索引, [C.PRODUCT, C.INST_DAYS, C.AVG_AMT, C.WEIGHT_RATE]
+        """
+
+        if self.raw.empty:
+            return pd.DataFrame({})
+
+        r = self.raw_by_direction(direction)
+
+        if r.empty:
+            return pd.DataFrame({})
+
+        # 各月的起始日和下月的起始日（不含），首尾两个月按统计区间截取
+        months = pd.period_range(start=self.start_time, end=self.end_time, freq='M')
+        month_start = np.maximum(months.start_time.values, np.datetime64(pd.Timestamp(self.start_time), 'ns'))
+        month_next = np.minimum((months + 1).start_time.values,
+                                np.datetime64(pd.Timestamp(self.end_time) + datetime.timedelta(days=1), 'ns'))
+
+        as_dt = r[C.AS_DT].values.astype('datetime64[ns]')
+        ae_dt = r[C.AE_DT].values.astype('datetime64[ns]')
+        trade_amt = r[C.TRADE_AMT].to_numpy(dtype=float)
+        inst_a_day = r[C.INST_A_DAY].to_numpy(dtype=float)
+
+        product = np.zeros(len(months))
+        inst = np.zeros(len(months))
+
+        # 分块计算交易 × 月份的交集天数，避免多年统计时矩阵过大
+        chunk = 50000
+        for i in range(0, len(r), chunk):
+            overlap = (np.minimum(ae_dt[i:i + chunk, None], month_next[None, :]) -
+                       np.maximum(as_dt[i:i + chunk, None], month_start[None, :]))
+            days = np.clip(overlap / np.timedelta64(1, 'D'), 0, None)
+
+            product += trade_amt[i:i + chunk] @ days
+            inst += inst_a_day[i:i + chunk] @ days
+
+        monthly = pd.DataFrame({C.PRODUCT: product, C.INST_DAYS: inst},
+                               index=pd.DatetimeIndex(months.end_time.normalize(), name=C.AS_DT))
+        monthly[C.AVG_AMT] = monthly[C.PRODUCT] / monthly.index.days_in_month
+        monthly[C.WEIGHT_RATE] = (monthly[C.INST_DAYS] * self.inst_base / monthly[C.PRODUCT] * 100).fillna(0)
+
+        return monthly
+
     # 交易对手排名
     # def party_rank(self) -> pd.DataFrame:
     #     """
@@ -229,19 +282,21 @@ class FundTx:
 
         return self.raw.loc[self.raw[C.DIRECTION] == direction]
 
-    def groupby_column(self, column: str, direction: int) -> pd.DataFrame:
+    def groupby_column(self, column: str, direction: int, raw: pd.DataFrame = None) -> pd.DataFrame:
         """
         将原始数据按照特定列group聚合.
 
         Args:
             column (str): 被聚合的列.
             direction(int): 交易方向，资金融入（正回购4，同业拆入1），资金融出（逆回购1，同业拆出4）
+            raw (pd.DataFrame): 已按交易方向筛选的源数据，为None时由raw_by_direction(direction)生成
 
         Returns:
             pd.DataFrame: [column, C.AVG_AMT, C.INST_GROUP, C.PRODUCT, C.WEIGHT_RATE].
         """
 
-        raw = self.raw_by_direction(direction)
+        if raw is None:
+            raw = self.raw_by_direction(direction)
 
         # 按期限类型进行分组
         txn_group = raw.groupby(raw[column])
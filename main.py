@@ -1,5 +1,8 @@
 import streamlit as st
 
+from utils.db_util import memory_cache
+from utils.warmup import read_status, is_ready
+
 main_page = st.Page("files/main_page.py", title="业务总览", icon=":material/monitoring:")
 repo_page = st.Page("files/repo.py", title="回购业务", icon=":material/monitoring:")
 ibo_page = st.Page("files/ibo.py", title="拆借业务", icon=":material/leaderboard:")
@@ -13,3 +16,17 @@ pg = st.navigation(
     }
 )
 pg.run()
+
+# 当天的缓存预热情况，由python -m utils.warmup生成
+warmup_status = read_status()
+if is_ready(warmup_status):
+    st.sidebar.caption(f"✅ 常用报表已预热（{warmup_status['finished'][11:16]}）")
+elif warmup_status.get('state') == 'running':
+    st.sidebar.caption("⏳ 常用报表预热中，首次查询可能较慢")
+else:
+    st.sidebar.caption("常用报表今日未预热，首次查询可能较慢")
+
+# 查询结果缓存的运行情况
+stats = memory_cache.stats()
+st.sidebar.caption(f"查询缓存：{stats['entries']}项，{stats['bytes'] / 1024 ** 2:.0f}/{stats['max_bytes'] / 1024 ** 2:.0f}MB，"
+                   f"命中率{stats['hit_ratio']:.0%}，淘汰{stats['evictions']}次")
@@ -0,0 +1,170 @@
+# Author: RockMan
+# CreateTime: 2026/10/19
+# FileName: bond_ref
+# Description: This module contains the BondReference class which caches bond reference data in the process.
+
+import argparse
+import threading
+import time
+from typing import Dict, Iterable
+
+import pandas as pd
+
+from utils.db_util import Constants as C, create_conn, get_raw
+
+
+class BondReference:
+    """
+    进程内共享的债券参考数据，按债券代码缓存基础信息（basic_bondbasicinfos）和利息现金流（basic_bondcashflows）。
+
+    请求的债券中已缓存且未过期的直接返回，只查询从未读取过或已过期的债券代码；数据库中没有数据的代码同样记录，
+    有效期内不再查询。现金流读取每支债券的全部计息期，由使用者按统计区间筛选，不同区间的交易对象可以共用。
+    参考数据很少变化，默认有效期为1天，需要立即更新时调用refresh。所有操作都加锁，可在多线程中使用。
+
+    Attributes:
+        ttl (float): 每支债券数据的有效期（秒）。
+        batch_size (int): 每次查询的最大债券代码数量。
+    """
+
+    # 基础信息的列，不含债券简称，简称以持仓中的为准
+    INFO_COLUMNS = [C.BOND_FULL_NAME, C.BOND_CODE, C.BOND_TYPE_NUM, C.BOND_TYPE, C.ISSUE_DATE, C.MATURITY,
+                    C.COUPON_RATE_CURRENT, C.COUPON_RATE_ISSUE, C.ISSUE_AMT, C.ISSUE_PRICE, C.ISSUE_ORG, C.BOND_TERM]
+
+    # 利息现金流的列
+    CASHFLOW_COLUMNS = [C.BOND_CODE, C.BOND_NAME, C.INST_START_DATE, C.INST_END_DATE, C.ACCRUAL_DAYS, C.PERIOD_INST]
+
+    # 数据类别 -> (表名, 列)
+    TABLES = {
+        'info': ('basic_bondbasicinfos', INFO_COLUMNS),
+        'cashflows': ('basic_bondcashflows', CASHFLOW_COLUMNS),
+    }
+
+    def __init__(self, ttl: float = 24 * 3600, batch_size: int = 1000) -> None:
+        """
+        构造函数
+
+        Args:
+            ttl (float, optional): 每支债券数据的有效期（秒），默认为1天，与磁盘缓存的参考数据一致。
+            batch_size (int, optional): 每次查询的最大债券代码数量，默认为1000。
+        """
+
+        self.ttl = ttl
+        self.batch_size = batch_size
+        # 数据类别 -> 数据
+        self._data = {kind: pd.DataFrame(columns=columns) for kind, (_, columns) in self.TABLES.items()}
+        # 数据类别 -> {债券代码 -> 读取时间}
+        self._fetched = {kind: {} for kind in self.TABLES}
+        self._lock = threading.Lock()
+
+    def _fetch(self, kind: str, codes: list, refresh: bool = False) -> None:
+        table, columns = self.TABLES[kind]
+        data = []
+
+        for i in range(0, len(codes), self.batch_size):
+            codes_str = ', '.join(f"'{code}'" for code in codes[i:i + self.batch_size])
+            sql = f"select {', '.join(f'bb.{column}' for column in columns)} from {C.COMP_DBNAME}.{table} bb " \
+                  f"where bb.{C.BOND_CODE} in ({codes_str})"
+            data.append(get_raw(create_conn(), sql, refresh=refresh))
+
+        fetched = pd.concat(data, ignore_index=True).reindex(columns=columns).drop_duplicates()
+        kept = self._data[kind].loc[~self._data[kind][C.BOND_CODE].isin(codes)]
+        # 空的DataFrame不参与合并，避免列类型变为object
+        frames = [frame for frame in (kept, fetched) if not frame.empty]
+        self._data[kind] = pd.concat(frames, ignore_index=True) if len(frames) > 1 else \
+            frames[0] if frames else fetched
+
+        now = time.monotonic()
+        self._fetched[kind].update({code: now for code in codes})
+
+    def _get(self, kind: str, codes: Iterable[str]) -> pd.DataFrame:
+        codes = list(dict.fromkeys(codes))
+
+        with self._lock:
+            now = time.monotonic()
+            fetched = self._fetched[kind]
+            stale = [code for code in codes if now - fetched.get(code, -float('inf')) > self.ttl]
+            if stale:
+                self._fetch(kind, stale)
+
+            data = self._data[kind]
+
+        return data.loc[data[C.BOND_CODE].isin(codes)].reset_index(drop=True)
+
+    def info(self, codes: Iterable[str]) -> pd.DataFrame:
+        """
+        债券基础信息。
+
+        Args:
+            codes (Iterable[str]): 债券代码。
+
+        Returns:
+            pd.DataFrame: INFO_COLUMNS，只包含数据库中有信息的债券。
+        """
+
+        return self._get('info', codes)
+
+    def cashflows(self, codes: Iterable[str]) -> pd.DataFrame:
+        """
+        债券的全部利息现金流，按债券代码和计息开始日排序。
+
+        Args:
+            codes (Iterable[str]): 债券代码。
+
+        Returns:
+            pd.DataFrame: CASHFLOW_COLUMNS，只包含数据库中有现金流的债券。
+        """
+
+        data = self._get('cashflows', codes)
+
+        return data.sort_values([C.BOND_CODE, C.INST_START_DATE], kind='stable').reset_index(drop=True)
+
+    def refresh(self, codes: Iterable[str] = None) -> None:
+        """
+        立即从数据库重新读取已缓存的债券数据，不经过查询缓存。
+
+        Args:
+            codes (Iterable[str], optional): 债券代码，默认为全部已缓存的债券；未缓存过的代码忽略。
+        """
+
+        with self._lock:
+            for kind, fetched in self._fetched.items():
+                targets = list(fetched) if codes is None else [code for code in dict.fromkeys(codes) if code in fetched]
+                if targets:
+                    self._fetch(kind, targets, refresh=True)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        缓存的债券数量和行数。
+
+        Returns:
+            Dict[str, int]: {info_bonds, info_rows, cashflows_bonds, cashflows_rows}
+        """
+
+        with self._lock:
+            return {f"{kind}_{name}": value for kind in self.TABLES
+                    for name, value in (('bonds', len(self._fetched[kind])), ('rows', len(self._data[kind])))}
+
+    def clear(self) -> None:
+        """
+        清空缓存，下次使用时重新读取。
+        """
+
+        with self._lock:
+            self._data = {kind: pd.DataFrame(columns=columns) for kind, (_, columns) in self.TABLES.items()}
+            self._fetched = {kind: {} for kind in self.TABLES}
+
+
+# 进程内共享的债券参考数据，BondTx、CDTx以及业务总览中今年和上一年的交易对象共用
+bond_reference = BondReference()
+
+
+if __name__ == '__main__':
+    # 读取债券参考数据并查看缓存，例如：FM_DATA_DB=mirror python -m utils.bond_ref 2300000.SH 2300002.IB
+    parser = argparse.ArgumentParser(description='读取债券基础信息和利息现金流')
+    parser.add_argument('codes', nargs='+', help='债券代码')
+    args = parser.parse_args()
+
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', 200):
+        print(bond_reference.info(args.codes))
+        print(bond_reference.cashflows(args.codes))
+        print(bond_reference.stats())
@@ -3,8 +3,33 @@
 # FileName: db_util
 # Description: This module provides utility functions for database operations.
 
+import os
+import sqlite3
+import time
+import weakref
+from datetime import datetime, date
+from typing import Tuple
+
 import pandas as pd
 import streamlit as st
+from sqlalchemy import event, text
+from sqlalchemy.pool import QueuePool
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    import connectorx as cx
+except ImportError:
+    cx = None
+
+from utils.disk_cache import ParquetCache
+from utils.memory_cache import MemoryCache
+from utils.profiler import stage as profile_stage
+from utils.query_log import QueryLog
+from utils.replay import QueryRecorder
 
 
 class Constants:
@@ -15,6 +40,12 @@ class Constants:
     # ------------------------数据仓库字段------------------------
     # Database connection name
     COMP_DBNAME = 'upsrod'
+    # 市场数据库
+    MARKET_DBNAME = 'fm_da'
+    # 本地镜像的连接名
+    MIRROR_DBNAME = 'mirror'
+    # 回放数据源，从记录文件读取查询结果，不连接数据库
+    REPLAY_DBNAME = 'replay'
     # 成交单编号
     TRADE_NO = 'execid'
     # 期限种类
@@ -187,6 +218,8 @@ class Constants:
     INST_GROUP = 'inst_group'
     # 加权利率
     WEIGHT_RATE = 'weight_rate'
+    # 套息基数，套息收入 = 套息基数 × (基准利率 - 加权利率)
+    CARRY_BASE = 'carry_base'
     # 日均余额
     AVG_AMT = 'avg_amt'
     # 交易笔数
@@ -240,26 +273,236 @@ class Constants:
     # 同比
     YOY = '_yoy'
 
+    # ------------------------本地存储------------------------
+    # 本地缓存、物化数据等的根目录
+    LOCAL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.fm_cache')
+    # 本地镜像目录，每个数据库对应其中的一个SQLite文件；可用环境变量FM_DATA_MIRROR_DIR指定
+    MIRROR_DIR = os.environ.get('FM_DATA_MIRROR_DIR', os.path.join(LOCAL_DIR, 'mirror'))
+    # 查询结果的记录目录，回放数据源从中读取；可用环境变量FM_DATA_RECORD_DIR指定
+    RECORD_DIR = os.environ.get('FM_DATA_RECORD_DIR', os.path.join(LOCAL_DIR, 'recordings'))
+
+
+# 数据库对象 -> 数据源名称，由create_conn登记
+_conn_sources = weakref.WeakKeyDictionary()
+
 
 @st.cache_resource
-def create_conn(db=Constants.COMP_DBNAME) -> st.connection:
+def create_conn(db: str = None) -> st.connection:
     """
     建立一个数据库对象
 
-    :param db: 数据库名，默认为'upsrod'
+    :param db: 数据库名，默认取环境变量FM_DATA_DB，未设置时为'upsrod'；为'mirror'时连接本地镜像，
+        为'replay'时回放RECORD_DIR中记录的查询结果
     :return: 数据库对象
     """
-    return st.connection(db, type='sql', ttl=600, max_entries=40)
+    if db is None:
+        db = os.environ.get('FM_DATA_DB', Constants.COMP_DBNAME)
+
+    if db == Constants.MIRROR_DBNAME:
+        conn = _mirror_conn()
+    elif db == Constants.REPLAY_DBNAME:
+        # 回放时get_raw不会执行查询，用一个空的内存库作为数据库对象
+        conn = st.connection(Constants.REPLAY_DBNAME, type='sql', url='sqlite://')
+    else:
+        conn = st.connection(db, type='sql', ttl=600, max_entries=40)
+
+    _conn_sources[conn] = db
+
+    return conn
+
+
+def conn_source(conn: st.connection) -> str:
+    """
+    数据库对象的数据源名称，即建立时create_conn的db参数，用于区分不同数据源的缓存
+
+    :param conn: 数据库对象
+    :return: 数据源名称，不是由create_conn建立的对象返回空字符串
+    """
+    try:
+        return _conn_sources.get(conn, '')
+    except TypeError:
+        return ''
+
+
+def _mirror_conn() -> st.connection:
+    """
+    连接由utils.mirror同步的本地镜像。
+
+    每个数据库的镜像为MIRROR_DIR下的一个SQLite文件，以原数据库名attach到内存库上，
+    因此各查询中的'upsrod.表名'、'fm_da.表名'无需修改。
+
+    :return: 数据库对象
+    """
+    # 镜像中的日期时间保存为ISO格式的文本，读取时按声明的列类型转换
+    sqlite3.register_converter('DATETIME', lambda b: datetime.fromisoformat(b.decode()))
+    sqlite3.register_converter('DATE', lambda b: date.fromisoformat(b.decode()))
+
+    os.makedirs(Constants.MIRROR_DIR, exist_ok=True)
+
+    # 内存库默认使用SingletonThreadPool，每个线程一个连接且最多保留5个，多线程并行查询时会关闭其他线程正在使用的连接；
+    # 改用QueuePool，每个连接都是独立的内存库，由_attach_mirror attach镜像文件
+    conn = st.connection(Constants.MIRROR_DBNAME, type='sql', ttl=600, max_entries=40, url='sqlite://',
+                         connect_args={'detect_types': sqlite3.PARSE_DECLTYPES, 'check_same_thread': False},
+                         poolclass=QueuePool)
+
+    # create_conn()和create_conn('mirror')是不同的缓存键，但得到同一个命名的连接对象，监听只注册一次
+    if not event.contains(conn.engine, 'connect', _attach_mirror):
+        event.listen(conn.engine, 'connect', _attach_mirror)
+
+    return conn
+
+
+def _attach_mirror(dbapi_conn, _) -> None:
+    # 新建的连接上attach各数据库的镜像文件，已attach的跳过
+    attached = {row[1] for row in dbapi_conn.execute("pragma database_list")}
+
+    for schema in (Constants.COMP_DBNAME, Constants.MARKET_DBNAME):
+        if schema not in attached:
+            dbapi_conn.execute(f"attach database ? as {schema}", (os.path.join(Constants.MIRROR_DIR, f"{schema}.db"),))
+
+
+# 查询结果的本地Parquet缓存，在进程间共享，重启后仍然有效；设置环境变量FM_DATA_DISK_CACHE=0可关闭
+disk_cache = ParquetCache(os.path.join(Constants.LOCAL_DIR, 'query')) \
+    if os.environ.get('FM_DATA_DISK_CACHE', '1') != '0' else None
+
+# 查询结果的进程内缓存，按内存占用限制总大小；上限可用环境变量FM_DATA_MEM_CACHE_MB设置，默认为1024MB
+memory_cache = MemoryCache(int(os.environ.get('FM_DATA_MEM_CACHE_MB', '1024')) * 1024 ** 2)
+
+# 最近1000次查询的耗时和结果大小；设置环境变量FM_DATA_QUERY_LOG为文件路径时，每次查询同时以JSON行追加到该文件
+query_log = QueryLog(1000, os.environ.get('FM_DATA_QUERY_LOG'))
+
+# 查询结果的记录：设置环境变量FM_DATA_RECORD=1时，get_raw的每个查询结果都记录到RECORD_DIR，供回放数据源读取；
+# FM_DATA_RECORD_ANONYMIZE=1时匿名化交易对手和交易员名称，假名的salt取FM_DATA_RECORD_SALT
+recorder = QueryRecorder(Constants.RECORD_DIR, os.environ.get('FM_DATA_RECORD', '0') == '1',
+                         os.environ.get('FM_DATA_RECORD_ANONYMIZE', '0') == '1',
+                         os.environ.get('FM_DATA_RECORD_SALT', ''))
+
+
+def _query(_conn: st.connection, sql: str) -> Tuple[pd.DataFrame, float, float]:
+    """
+    直接查询数据库，分别计时数据库执行和DataFrame构造。st.connection.query自带的st.cache_data缓存没有大小限制，因此不使用。
+
+    :param _conn: 数据库对象
+    :param sql: SQL查询语句
+    :return: (查询到的数据, 数据库执行和读取结果的耗时, 构造DataFrame的耗时)
+    """
+    with _conn.engine.connect() as conn:
+        start = time.perf_counter()
+        result = conn.execute(text(sql))
+        columns = list(result.keys())
+        rows = result.fetchall()
+        fetched = time.perf_counter()
+
+    # 与pd.read_sql的转换方式一致
+    raw = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+
+    return raw, fetched - start, time.perf_counter() - fetched
+
 
+# 以Arrow列式读取查询结果：设置环境变量FM_DATA_ARROW=1时使用，需要安装pyarrow；安装了connectorx时由其直接读取MySQL
+arrow_fetch = os.environ.get('FM_DATA_ARROW', '0') == '1' and pa is not None
 
-@st.cache_data
-def get_raw(_conn: st.connection, sql: str) -> pd.DataFrame:
+
+def _query_arrow(_conn: st.connection, sql: str, batch_size: int = 100000) -> Tuple[pd.DataFrame, float, float]:
     """
-    从数据库中查询数据
+    以Arrow列式读取查询结果，由Arrow表整列转为DataFrame，不经过DataFrame.from_records的逐行转换。
+
+    MySQL数据源在安装了connectorx时由其直接读取为Arrow表；否则按batch_size分批fetchmany，
+    每批按列构造Arrow数组后合并，各批推断的类型不同时（如某批全为空值）自动提升。
+    DECIMAL列转为float64，与_query的coerce_float一致。
+
+    转换后的列类型与_query相同：字符串为Arrow存储的str类型，数值和日期时间为numpy类型。
+    全部使用pd.ArrowDtype时，日期列无法与页面中pd.date_range生成的日期合并，因此不使用。
 
     :param _conn: 数据库对象
     :param sql: SQL查询语句
+    :param batch_size: 每批读取的行数
+    :return: (查询到的数据, 数据库执行和读取结果的耗时, 构造DataFrame的耗时)
+    """
+    url = _conn.engine.url
+    start = time.perf_counter()
+
+    if cx is not None and url.get_backend_name() == 'mysql':
+        table = cx.read_sql(url.set(drivername='mysql').render_as_string(hide_password=False), sql,
+                            return_type='arrow')
+    else:
+        with _conn.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(text(sql))
+            columns = list(result.keys())
+
+            # 查询结果可能有重名的列，合并时先按位置命名
+            names = [str(i) for i in range(len(columns))]
+            tables = []
+            while rows := result.fetchmany(batch_size):
+                tables.append(pa.table([pa.array(column) for column in zip(*rows)], names=names))
+
+        table = pa.concat_tables(tables, promote_options='permissive').rename_columns(columns) if tables else None
+
+    fetched = time.perf_counter()
+
+    if table is None:
+        return pd.DataFrame(columns=columns), fetched - start, 0.0
+
+    for i, field in enumerate(table.schema):
+        if pa.types.is_decimal(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.float64()))
+
+    raw = table.to_pandas()
+
+    return raw, fetched - start, time.perf_counter() - fetched
+
+
+def get_raw(_conn: st.connection, sql: str, refresh: bool = False) -> pd.DataFrame:
+    """
+    从数据库中查询数据，依次查找进程内缓存和本地Parquet缓存，都没有时再查询数据库并写入缓存。
+    回放数据源不查找本地Parquet缓存和数据库，直接读取记录的查询结果。
+    每次调用都记录到query_log中；打开记录时，查询结果同时记录到recorder
+
+    :param _conn: 数据库对象
+    :param sql: SQL查询语句
+    :param refresh: 为True时不查找缓存，直接查询数据库并更新缓存，回放数据源不适用
     :return: 查询到的数据
     """
 
-    return _conn.query(sql)
+    caller = QueryLog.caller()
+
+    with profile_stage(f"SQL {caller}") as stage:
+        start = time.perf_counter()
+        db_seconds = frame_seconds = 0.0
+
+        # 不同数据源的查询结果分开缓存
+        source = conn_source(_conn)
+        key = (source, ParquetCache.normalize(sql))
+
+        raw = memory_cache.get(key) if not refresh or source == Constants.REPLAY_DBNAME else None
+        if raw is not None:
+            cache, nbytes = 'memory', memory_cache.size(key)
+        elif source == Constants.REPLAY_DBNAME:
+            raw, cache = recorder.load(sql), 'replay'
+            nbytes = int(raw.memory_usage(index=True, deep=True).sum())
+            memory_cache.put(key, raw, None, nbytes)
+        else:
+            raw = disk_cache.get(sql, source) if disk_cache is not None and not refresh else None
+            cache = 'disk'
+            if raw is None:
+                raw, db_seconds, frame_seconds = (_query_arrow if arrow_fetch else _query)(_conn, sql)
+                cache = 'miss'
+                if disk_cache is not None:
+                    disk_cache.put(sql, raw, source)
+
+            nbytes = int(raw.memory_usage(index=True, deep=True).sum())
+            # 与本地缓存的有效期一致，没有本地缓存时不过期
+            memory_cache.put(key, raw, disk_cache.ttl(sql) if disk_cache is not None else None, nbytes)
+
+        if recorder.record and source != Constants.REPLAY_DBNAME:
+            recorder.save(sql, raw, source)
+
+        stage.name = f"SQL {caller} ({cache})"
+        stage.frame(result=raw)
+
+        query_log.record(caller=caller, source=source, cache=cache,
+                         seconds=round(time.perf_counter() - start, 6), db_seconds=round(db_seconds, 6),
+                         frame_seconds=round(frame_seconds, 6), rows=len(raw), columns=raw.shape[1], bytes=nbytes,
+                         sql=key[1])
+
+    return raw
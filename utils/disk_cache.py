@@ -0,0 +1,257 @@
+# Author: RockMan
+# CreateTime: 2026/10/19
+# FileName: disk_cache
+# Description: This module contains the ParquetCache class which persists query results as Parquet files.
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Iterator, Optional
+
+import pandas as pd
+
+from utils.file_util import atomic_write
+
+logger = logging.getLogger(__name__)
+
+# SQL中的日期常量，如'2024-01-01'
+_DATE_LITERAL = re.compile(r"'(\d{4}-\d{2}-\d{2})'")
+
+
+class ParquetCache:
+    """
+    查询结果的本地Parquet缓存，不依赖Streamlit运行环境，重启或重新部署后仍然有效。
+
+    按标准化后的SQL计算哈希值作为文件名，不同的表类别使用不同的有效期：
+        - 历史数据：SQL中所有日期常量都早于今天settle_days天以上，数据基本不会变化，有效期最长；较近的日期
+          可能还有隔夜导入、补录交易或持仓修正，按当日数据处理。
+        - 参考数据：机构、债券基础信息等没有日期条件的基础表。
+        - 当日数据：其他查询，包含今天或没有日期条件的交易数据，有效期最短。
+
+    写入时先写临时文件再替换，缓存总大小超过上限时，按最近访问时间删除最久未使用的文件。
+    有效期按文件的修改时间计算，在hold中写入的缓存至少有效到指定的时间，用于预热。
+
+    Attributes:
+        path (str): 缓存目录。
+        history_ttl (float): 历史数据的有效期（秒）。
+        reference_ttl (float): 参考数据的有效期（秒）。
+        today_ttl (float): 当日数据的有效期（秒）。
+        settle_days (int): 早于今天这么多天的数据视为历史数据。
+        max_bytes (int): 缓存文件的总大小上限（字节）。
+    """
+
+    # 没有日期条件的基础表
+    REFERENCE_TABLES = ('basic_agencies', 'basic_agencies_relation', 'basic_bondbasicinfos', 'basic_bondcashflows')
+
+    def __init__(self, path: str, history_ttl: float = 7 * 24 * 3600, reference_ttl: float = 24 * 3600,
+                 today_ttl: float = 600, settle_days: int = 7, max_bytes: int = 2 * 1024 ** 3) -> None:
+        """
+        构造函数
+
+        Args:
+            path (str): 缓存目录。
+            history_ttl (float, optional): 历史数据的有效期（秒），默认为7天。
+            reference_ttl (float, optional): 参考数据的有效期（秒），默认为1天。
+            today_ttl (float, optional): 当日数据的有效期（秒），默认为600秒，与create_conn一致。
+            settle_days (int, optional): 早于今天这么多天的数据视为历史数据，默认为7天，与本地估值存储一致。
+            max_bytes (int, optional): 缓存文件的总大小上限（字节），默认为2GB。
+        """
+
+        self.path = path
+        self.history_ttl = history_ttl
+        self.reference_ttl = reference_ttl
+        self.today_ttl = today_ttl
+        self.settle_days = settle_days
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # 当前线程在hold中时，写入的缓存至少有效到的时间戳
+        self._hold = threading.local()
+
+    @staticmethod
+    def normalize(sql: str) -> str:
+        """
+        标准化SQL：合并连续的空白字符，去掉首尾空白和结尾的分号。
+
+        Args:
+            sql (str): SQL查询语句。
+
+        Returns:
+            str: 标准化后的SQL。
+        """
+
+        return re.sub(r'\s+', ' ', sql).strip().rstrip(';').strip()
+
+    def key(self, sql: str, source: str = '') -> str:
+        """
+        缓存键，为数据源名称和标准化SQL的sha256。
+
+        Args:
+            sql (str): SQL查询语句。
+            source (str, optional): 数据源名称，不同数据源的结果分开缓存。
+
+        Returns:
+            str: 缓存键。
+        """
+
+        return hashlib.sha256(f"{source}\n{self.normalize(sql)}".encode('utf-8')).hexdigest()
+
+    def ttl(self, sql: str) -> float:
+        """
+        按SQL涉及的表类别确定有效期。
+
+        Args:
+            sql (str): SQL查询语句。
+
+        Returns:
+            float: 有效期（秒）。
+        """
+
+        dates = _DATE_LITERAL.findall(sql)
+
+        if dates:
+            # 日期常量均早于今天settle_days天以上的为历史数据
+            settled = (date.today() - timedelta(days=self.settle_days)).strftime('%Y-%m-%d')
+            return self.history_ttl if max(dates) < settled else self.today_ttl
+
+        tables = re.findall(r'\b(?:from|join)\s+(?:\w+\.)?(\w+)', sql, flags=re.IGNORECASE)
+        if tables and all(table in self.REFERENCE_TABLES for table in tables):
+            return self.reference_ttl
+
+        return self.today_ttl
+
+    @contextmanager
+    def hold(self, until: float) -> Iterator['ParquetCache']:
+        """
+        在with中由当前线程写入的缓存至少有效到until。用于预热：近期数据的有效期很短，否则预热的结果在用户打开页面前就已过期。
+
+        Args:
+            until (float): 时间戳（time.time）。
+        """
+
+        previous = getattr(self._hold, 'until', None)
+        self._hold.until = until
+        try:
+            yield self
+        finally:
+            self._hold.until = previous
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.parquet")
+
+    def get(self, sql: str, source: str = '') -> Optional[pd.DataFrame]:
+        """
+        读取缓存。
+
+        Args:
+            sql (str): SQL查询语句。
+            source (str, optional): 数据源名称。
+
+        Returns:
+            Optional[pd.DataFrame]: 缓存的查询结果，没有缓存或已过期时返回None。
+        """
+
+        file = self._file(self.key(sql, source))
+
+        try:
+            mtime = os.path.getmtime(file)
+        except OSError:
+            return None
+
+        if time.time() - mtime > self.ttl(sql):
+            return None
+
+        try:
+            data = pd.read_parquet(file)
+        except Exception as e:
+            logger.warning("Failed to read cache file %s: %s", file, e)
+            return None
+
+        # 更新访问时间，用于按最近访问时间淘汰
+        try:
+            os.utime(file, (time.time(), mtime))
+        except OSError:
+            pass
+
+        return data
+
+    def put(self, sql: str, data: pd.DataFrame, source: str = '') -> bool:
+        """
+        写入缓存，写入后检查缓存总大小。
+
+        Args:
+            sql (str): SQL查询语句。
+            data (pd.DataFrame): 查询结果。
+            source (str, optional): 数据源名称。
+
+        Returns:
+            bool: 是否写入成功，部分数据类型无法保存为Parquet时返回False。
+        """
+
+        file = self._file(self.key(sql, source))
+
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            atomic_write(file, data.to_parquet)
+        except Exception as e:
+            logger.warning("Failed to write cache file %s: %s", file, e)
+            return False
+
+        # 按修改时间加有效期判断是否过期，把修改时间设为until之前ttl秒，使缓存有效到until
+        until, ttl = getattr(self._hold, 'until', None), self.ttl(sql)
+        if until is not None and until - time.time() > ttl:
+            try:
+                os.utime(file, (time.time(), until - ttl))
+            except OSError:
+                pass
+
+        self.evict()
+
+        return True
+
+    def evict(self) -> int:
+        """
+        缓存总大小超过上限时，按最近访问时间删除最久未使用的文件。
+
+        Returns:
+            int: 删除的文件数量。
+        """
+
+        with self._lock:
+            files = []
+            for entry in os.scandir(self.path):
+                if entry.name.endswith('.parquet'):
+                    stat = entry.stat()
+                    files.append((stat.st_atime, stat.st_size, entry.path))
+
+            total = sum(size for _, size, _ in files)
+            removed = 0
+
+            for _, size, file in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(file)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+
+        return removed
+
+    def clear(self) -> None:
+        """
+        删除全部缓存文件。
+        """
+
+        if not os.path.isdir(self.path):
+            return
+
+        with self._lock:
+            for entry in os.scandir(self.path):
+                if entry.name.endswith('.parquet'):
+                    os.remove(entry.path)
@@ -0,0 +1,30 @@
+# Author: RockMan
+# CreateTime: 2026/10/19
+# FileName: file_util
+# Description: This module contains file helpers shared by the local stores and caches.
+
+import os
+import threading
+from typing import Callable
+
+
+def atomic_write(path: str, writer: Callable[[str], None]) -> None:
+    """
+    原子地写入文件：writer先写同目录下的临时文件，再替换目标文件，其他线程或进程不会读到写了一半的文件。
+
+    Args:
+        path (str): 目标文件。
+        writer (Callable[[str], None]): 写入函数，参数为临时文件路径。
+
+    Raises:
+        Exception: writer或替换失败时，删除临时文件后抛出原异常。
+    """
+
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    try:
+        writer(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
@@ -3,20 +3,139 @@
 # FileName: market_util.py
 # Description: This module contains the MarketUtil class which provides methods for handling market-related operations.
 
+import threading
+import time
 from datetime import datetime
+from typing import List
+
 import pandas as pd
 from utils.db_util import Constants as C, create_conn, get_raw
 
 
+class MarketRateStore:
+    """
+    进程内共享的资金市场利率，按日期索引，缺失的日期（节假日等）用前一个有值的日期补齐。
+
+    首次使用某个品种时读取其全部历史，之后只在请求的截止日期晚于已有数据时，按已有的最大日期增量读取，
+    且两次增量读取至少间隔refresh_interval秒。只读取请求的品种列，查询结果按日期二分查找切片。所有操作都加锁，
+    可在多线程中使用。
+
+    Attributes:
+        refresh_interval (float): 两次增量读取的最小间隔（秒）。
+    """
+
+    # 默认的利率品种
+    TENORS = [C.R001, C.R007, C.SHIBOR_ON, C.SHIBOR_1W]
+
+    def __init__(self, refresh_interval: float = 600) -> None:
+        """
+        构造函数
+
+        Args:
+            refresh_interval (float, optional): 两次增量读取的最小间隔（秒），默认为600秒，与create_conn一致。
+        """
+
+        self.refresh_interval = refresh_interval
+        # 数据库中的原始数据和按日补齐后的数据，均以C.DATE为索引
+        self._raw = pd.DataFrame({})
+        self._daily = pd.DataFrame({})
+        self._refreshed = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _select(tenors: List[str], where: str = '') -> str:
+        # 品种列名含括号，如Shibor(O/N)，需要加引号
+        columns = ', '.join(f"`{tenor}`" for tenor in tenors)
+        return f"select {C.DATE}, {columns} from {C.MARKET_DBNAME}.market_irt {where}"
+
+    def _load(self, tenors: List[str]) -> None:
+        # 读取新品种的全部历史
+        data = get_raw(create_conn(), self._select(tenors)).set_index(C.DATE)
+        self._raw = data if self._raw.empty else self._raw.join(data, how='outer')
+        self._refreshed = time.monotonic()
+
+    def _refresh(self, until: datetime.date) -> None:
+        # 从已有的最大日期开始增量读取，最大日期当天的数据重新读取；以请求的截止日期为上限，查询不依赖当前时间
+        last = self._raw.index.max()
+        where = f"where {C.DATE} >= '{last.strftime('%Y-%m-%d')}' " \
+                f"and {C.DATE} <= '{until.strftime('%Y-%m-%d')}'"
+
+        data = get_raw(create_conn(), self._select(list(self._raw.columns), where)).set_index(C.DATE)
+        self._raw = pd.concat([self._raw[self._raw.index < last], data])
+        self._refreshed = time.monotonic()
+
+    def _rebuild(self) -> None:
+        raw = self._raw[~self._raw.index.duplicated(keep='last')].sort_index()
+        self._daily = raw.resample('D').asfreq().ffill()
+
+    def get_irt(self, start_time: datetime.date, end_time: datetime.date, tenors: List[str] = None) -> pd.DataFrame:
+        """
+        获取资金市场各品种利率.
+
+        Args:
+            start_time (datetime.date): 统计开始时间。
+            end_time (datetime.date): 统计结束时间（含）。
+            tenors (List[str], optional): 利率品种，默认为TENORS。
+
+        Returns:
+            pd.DataFrame: [C.DATE, *tenors]，没有数据时返回空DataFrame。
+        """
+
+        tenors = tenors if tenors is not None else self.TENORS
+
+        if start_time > end_time:
+            return pd.DataFrame({})
+
+        with self._lock:
+            changed = False
+
+            missing = [tenor for tenor in tenors if tenor not in self._raw.columns]
+            if missing:
+                self._load(missing)
+                changed = True
+
+            if not self._raw.empty and pd.Timestamp(end_time) > self._raw.index.max() and \
+                    time.monotonic() - self._refreshed > self.refresh_interval:
+                self._refresh(end_time)
+                changed = True
+
+            if changed:
+                self._rebuild()
+
+            daily = self._daily
+
+        if daily.empty:
+            return pd.DataFrame({})
+
+        i = daily.index.searchsorted(pd.Timestamp(start_time), side='left')
+        j = daily.index.searchsorted(pd.Timestamp(end_time), side='right')
+
+        return daily.iloc[i:j][tenors].reset_index()
+
+    def clear(self) -> None:
+        """
+        清空已读取的数据，下次使用时重新读取全部历史。
+        """
+
+        with self._lock:
+            self._raw = pd.DataFrame({})
+            self._daily = pd.DataFrame({})
+            self._refreshed = 0.0
+
+
+# 进程内共享的资金市场利率
+market_rates = MarketRateStore()
+
+
 class MarketUtil:
     """
-    一个用于处理市场数据的工具类。
+    一个用于处理市场数据的工具类，数据来自进程内共享的market_rates。
 
 
     Attributes:
         start_time (datetime.date): 统计开始时间。
         end_time (datetime.date): 统计结束时间。
-        raw (pd.DataFrame): 从数据库中检索的原始数据。
+        raw (pd.DataFrame): 最近一次get_irt的结果。
     """
 
     def __init__(self):
@@ -43,27 +162,9 @@ class MarketUtil:
 
         self.start_time = start_time
         self.end_time = end_time
+        self.raw = market_rates.get_irt(start_time, end_time)
 
-        if self.start_time > self.end_time:
-            return pd.DataFrame({})
-
-        if self.raw.empty is False:
-            return self.raw
-
-        sql = "select * from fm_da.market_irt mi"
-
-        self.raw = get_raw(create_conn(), sql)
-        # Fill in any missing dates in the DataFrame
-        self.raw = self.raw.set_index(C.DATE).resample('D').asfreq().reset_index()
-        # Forward fill to fill in any missing values
-        self.raw.ffill(inplace=True)
-        # Filter the DataFrame to only include rows within the given time period
-        mask = (self.raw[C.DATE] >= pd.to_datetime(self.start_time)) & (
-                self.raw[C.DATE] <= pd.to_datetime(self.end_time))
-
-        # print(self.raw.loc[mask])
-
-        return self.raw.loc[mask]
+        return self.raw
 
 
 if __name__ == '__main__':
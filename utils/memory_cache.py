@@ -0,0 +1,170 @@
+# Author: RockMan
+# CreateTime: 2026/10/19
+# FileName: memory_cache
+# Description: This module contains the MemoryCache class which keeps query results in memory under a byte budget.
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+import pandas as pd
+
+
+class MemoryCache:
+    """
+    进程内的查询结果缓存，按DataFrame的实际内存占用（memory_usage(deep=True)）计算大小。
+
+    缓存总大小超过上限时，按最近使用顺序淘汰最久未使用的结果；单个结果超过上限时不缓存。
+    读取和写入时都复制DataFrame，调用方修改返回的数据不会影响缓存。所有操作都加锁，可在多线程中使用。
+
+    Attributes:
+        max_bytes (int): 缓存总大小上限（字节）。
+        hits (int): 命中次数。
+        misses (int): 未命中次数，包括已过期的结果。
+        evictions (int): 因超过大小上限而淘汰的结果数量。
+    """
+
+    def __init__(self, max_bytes: int = 1024 ** 3) -> None:
+        """
+        构造函数
+
+        Args:
+            max_bytes (int, optional): 缓存总大小上限（字节），默认为1GB。
+        """
+
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> (data, nbytes, expires)
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        """
+        当前缓存的总大小（字节）。
+        """
+
+        return self._bytes
+
+    @property
+    def hit_ratio(self) -> float:
+        """
+        命中率，没有访问时为0。
+        """
+
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, key: Hashable) -> Optional[pd.DataFrame]:
+        """
+        读取缓存。
+
+        Args:
+            key (Hashable): 缓存键。
+
+        Returns:
+            Optional[pd.DataFrame]: 缓存结果的副本，没有缓存或已过期时返回None。
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and entry[2] is not None and entry[2] < time.monotonic():
+                self._remove(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            data = entry[0]
+
+        return data.copy()
+
+    def size(self, key: Hashable) -> Optional[int]:
+        """
+        缓存结果的内存占用。
+
+        Args:
+            key (Hashable): 缓存键。
+
+        Returns:
+            Optional[int]: 内存占用（字节），没有缓存时返回None。
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry is not None else None
+
+    def put(self, key: Hashable, data: pd.DataFrame, ttl: float = None, nbytes: int = None) -> bool:
+        """
+        写入缓存，写入后按最近使用顺序淘汰超出上限的结果。
+
+        Args:
+            key (Hashable): 缓存键。
+            data (pd.DataFrame): 查询结果。
+            ttl (float, optional): 有效期（秒），默认不过期。
+            nbytes (int, optional): 已计算的内存占用（字节），默认按memory_usage(deep=True)计算。
+
+        Returns:
+            bool: 是否写入，单个结果超过上限时返回False。
+        """
+
+        if nbytes is None:
+            nbytes = int(data.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            return False
+
+        data = data.copy()
+        expires = time.monotonic() + ttl if ttl is not None else None
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (data, nbytes, expires)
+            self._bytes += nbytes
+
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+        return True
+
+    def _remove(self, key: Hashable) -> None:
+        _, nbytes, _ = self._entries.pop(key)
+        self._bytes -= nbytes
+
+    def clear(self) -> None:
+        """
+        清空缓存，统计数据保留。
+        """
+
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        """
+        缓存的运行统计。
+
+        Returns:
+            Dict[str, float]: {entries, bytes, max_bytes, hits, misses, hit_ratio, evictions}
+        """
+
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hit_ratio,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,260 @@
+# Author: RockMan
+# CreateTime: 2026/10/19
+# FileName: mirror
+# Description: This module contains the LocalMirror class which syncs the upsrod tables into local SQLite files.
+
+import argparse
+import logging
+import os
+import sqlite3
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+import pandas as pd
+from sqlalchemy import text
+
+from utils.db_util import Constants as C, create_conn
+
+logger = logging.getLogger(__name__)
+
+
+class LocalMirror:
+    """
+    生产库的本地镜像，每个数据库对应MIRROR_DIR下的一个SQLite文件，由create_conn('mirror')读取。
+
+    交易、持仓、估值和利率等按日期增长的表按日期列增量同步：从镜像中该列的最大值往前回溯lookback天，
+    删除镜像中这段时间的数据后重新拉取，以覆盖补录和状态变更（如复核状态）。回溯期之前的数据有更正时，
+    需要用full重新全量同步。机构、债券基础信息和现金流等基础表没有可用的日期列，每次全量同步。
+
+    日期时间以ISO格式的文本保存，零点的值只保存日期部分，使文本比较与MySQL中日期时间和日期字符串的比较结果一致。
+
+    Attributes:
+        path (str): 镜像目录。
+    """
+
+    # 镜像的表：表名 -> (数据库, 增量同步的日期列)，日期列为None时全量同步
+    TABLES: Dict[str, Tuple[str, str]] = {
+        'trade_colrepoes': (C.COMP_DBNAME, C.SETTLEMENT_DATE),
+        'trade_iboinfos': (C.COMP_DBNAME, C.SETTLEMENT_DATE),
+        'trade_cashbonds': (C.COMP_DBNAME, C.TRADE_TIME),
+        'trade_exchgcashbonds': (C.COMP_DBNAME, C.TRADE_DATE),
+        'core_carrybondholds': (C.COMP_DBNAME, C.CARRY_DATE),
+        'basic_bondvaluations': (C.COMP_DBNAME, C.DEAL_DATE),
+        'ext_requestdistributions': (C.COMP_DBNAME, C.TRADE_DATE),
+        'basic_bondcashflows': (C.COMP_DBNAME, None),
+        'basic_bondbasicinfos': (C.COMP_DBNAME, None),
+        'basic_agencies': (C.COMP_DBNAME, None),
+        'basic_agencies_relation': (C.COMP_DBNAME, None),
+        'market_irt': (C.MARKET_DBNAME, C.DATE),
+    }
+
+    # 按债券代码查询的表在该列上建索引
+    INDEX_COLUMNS = (C.BOND_CODE,)
+
+    def __init__(self, path: str = None, chunksize: int = 100000) -> None:
+        """
+        构造函数
+
+        Args:
+            path (str, optional): 镜像目录，默认为C.MIRROR_DIR。
+            chunksize (int, optional): 每次从生产库读取的行数。
+        """
+
+        self.path = path if path is not None else C.MIRROR_DIR
+        self.chunksize = chunksize
+
+    def _file(self, schema: str) -> str:
+        return os.path.join(self.path, f"{schema}.db")
+
+    def watermark(self, table: str) -> str:
+        """
+        镜像中某表日期列的最大值。
+
+        Args:
+            table (str): 表名。
+
+        Returns:
+            str: 日期列的最大值，全量同步的表或镜像中没有该表时返回None。
+        """
+
+        schema, column = self.TABLES[table]
+        if column is None or not os.path.exists(self._file(schema)):
+            return None
+
+        with sqlite3.connect(self._file(schema)) as db:
+            if not _exists(db, table):
+                return None
+            return db.execute(f'select max("{column}") from "{table}"').fetchone()[0]
+
+    def sync_table(self, table: str, lookback: int = 7, full: bool = False) -> int:
+        """
+        同步一张表。
+
+        Args:
+            table (str): 表名，为TABLES中的一项。
+            lookback (int, optional): 增量同步时从日期列的最大值往前回溯的天数。
+            full (bool, optional): 是否全量同步。
+
+        Returns:
+            int: 写入镜像的行数。
+        """
+
+        schema, column = self.TABLES[table]
+
+        mark = None if full else self.watermark(table)
+        since = (date.fromisoformat(mark[:10]) - timedelta(days=lookback)).strftime('%Y-%m-%d') \
+            if mark is not None else None
+
+        sql = f"select * from {schema}.{table}"
+        if since is not None:
+            sql += f" where {column} >= '{since}'"
+
+        os.makedirs(self.path, exist_ok=True)
+        rows = 0
+
+        # 删除和写入在同一个事务中，同步失败时镜像保持原样
+        with create_conn(C.COMP_DBNAME).engine.connect() as source, sqlite3.connect(self._file(schema)) as db:
+            if since is not None:
+                db.execute(f'delete from "{table}" where "{column}" >= ?', (since,))
+
+            for i, chunk in enumerate(pd.read_sql(text(sql), source, chunksize=self.chunksize)):
+                write_table(db, table, chunk, replace=(i == 0 and since is None))
+                rows += len(chunk)
+
+            if _exists(db, table):
+                index_table(db, table, [column, *self.INDEX_COLUMNS])
+
+        logger.info("Synced %s rows of %s.%s since %s", rows, schema, table, since)
+
+        return rows
+
+    def sync(self, tables: List[str] = None, lookback: int = 7, full: bool = False) -> Dict[str, int]:
+        """
+        同步镜像。
+
+        Args:
+            tables (List[str], optional): 要同步的表，默认为TABLES中的全部。
+            lookback (int, optional): 增量同步时回溯的天数。
+            full (bool, optional): 是否全量同步。
+
+        Returns:
+            Dict[str, int]: 各表写入镜像的行数。
+        """
+
+        return {table: self.sync_table(table, lookback, full) for table in (tables or self.TABLES)}
+
+
+def write_table(db: sqlite3.Connection, table: str, data: pd.DataFrame, replace: bool = False) -> None:
+    """
+    把DataFrame写入镜像中的表，表不存在时按DataFrame的列类型新建。
+
+    Args:
+        db (sqlite3.Connection): 镜像数据库。
+        table (str): 表名。
+        data (pd.DataFrame): 数据。
+        replace (bool, optional): 是否先删除已有的表。
+    """
+
+    decls, values = _to_sqlite(data)
+
+    if replace:
+        db.execute(f'drop table if exists "{table}"')
+    db.execute(f'create table if not exists "{table}" ({", ".join(decls)})')
+    db.executemany(f'insert into "{table}" values ({", ".join("?" * len(decls))})', values)
+
+
+def index_table(db: sqlite3.Connection, table: str, columns: List[str]) -> None:
+    """
+    在表的各列上建索引，表中没有的列和None忽略。
+
+    Args:
+        db (sqlite3.Connection): 镜像数据库。
+        table (str): 表名。
+        columns (List[str]): 列名。
+    """
+
+    existing = _columns(db, table)
+
+    for col in columns:
+        if col is not None and col in existing:
+            db.execute(f'create index if not exists "ix_{table}_{col}" on "{table}" ("{col}")')
+
+
+def _exists(db: sqlite3.Connection, table: str) -> bool:
+    return db.execute("select 1 from sqlite_master where type = 'table' and name = ?", (table,)).fetchone() is not None
+
+
+def _columns(db: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in db.execute(f'pragma table_info("{table}")')]
+
+
+def _datetime_text(s: pd.Series) -> pd.Series:
+    """
+    日期时间转为ISO格式的文本，零点的值只保留日期部分。
+    """
+
+    fmt = '%Y-%m-%d %H:%M:%S.%f' if (s.dt.microsecond != 0).any() else '%Y-%m-%d %H:%M:%S'
+    values = s.dt.strftime(fmt).where(s != s.dt.normalize(), s.dt.strftime('%Y-%m-%d'))
+
+    return values.astype(object).where(s.notna(), None)
+
+
+def _to_sqlite(chunk: pd.DataFrame) -> Tuple[List[str], List[tuple]]:
+    """
+    把查询结果转为SQLite的列声明和数据行。
+
+    Args:
+        chunk (pd.DataFrame): 生产库的查询结果。
+
+    Returns:
+        Tuple[List[str], List[tuple]]: 列声明和数据行。
+    """
+
+    decls = []
+    columns = {}
+
+    for name, s in chunk.items():
+        kind = pd.api.types.infer_dtype(s, skipna=True)
+
+        if pd.api.types.is_datetime64_any_dtype(s) or kind == 'datetime':
+            decl, s = 'DATETIME', _datetime_text(pd.to_datetime(s))
+        elif kind == 'date':
+            decl, s = 'DATE', s.map(lambda v: v.isoformat(), na_action='ignore')
+        elif pd.api.types.is_bool_dtype(s) or pd.api.types.is_integer_dtype(s):
+            decl = 'INTEGER'
+        elif pd.api.types.is_float_dtype(s) or kind == 'decimal':
+            # MySQL的DECIMAL读出为Decimal对象，sqlite3不支持，转为浮点数
+            decl, s = 'REAL', s.astype(float)
+        elif kind == 'bytes':
+            decl = 'BLOB'
+        else:
+            decl = 'TEXT'
+
+        decls.append(f'"{name}" {decl}')
+        columns[name] = s.astype(object).where(s.notna(), None)
+
+    values = list(pd.DataFrame(columns).itertuples(index=False, name=None))
+
+    return decls, values
+
+
+if __name__ == '__main__':
+    # 同步本地镜像，例如：
+    # python -m utils.mirror
+    # python -m utils.mirror trade_colrepoes market_irt --lookback 30
+    # 同步后设置环境变量FM_DATA_DB=mirror启动页面，所有查询都读取本地镜像
+    parser = argparse.ArgumentParser(description='同步生产库的本地镜像')
+    parser.add_argument('tables', nargs='*', help='要同步的表，默认为全部')
+    parser.add_argument('--lookback', type=int, default=7, help='增量同步时回溯的天数，默认为7')
+    parser.add_argument('--full', action='store_true', help='全量同步')
+    parser.add_argument('--path', default=None, help='镜像目录，默认为C.MIRROR_DIR')
+    args = parser.parse_args()
+
+    unknown = set(args.tables) - set(LocalMirror.TABLES)
+    if unknown:
+        parser.error(f"unknown tables: {', '.join(sorted(unknown))}")
+
+    logging.basicConfig(level=logging.INFO)
+
+    for table, rows in LocalMirror(args.path).sync(args.tables, args.lookback, args.full).items():
+        print(f"{table}: {rows}")
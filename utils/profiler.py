@@ -0,0 +1,209 @@
+# Author: RockMan
+# CreateTime: 2026/10/19
+# FileName: profiler
+# Description: This module contains the StageProfiler class which records time and peak memory of named stages.
+
+import threading
+import time
+import tracemalloc
+from typing import List, Optional
+
+import pandas as pd
+
+# 当前线程正在运行的StageProfiler
+_active = threading.local()
+
+# tracemalloc是进程级的，reset_peak、start和stop会影响同时运行的其他StageProfiler，同一时间只运行一个
+_tracing_lock = threading.RLock()
+
+
+class Stage:
+    """
+    一个计时阶段，由StageProfiler.stage创建，作为上下文管理器使用。
+
+    Attributes:
+        name (str): 阶段名称，可在阶段内修改。
+        depth (int): 嵌套层级，最外层为0。
+        start (float): 相对于StageProfiler开始时间的开始时间（秒）。
+        seconds (float): 耗时（秒）。
+        peak_bytes (int): 阶段内Python对象内存的峰值增量（字节），由tracemalloc统计。
+        frames (Dict[str, int]): 阶段产生的各DataFrame的内存占用（字节）。
+    """
+
+    def __init__(self, profiler: 'StageProfiler', name: str) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.depth = 0
+        self.start = 0.0
+        self.seconds = 0.0
+        self.peak_bytes = 0
+        self.frames = {}
+        self._base = 0
+        self._peak = 0
+
+    def __enter__(self) -> 'Stage':
+        self.depth = len(self.profiler._stack)
+        self.start = time.perf_counter() - self.profiler.origin
+
+        # reset_peak会清掉外层阶段的峰值，先记入外层
+        if self.profiler._stack:
+            parent = self.profiler._stack[-1]
+            parent._peak = max(parent._peak, tracemalloc.get_traced_memory()[1])
+
+        tracemalloc.reset_peak()
+        self._base = self._peak = tracemalloc.get_traced_memory()[0]
+        self.profiler._stack.append(self)
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+        self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+        self.seconds = time.perf_counter() - self.profiler.origin - self.start
+        self.peak_bytes = self._peak - self._base
+
+        self.profiler._stack.pop()
+        if self.profiler._stack:
+            parent = self.profiler._stack[-1]
+            parent._peak = max(parent._peak, self._peak)
+
+        self.profiler.stages.append(self)
+
+        return False
+
+    def frame(self, **frames: pd.DataFrame) -> None:
+        """
+        记录阶段产生的DataFrame的内存占用（memory_usage(deep=True)）。
+
+        Args:
+            **frames (pd.DataFrame): 名称 -> DataFrame。
+        """
+
+        for name, data in frames.items():
+            if isinstance(data, pd.DataFrame):
+                self.frames[name] = int(data.memory_usage(index=True, deep=True).sum())
+
+
+class _NullStage:
+    """
+    没有运行StageProfiler时stage返回的空阶段，不做任何统计。
+    """
+
+    def __enter__(self) -> '_NullStage':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+        return False
+
+    def frame(self, **frames: pd.DataFrame) -> None:
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class StageProfiler:
+    """
+    按阶段统计耗时和内存峰值，用于测试页面的性能分析。
+
+    在with StageProfiler()中，当前线程调用stage(name)的代码（get_raw、SecurityTx的构造函数等）会被记录为一个阶段，
+    阶段可以嵌套；不在with中时stage返回空阶段，几乎没有开销。内存峰值使用tracemalloc统计，运行期间会降低执行速度。
+    tracemalloc是进程级的，多个会话同时分析时依次运行，后进入的等待前一个结束；内存峰值也包含同一时间其他线程的分配。
+
+    Attributes:
+        stages (List[Stage]): 已结束的阶段，按结束顺序排列。
+        origin (float): 开始时间（time.perf_counter）。
+    """
+
+    def __init__(self) -> None:
+        """
+        构造函数
+        """
+
+        self.stages: List[Stage] = []
+        self.origin = 0.0
+        self._stack: List[Stage] = []
+        self._started_tracing = False
+        # 进入前当前线程正在使用的分析器，嵌套使用时退出后恢复
+        self._previous: Optional['StageProfiler'] = None
+
+    def __enter__(self) -> 'StageProfiler':
+        _tracing_lock.acquire()
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+        self.origin = time.perf_counter()
+        self._previous = getattr(_active, 'profiler', None)
+        _active.profiler = self
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+        _active.profiler = self._previous
+        self._previous = None
+
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+        _tracing_lock.release()
+
+        return False
+
+    def stage(self, name: str) -> Stage:
+        """
+        新建一个阶段。
+
+        Args:
+            name (str): 阶段名称。
+
+        Returns:
+            Stage: 阶段，用with执行。
+        """
+
+        return Stage(self, name)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        全部阶段，按开始时间排列。
+
+        Returns:
+            pd.DataFrame: [stage, depth, start, seconds, peak_mb, frames_mb, frames]，
+            frames为各DataFrame的内存占用（MB）的说明文字。
+        """
+
+        rows = []
+        for s in sorted(self.stages, key=lambda x: (x.start, x.depth)):
+            rows.append({
+                'stage': s.name,
+                'depth': s.depth,
+                'start': s.start,
+                'seconds': s.seconds,
+                'peak_mb': s.peak_bytes / 1024 ** 2,
+                'frames_mb': sum(s.frames.values()) / 1024 ** 2,
+                'frames': ', '.join(f"{k}: {v / 1024 ** 2:.2f}" for k, v in s.frames.items()),
+            })
+
+        return pd.DataFrame(rows, columns=['stage', 'depth', 'start', 'seconds', 'peak_mb', 'frames_mb', 'frames'])
+
+
+def stage(name: str) -> Stage:
+    """
+    在当前线程正在运行的StageProfiler中新建一个阶段，没有运行时返回空阶段。
+
+    用法：
+        with stage('SecurityTx._daily_value_all') as s:
+            self.value = self._daily_value_all()
+            s.frame(value=self.value)
+
+    Args:
+        name (str): 阶段名称。
+
+    Returns:
+        Stage: 阶段，用with执行。
+    """
+
+    profiler = getattr(_active, 'profiler', None)
+
+    return profiler.stage(name) if profiler is not None else _NULL_STAGE
@@ -0,0 +1,158 @@
+# Author: RockMan
+# CreateTime: 2026/10/19
+# FileName: query_log
+# Description: This module contains the QueryLog class which records the cost of every query issued by get_raw.
+
+import json
+import os
+import sys
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, List
+
+import pandas as pd
+
+
+class QueryLog:
+    """
+    进程内的查询记录，保存最近maxlen次get_raw调用的耗时和结果大小。
+
+    每条记录包括：
+        - time: 查询时间。
+        - caller: 发起查询的加载函数，如'Repo.__init__'、'SecurityTx._daily_value_all'。
+        - source: 数据源名称。
+        - cache: 'memory'、'disk'、'replay'或'miss'，分别为命中进程内缓存、命中本地Parquet缓存、回放记录和查询数据库。
+        - seconds: get_raw的总耗时（秒）。
+        - db_seconds: 数据库执行和读取结果的耗时（秒），命中缓存时为0。
+        - frame_seconds: 由查询结果构造DataFrame的耗时（秒），命中缓存时为0。
+        - rows, columns, bytes: 结果的行数、列数和内存占用（memory_usage(deep=True)）。
+        - sql: 标准化后的SQL。
+
+    Attributes:
+        path (str): 导出文件，设置后每条记录同时以JSON行追加到该文件。
+    """
+
+    def __init__(self, maxlen: int = 1000, path: str = None) -> None:
+        """
+        构造函数
+
+        Args:
+            maxlen (int, optional): 保留的记录数量，默认为1000。
+            path (str, optional): 导出文件，默认不导出。
+        """
+
+        self.path = path
+        self._records = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def caller(skip: tuple = ('get_raw', '_get_raw_data')) -> str:
+        """
+        发起查询的加载函数，跳过get_raw和各类的_get_raw_data包装函数。
+
+        Args:
+            skip (tuple, optional): 跳过的函数名。
+
+        Returns:
+            str: 函数的限定名，如'SecurityTx._daily_value_all'。
+        """
+
+        frame = sys._getframe(1)
+
+        while frame is not None:
+            code = frame.f_code
+            if code.co_name not in skip and code.co_filename != __file__ and \
+                    os.path.basename(code.co_filename) != 'db_util.py':
+                return getattr(code, 'co_qualname', code.co_name)
+            frame = frame.f_back
+
+        return ''
+
+    def record(self, **fields) -> Dict:
+        """
+        添加一条记录。
+
+        Args:
+            **fields: 记录的字段，见类的说明。
+
+        Returns:
+            Dict: 添加的记录。
+        """
+
+        record = {'time': datetime.now().isoformat(timespec='milliseconds'), **fields}
+
+        with self._lock:
+            self._records.append(record)
+
+            if self.path is not None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+        return record
+
+    def records(self) -> List[Dict]:
+        """
+        当前保存的全部记录，按时间先后排列。
+        """
+
+        with self._lock:
+            return list(self._records)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        当前保存的全部记录。
+
+        Returns:
+            pd.DataFrame: 每条记录一行，列见类的说明。
+        """
+
+        return pd.DataFrame(self.records())
+
+    def summary(self) -> pd.DataFrame:
+        """
+        按加载函数汇总查询次数、耗时和结果大小，按总耗时降序排列。
+
+        Returns:
+            pd.DataFrame: 以caller为索引，[count, seconds, db_seconds, frame_seconds, rows, bytes, misses]。
+        """
+
+        data = self.to_frame()
+
+        if data.empty:
+            return data
+
+        data['misses'] = (data['cache'] == 'miss').astype(int)
+        data['count'] = 1
+
+        return data.groupby('caller')[['count', 'seconds', 'db_seconds', 'frame_seconds', 'rows', 'bytes',
+                                       'misses']].sum().sort_values('seconds', ascending=False)
+
+    def export(self, path: str) -> int:
+        """
+        把当前保存的全部记录以JSON行追加到文件。
+
+        Args:
+            path (str): 文件路径。
+
+        Returns:
+            int: 导出的记录数量。
+        """
+
+        records = self.records()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+        return len(records)
+
+    def clear(self) -> None:
+        """
+        清空记录。
+        """
+
+        with self._lock:
+            self._records.clear()
@@ -0,0 +1,235 @@
+# Author: RockMan
+# CreateTime: 2026/10/19
+# FileName: replay
+# Description: This module contains the QueryRecorder class which records query results and replays them offline.
+
+import argparse
+import gzip
+import hashlib
+import logging
+import os
+import pickle
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+import pandas as pd
+
+from utils.disk_cache import ParquetCache
+from utils.file_util import atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+class QueryRecorder:
+    """
+    记录get_raw的查询结果，离线时按SQL回放，用于在生产数据的分布上做回归对比和性能测试。
+
+    每个查询保存为一个gzip压缩的pickle文件，文件名为标准化SQL的sha256，不区分数据源，
+    因此在生产库上记录的结果可以由回放数据源（create_conn('replay')）直接读取。
+
+    打开匿名化时，交易对手、机构和交易员名称在写入前替换为稳定的假名：同一个名称在所有表、所有列中得到相同的假名，
+    在pandas中按名称进行的关联（如拆借交易对手与机构简称）保持不变；salt不同时假名不同，salt应当保密。
+
+    Attributes:
+        path (str): 记录文件的目录。
+        record (bool): 是否记录查询结果。
+        anonymize (bool): 记录时是否匿名化。
+    """
+
+    # 需要匿名化的列 -> 假名前缀，列名同Constants的COUNTERPARTY, NAME, SHORT_NAME, MAIN_ORG, SUB_ORG, TRADER
+    ANONYMIZE_COLUMNS = {
+        'counterparty': '机构',
+        'name': '机构',
+        'shortname': '机构',
+        'mastername': '机构',
+        'slavename': '机构',
+        'selfquotername': '交易员',
+    }
+
+    def __init__(self, path: str, record: bool = False, anonymize: bool = False, salt: str = '') -> None:
+        """
+        构造函数
+
+        Args:
+            path (str): 记录文件的目录。
+            record (bool, optional): 是否记录查询结果，默认为False。
+            anonymize (bool, optional): 记录时是否匿名化，默认为False。
+            salt (str, optional): 生成假名的salt，默认为空。
+        """
+
+        self.path = path
+        self.record = record
+        self.anonymize = anonymize
+        self.salt = salt
+        # 本进程已记录的SQL，每个查询只写一次
+        self._recorded = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(sql: str) -> str:
+        """
+        记录文件的键，为标准化SQL的sha256。
+        """
+
+        return hashlib.sha256(ParquetCache.normalize(sql).encode('utf-8')).hexdigest()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.pkl.gz")
+
+    def pseudonym(self, value: str, prefix: str) -> str:
+        """
+        名称的假名，同一个名称和salt总是得到相同的假名。
+
+        Args:
+            value (str): 名称。
+            prefix (str): 假名前缀。
+
+        Returns:
+            str: 假名，如'机构3f2a9c1b'。
+        """
+
+        return f"{prefix}{hashlib.sha256(f'{self.salt}{value}'.encode('utf-8')).hexdigest()[:8]}"
+
+    def anonymized(self, data: pd.DataFrame) -> pd.DataFrame:
+        """
+        将名称列替换为假名，空值保持不变。
+
+        Args:
+            data (pd.DataFrame): 查询结果。
+
+        Returns:
+            pd.DataFrame: 替换后的副本。
+        """
+
+        data = data.copy()
+
+        for column, prefix in self.ANONYMIZE_COLUMNS.items():
+            if column not in data.columns:
+                continue
+
+            # 每个不同的名称只计算一次
+            names = {v: self.pseudonym(v, prefix) for v in data[column].dropna().unique()}
+            data[column] = data[column].map(names).where(data[column].notna(), data[column])
+
+        return data
+
+    def save(self, sql: str, data: pd.DataFrame, source: str = '') -> bool:
+        """
+        记录查询结果，本进程中每个查询只记录一次，已有的记录文件被覆盖。
+
+        Args:
+            sql (str): SQL查询语句。
+            data (pd.DataFrame): 查询结果。
+            source (str, optional): 数据源名称，仅作为说明保存。
+
+        Returns:
+            bool: 是否写入。
+        """
+
+        key = self.key(sql)
+
+        with self._lock:
+            if key in self._recorded:
+                return False
+            self._recorded.add(key)
+
+        record = {
+            'sql': ParquetCache.normalize(sql),
+            'source': source,
+            'recorded': datetime.now().isoformat(timespec='seconds'),
+            'anonymized': self.anonymize,
+            'data': self.anonymized(data) if self.anonymize else data,
+        }
+
+        file = self._file(key)
+
+        def write(tmp: str) -> None:
+            with gzip.open(tmp, 'wb') as f:
+                pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            atomic_write(file, write)
+        except Exception as e:
+            logger.warning("Failed to write recording %s: %s", file, e)
+            return False
+
+        return True
+
+    def load(self, sql: str) -> pd.DataFrame:
+        """
+        回放查询结果。
+
+        Args:
+            sql (str): SQL查询语句。
+
+        Returns:
+            pd.DataFrame: 记录的查询结果。
+
+        Raises:
+            LookupError: 没有该查询的记录。
+        """
+
+        record = self.read(self._file(self.key(sql)))
+
+        if record is None:
+            raise LookupError(f"No recording for query: {ParquetCache.normalize(sql)}")
+
+        return record['data']
+
+    @staticmethod
+    def read(file: str) -> Optional[Dict]:
+        """
+        读取记录文件。
+
+        Args:
+            file (str): 记录文件路径。
+
+        Returns:
+            Optional[Dict]: {sql, source, recorded, anonymized, data}，文件不存在时返回None。
+        """
+
+        try:
+            with gzip.open(file, 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def summary(self) -> pd.DataFrame:
+        """
+        全部记录的说明，不含数据。
+
+        Returns:
+            pd.DataFrame: [key, source, recorded, anonymized, rows, columns, sql]
+        """
+
+        rows = []
+
+        if os.path.isdir(self.path):
+            for entry in os.scandir(self.path):
+                if not entry.name.endswith('.pkl.gz'):
+                    continue
+                record = self.read(entry.path)
+                rows.append({'key': entry.name[:-len('.pkl.gz')], 'source': record['source'],
+                             'recorded': record['recorded'], 'anonymized': record['anonymized'],
+                             'rows': len(record['data']), 'columns': record['data'].shape[1], 'sql': record['sql']})
+
+        return pd.DataFrame(rows, columns=['key', 'source', 'recorded', 'anonymized', 'rows', 'columns', 'sql'])
+
+
+if __name__ == '__main__':
+    # 查看记录的查询，例如先在生产库上记录，再离线回放：
+    # FM_DATA_RECORD=1 FM_DATA_RECORD_ANONYMIZE=1 FM_DATA_RECORD_SALT=... python -m utils.warmup
+    # python -m utils.replay
+    # FM_DATA_DB=replay streamlit run main.py
+    # 在这里导入，db_util导入了本模块
+    from utils.db_util import Constants as C
+
+    parser = argparse.ArgumentParser(description='查看记录的查询结果')
+    parser.add_argument('--path', default=C.RECORD_DIR, help='记录目录，默认为C.RECORD_DIR')
+    args = parser.parse_args()
+
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.max_colwidth', 80,
+                           'display.width', 200):
+        print(QueryRecorder(args.path).summary())
@@ -0,0 +1,179 @@
+# Author: RockMan
+# CreateTime: 2026/10/19
+# FileName: summary_store
+# Description: This module contains the MonthlySummaryStore class which persists monthly summaries of closed months.
+
+import argparse
+import calendar
+import os
+import threading
+from datetime import datetime, timedelta, date
+
+import pandas as pd
+
+from utils.db_util import Constants as C
+from utils.file_util import atomic_write
+
+# 同一进程内的读写锁，OverviewDataHandler并行生成报告时会同时访问存储
+_lock = threading.Lock()
+
+
+class MonthlySummaryStore:
+    """
+    已结束月份的月度统计数据的本地存储。
+
+    已结束月份的月度统计不会再变化，按(tx_type, year, month)保存FundDataHandler.get_monthly_summary和
+    SecurityDataHandler.get_monthly_summary的结果，每个(tx_type, year)对应一个文件，每个月为其中一行。
+    未结束的月份不会被保存。源数据有补录或更正时，用invalidate删除对应的月份后重新计算。
+
+    Attributes:
+        path (str): 存储目录。
+    """
+
+    def __init__(self, path: str = None) -> None:
+        """
+        构造函数
+
+        Args:
+            path (str, optional): 存储目录，默认为C.LOCAL_DIR下的monthly_summary。
+        """
+
+        self.path = path if path is not None else os.path.join(C.LOCAL_DIR, 'monthly_summary')
+
+    def _file(self, tx_type: str, year_num: int) -> str:
+        return os.path.join(self.path, f"{tx_type}_{year_num}.pkl")
+
+    @staticmethod
+    def is_closed(year_num: int, month: int, until: date = None) -> bool:
+        """
+        判断某月是否已结束。统计数据的截至时间为当前时间的前一天，与TimeUtil.get_months_feday保持一致。
+
+        Args:
+            year_num (int): 年份。
+            month (int): 月份。
+            until (date, optional): 实际计算的统计截止日（含），按其他基准时间计算时传入；默认按当前时间判断。
+
+        Returns:
+            bool: 该月的最后一天早于统计截至日，或不晚于until时，返回True。
+        """
+
+        month_end = date(year_num, month, calendar.monthrange(year_num, month)[1])
+
+        if until is not None:
+            return month_end <= until
+
+        return month_end < (datetime.now() - timedelta(days=1)).date()
+
+    def load(self, tx_type: str, year_num: int) -> pd.DataFrame:
+        """
+        读取某类业务某年已保存的月度统计数据。
+
+        Args:
+            tx_type (str): 交易类型，C.REPO, C.REPL, C.IBO, C.IBL, C.BOND或C.CD。
+            year_num (int): 年份。
+
+        Returns:
+            pd.DataFrame: 以C.DATE为索引的月度统计数据，列与保存时一致；没有数据时返回空df。
+        """
+
+        file = self._file(tx_type, year_num)
+
+        with _lock:
+            if not os.path.exists(file):
+                return pd.DataFrame({})
+
+            return pd.read_pickle(file)
+
+    def save(self, tx_type: str, year_num: int, data: pd.DataFrame, until: date = None) -> pd.DataFrame:
+        """
+        保存月度统计数据，只保存已结束的月份，同一月份的旧数据会被覆盖。
+
+        Args:
+            tx_type (str): 交易类型。
+            year_num (int): 年份。
+            data (pd.DataFrame): 以C.DATE为索引的月度统计数据。
+            until (date, optional): 计算data时的统计截止日（含），截止日之后结束的月份不完整，不保存；
+                默认按当前时间判断，见is_closed。
+
+        Returns:
+            pd.DataFrame: 实际保存的行。
+        """
+
+        if data.empty:
+            return data
+
+        closed = data.loc[[self.is_closed(year_num, m, until) for m in data.index.month]]
+
+        if closed.empty:
+            return closed
+
+        file = self._file(tx_type, year_num)
+
+        with _lock:
+            os.makedirs(self.path, exist_ok=True)
+
+            if os.path.exists(file):
+                stored = pd.read_pickle(file)
+                stored = stored.loc[~stored.index.month.isin(closed.index.month)]
+                merged = pd.concat([stored, closed]).sort_index()
+            else:
+                merged = closed.sort_index()
+
+            atomic_write(file, merged.to_pickle)
+
+        return closed
+
+    def invalidate(self, tx_type: str = None, year_num: int = None, month: int = None) -> int:
+        """
+        删除已保存的月度统计数据，用于源数据补录或更正后的重新计算。参数为None时匹配全部。
+
+        Args:
+            tx_type (str, optional): 交易类型。
+            year_num (int, optional): 年份。
+            month (int, optional): 月份，指定时只删除该月的数据。
+
+        Returns:
+            int: 删除的行数。
+        """
+
+        if not os.path.isdir(self.path):
+            return 0
+
+        removed = 0
+
+        with _lock:
+            for name in os.listdir(self.path):
+                if not name.endswith('.pkl'):
+                    continue
+
+                file_type, file_year = name[:-len('.pkl')].rsplit('_', 1)
+                if (tx_type is not None and file_type != tx_type) or \
+                        (year_num is not None and int(file_year) != year_num):
+                    continue
+
+                file = os.path.join(self.path, name)
+
+                if month is None:
+                    removed += len(pd.read_pickle(file))
+                    os.remove(file)
+                    continue
+
+                stored = pd.read_pickle(file)
+                mask = stored.index.month == month
+                removed += int(mask.sum())
+
+                atomic_write(file, stored.loc[~mask].to_pickle)
+
+        return removed
+
+
+if __name__ == '__main__':
+    # 源数据更正后，删除对应月份的物化数据，例如：
+    # python -m utils.summary_store --tx_type repo --year 2024 --month 3
+    parser = argparse.ArgumentParser(description='删除已保存的月度统计数据')
+    parser.add_argument('--tx_type', default=None, help='交易类型，默认为全部')
+    parser.add_argument('--year', type=int, default=None, help='年份，默认为全部')
+    parser.add_argument('--month', type=int, default=None, help='月份，默认为全部')
+    args = parser.parse_args()
+
+    print(MonthlySummaryStore().invalidate(args.tx_type, args.year, args.month))
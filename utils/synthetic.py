@@ -0,0 +1,417 @@
+# Author: RockMan
+# CreateTime: 2026/10/19
+# FileName: synthetic
+# Description: This module contains the SyntheticData class which generates synthetic upsrod tables for offline runs.
+
+import argparse
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from utils.db_util import Constants as C
+from utils.mirror import LocalMirror, write_table, index_table
+
+# 回购和拆借的期限品种：(品种, 天数, 概率)
+_REPO_TERMS = [('R001', 1, 0.55), ('R007', 7, 0.25), ('R014', 14, 0.1), ('R021', 21, 0.05), ('R1M', 30, 0.05)]
+_IBO_TERMS = [('IBO001', 1, 0.5), ('IBO007', 7, 0.3), ('IBO014', 14, 0.1), ('IBO1M', 30, 0.1)]
+
+# 债券类型：sectype -> (l2sectype, 概率)；{0, 1, 6, 11}为利率债，26为同业存单，其余为信用债
+_BOND_TYPES = {
+    0: ('国债', 0.1),
+    1: ('央行票据', 0.02),
+    6: ('政策性金融债', 0.15),
+    11: ('地方政府债', 0.08),
+    26: ('同业存单', 0.3),
+    3: ('企业债', 0.1),
+    7: ('公司债', 0.1),
+    13: ('中期票据', 0.15),
+}
+
+
+class SyntheticData:
+    """
+    生成与upsrod各表结构一致的模拟数据，写入LocalMirror格式的SQLite文件，设置环境变量
+    FM_DATA_DB=mirror、FM_DATA_MIRROR_DIR=<输出目录>后，所有查询都读取模拟数据。
+
+    数据的主要特征：
+        - 交易对手的交易量按幂律分布，少数机构占大部分交易；部分从机构对应多个主机构。
+        - 回购、拆借利率围绕模拟的R001、R007曲线波动，约2%的交易未复核（assignstate = 0）。
+        - 每支债券有一段持仓区间，以一级认购或二级买入开始，以二级卖出或统计截止日结束，持仓、交易、
+          估值和现金流相互一致；约5%的债券没有估值。
+
+    Attributes:
+        bonds (int): 债券数量。
+        trades_per_day (int): 回购和拆借每个工作日的交易笔数。
+        counterparties (int): 交易对手数量。
+        years (int): 数据覆盖的年数，截至end。
+        end (datetime): 数据截止日，默认为昨天。
+    """
+
+    def __init__(self, bonds: int = 200, trades_per_day: int = 20, counterparties: int = 200, years: int = 2,
+                 end: datetime = None, seed: int = 0) -> None:
+        """
+        构造函数
+
+        Args:
+            bonds (int, optional): 债券数量，默认为200。
+            trades_per_day (int, optional): 回购和拆借每个工作日的交易笔数，默认为20。
+            counterparties (int, optional): 交易对手数量，默认为200。
+            years (int, optional): 数据覆盖的年数，默认为2，即去年初至end。
+            end (datetime, optional): 数据截止日，默认为昨天。
+            seed (int, optional): 随机数种子，相同参数生成相同的数据。
+        """
+
+        self.bonds = bonds
+        self.trades_per_day = trades_per_day
+        self.counterparties = counterparties
+        self.years = years
+        self.end = pd.Timestamp((end if end is not None else datetime.now() - timedelta(days=1)).date())
+        self.start = pd.Timestamp(self.end.year - years + 1, 1, 1)
+        self.rng = np.random.default_rng(seed)
+
+        self.days = pd.bdate_range(self.start, self.end)
+        self.irt = self._market_irt()
+
+    # ------------------------市场利率------------------------
+
+    def _market_irt(self) -> pd.DataFrame:
+        days = pd.bdate_range(self.start - timedelta(days=90), self.end)
+        r001 = np.clip(1.8 + np.cumsum(self.rng.normal(0, 0.03, len(days))) * 0.3, 0.5, 4.0)
+
+        return pd.DataFrame({
+            C.DATE: days,
+            C.R001: r001.round(4),
+            C.R007: (r001 + 0.2 + self.rng.normal(0, 0.05, len(days))).round(4),
+            C.SHIBOR_ON: (r001 - 0.05).round(4),
+            C.SHIBOR_1W: (r001 + 0.15).round(4),
+        })
+
+    def _rate_on(self, dates: pd.DatetimeIndex, column: str) -> np.ndarray:
+        irt = self.irt.set_index(C.DATE)[column]
+        return irt.reindex(dates, method='ffill').to_numpy()
+
+    # ------------------------机构------------------------
+
+    def agencies(self) -> pd.DataFrame:
+        """
+        basic_agencies: [C.CODE, C.SHORT_NAME, C.NAME]
+        """
+
+        i = np.arange(self.counterparties)
+        return pd.DataFrame({
+            C.CODE: [f"{n:06d}" for n in i + 100000],
+            C.SHORT_NAME: [f"简称{n:04d}" for n in i],
+            C.NAME: [f"机构{n:04d}" for n in i],
+        })
+
+    def agencies_relation(self) -> pd.DataFrame:
+        """
+        basic_agencies_relation: [C.SUB_ORG, C.MAIN_ORG]，约2%的从机构对应两个主机构。
+        """
+
+        i = np.arange(self.counterparties)
+        relation = pd.DataFrame({C.SUB_ORG: [f"机构{n:04d}" for n in i],
+                                 C.MAIN_ORG: [f"集团{n // 3:04d}" for n in i]})
+
+        dup = relation.sample(frac=0.02, random_state=int(self.rng.integers(1 << 31)))
+        dup[C.MAIN_ORG] = dup[C.MAIN_ORG] + '（二）'
+
+        return pd.concat([relation, dup], ignore_index=True)
+
+    def _pick_counterparties(self, n: int) -> np.ndarray:
+        # 幂律分布：少数机构占大部分交易
+        weights = 1 / np.arange(1, self.counterparties + 1) ** 1.1
+        return self.rng.choice(self.counterparties, size=n, p=weights / weights.sum())
+
+    # ------------------------回购、拆借------------------------
+
+    def _fund_trades(self, terms: list, prefix: str) -> pd.DataFrame:
+        n = self.trades_per_day * len(self.days)
+
+        settle = self.days[self.rng.integers(0, len(self.days), n)].sort_values()
+        term_idx = self.rng.choice(len(terms), size=n, p=[t[2] for t in terms])
+        term_days = np.array([t[1] for t in terms])[term_idx]
+        base = np.where(term_days <= 1, self._rate_on(settle, C.R001), self._rate_on(settle, C.R007))
+
+        amt = np.round(np.exp(self.rng.normal(np.log(2e8), 1.0, n)), -6).clip(1e6, None)
+        rate = (base + self.rng.normal(0, 0.15, n)).clip(0.01, None).round(4)
+
+        return pd.DataFrame({
+            C.TRADE_NO: [f"{prefix}{i:09d}" for i in range(n)],
+            C.TERM_TYPE: np.array([t[0] for t in terms])[term_idx],
+            'counterparty_idx': self._pick_counterparties(n),
+            C.DIRECTION: np.where(self.rng.random(n) < 0.7, 4, 1),
+            'rate': rate,
+            'amt': amt,
+            C.INTEREST_AMT: (amt * rate / 100 * term_days / 365).round(2),
+            C.SETTLEMENT_DATE: settle,
+            C.MATURITY_DATE: settle + pd.to_timedelta(term_days, unit='D'),
+            C.HOLDING_DAYS: term_days,
+            C.CHECK_STATUS: np.where(self.rng.random(n) < 0.98, 1, 0),
+        })
+
+    def repo(self) -> pd.DataFrame:
+        """
+        trade_colrepoes，交易对手为机构全称，与basic_agencies_relation的从机构关联。
+        """
+
+        data = self._fund_trades(_REPO_TERMS, 'CBT')
+        data[C.COUNTERPARTY] = '机构' + data.pop('counterparty_idx').map('{:04d}'.format)
+        amt = data.pop('amt')
+        data[C.REPO_RATE] = data.pop('rate')
+        data[C.REPO_AMT] = amt
+        data[C.CONVERTED_BOND_AMT] = (amt * 1.05).round(-4)
+        data[C.BOND_AMT] = (amt * 1.15).round(-4)
+
+        return data
+
+    def ibo(self) -> pd.DataFrame:
+        """
+        trade_iboinfos，交易对手为机构简称，与basic_agencies的简称关联。
+        """
+
+        data = self._fund_trades(_IBO_TERMS, 'IBO')
+        data[C.COUNTERPARTY] = '简称' + data.pop('counterparty_idx').map('{:04d}'.format)
+        data[C.TRADER] = self.rng.choice(['交易员A', '交易员B', '交易员C'], size=len(data))
+        data[C.IBO_RATE] = data.pop('rate')
+        data[C.IBO_AMT] = data.pop('amt')
+
+        return data
+
+    # ------------------------债券------------------------
+
+    def bond_tables(self) -> Dict[str, pd.DataFrame]:
+        """
+        生成债券相关的各表，持仓、交易、估值和现金流相互一致。
+
+        Returns:
+            Dict[str, pd.DataFrame]: 表名 -> 数据，包括basic_bondbasicinfos, core_carrybondholds, basic_bondvaluations,
+            basic_bondcashflows, trade_cashbonds, trade_exchgcashbonds, ext_requestdistributions。
+        """
+
+        n = self.bonds
+        rng = self.rng
+
+        sectypes = np.array(list(_BOND_TYPES))
+        sectype = rng.choice(sectypes, size=n, p=[v[1] for v in _BOND_TYPES.values()])
+        is_cd = sectype == 26
+        exchange = ~is_cd & (rng.random(n) < 0.2)
+
+        code = np.array([f"{2300000 + i}.{'SH' if e else 'IB'}" for i, e in enumerate(exchange)])
+        name = np.array([f"{_BOND_TYPES[t][0]}{i:04d}" for i, t in enumerate(sectype)])
+        market = np.where(exchange, 'SSE', 'CIB')
+
+        span = (self.end - self.start).days
+        issue = self.start - pd.to_timedelta(rng.integers(0, 3 * 365, n), unit='D') + \
+            pd.to_timedelta(rng.integers(0, span, n), unit='D')
+        term_years = np.where(is_cd, rng.choice([0.25, 0.5, 1.0], size=n), rng.choice([1, 2, 3, 5, 7, 10], size=n))
+        mat = issue + pd.to_timedelta((term_years * 365).astype(int), unit='D')
+        cpn = np.where(is_cd, 0.0, rng.uniform(1.8, 4.2, n).round(4))
+        issue_price = np.where(is_cd, (100 - rng.uniform(1.5, 2.5, n) * term_years).round(4), 100.0)
+
+        info = pd.DataFrame({
+            C.BOND_CODE: code,
+            C.BOND_FULL_NAME: np.char.add(name, '（全称）'),
+            C.BOND_TYPE_NUM: sectype,
+            C.BOND_TYPE: [_BOND_TYPES[t][0] for t in sectype],
+            C.ISSUE_DATE: issue,
+            C.MATURITY: mat,
+            C.COUPON_RATE_CURRENT: cpn,
+            C.COUPON_RATE_ISSUE: cpn,
+            C.ISSUE_AMT: rng.choice([10, 20, 50, 100], size=n) * 1e8,
+            C.ISSUE_PRICE: issue_price,
+            C.ISSUE_ORG: [f"发行人{i:03d}" for i in rng.integers(0, max(n // 5, 1), n)],
+            C.BOND_TERM: [f"{t:g}Y" for t in term_years],
+        })
+
+        # 持仓区间：[hold_start, hold_end)，在hold_end卖出或持有至统计截止日
+        lo = np.maximum(issue, self.start)
+        hi = np.minimum(mat, self.end)
+        valid = lo < hi
+        offset = (rng.random(n) * np.maximum((hi - lo).days, 1) * 0.7).astype(int)
+        primary = valid & (issue >= self.start) & (rng.random(n) < 0.3)
+        hold_start = pd.DatetimeIndex(np.where(primary, issue, lo + pd.to_timedelta(offset, unit='D')))
+        hold_end = hold_start + pd.to_timedelta(rng.integers(30, 400, n), unit='D')
+        sold = valid & (hold_end < hi)
+        hold_end = pd.DatetimeIndex(np.where(sold, hold_end, hi + timedelta(days=1)))
+        face = rng.choice([1, 2, 5, 10, 20, 50], size=n) * 1e7
+        cost_clean = np.where(primary, issue_price, (issue_price + rng.normal(0, 0.5, n)).round(4))
+
+        held = np.flatnonzero(valid)
+        days = (hold_end[held] - hold_start[held]).days.to_numpy()
+        rows = np.repeat(held, days)
+        carry_date = hold_start[rows] + pd.to_timedelta(np.concatenate([np.arange(d) for d in days]), unit='D')
+        accrued = cpn[rows] * ((carry_date - issue[rows]).days.to_numpy() % 365) / 365
+
+        carry = pd.DataFrame({
+            C.CARRY_DATE: carry_date,
+            C.BOND_NAME: name[rows],
+            C.BOND_CODE: code[rows],
+            C.MARKET_CODE: market[rows],
+            C.HOLD_AMT: face[rows],
+            C.COST_FULL_PRICE: (cost_clean[rows] + accrued).round(4),
+            C.COST_NET_PRICE: cost_clean[rows],
+            C.CARRY_TYPE: 3,
+            C.PORTFOLIO_NO: 'Portfolio-20200101-001',
+        })
+
+        tables = {
+            'basic_bondbasicinfos': info,
+            'core_carrybondholds': carry,
+            'basic_bondvaluations': self._valuations(held, code, name, hold_start, hold_end, issue, mat, cost_clean),
+            'basic_bondcashflows': self._cashflows(code, name, issue, mat, cpn, issue_price, is_cd),
+        }
+        tables.update(self._bond_trades(code, name, market, exchange, primary, sold, valid, hold_start, hold_end,
+                                        face, cost_clean, cpn))
+
+        return tables
+
+    def _valuations(self, held, code, name, hold_start, hold_end, issue, mat, cost_clean) -> pd.DataFrame:
+        # 约5%的债券没有估值
+        held = held[self.rng.random(len(held)) >= 0.05]
+        frames = []
+
+        for i in held:
+            days = pd.bdate_range(max(hold_start[i] - timedelta(days=60), issue[i]),
+                                  min(hold_end[i] + timedelta(days=60), mat[i]))
+            if days.empty:
+                continue
+            price = cost_clean[i] + np.cumsum(self.rng.normal(0, 0.03, len(days)))
+            frames.append(pd.DataFrame({C.DEAL_DATE: days, C.BOND_CODE: code[i], C.BOND_NAME: name[i],
+                                        C.VALUE_TYPE: 'Mat', C.VALUE_NET_PRICE: price.round(4)}))
+
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+            columns=[C.DEAL_DATE, C.BOND_CODE, C.BOND_NAME, C.VALUE_TYPE, C.VALUE_NET_PRICE])
+
+    @staticmethod
+    def _cashflows(code, name, issue, mat, cpn, issue_price, is_cd) -> pd.DataFrame:
+        # 附息债按年付息，存单为一期贴现，利息金额按每百元面额计
+        rows = []
+        for i in range(len(code)):
+            start = issue[i]
+            while start < mat[i]:
+                end = min(start + pd.DateOffset(years=1), mat[i])
+                days = (end - start).days
+                inst = 100 - issue_price[i] if is_cd[i] else cpn[i] * days / 365
+                rows.append((code[i], name[i], start, end, days, round(inst, 6)))
+                start = end
+
+        return pd.DataFrame(rows, columns=[C.BOND_CODE, C.BOND_NAME, C.INST_START_DATE, C.INST_END_DATE,
+                                           C.ACCRUAL_DAYS, C.PERIOD_INST])
+
+    def _bond_trades(self, code, name, market, exchange, primary, sold, valid, hold_start, hold_end,
+                     face, cost_clean, cpn) -> Dict[str, pd.DataFrame]:
+        # 非一级认购的持仓以二级买入开始，提前结束的持仓以二级卖出结束
+        buy = np.flatnonzero(valid & ~primary)
+        sell = np.flatnonzero(sold)
+        idx = np.concatenate([buy, sell])
+        side = np.concatenate([np.ones(len(buy), int), np.full(len(sell), 4)])
+        date = pd.DatetimeIndex(np.concatenate([hold_start[buy], hold_end[sell]]))
+
+        clean = cost_clean[idx] + np.where(side == 4, self.rng.normal(0.2, 0.4, len(idx)), 0)
+        accrued = cpn[idx] * 0.3
+        qty = face[idx]
+        trades = pd.DataFrame({
+            C.BOND_NAME: name[idx],
+            C.BOND_CODE: code[idx],
+            C.MARKET_CODE: market[idx],
+            C.DIRECTION: side,
+            C.NET_PRICE: clean.round(4),
+            C.FULL_PRICE: (clean + accrued).round(4),
+            'qty': qty,
+            'accrued_amt': (qty * accrued / 100).round(2),
+            C.TRADE_AMT: (qty * clean / 100).round(2),
+            C.SETTLE_AMT: (qty * (clean + accrued) / 100).round(2),
+            C.CHECK_STATUS: 1,
+            'date': date,
+        })
+
+        on_exchange = exchange[idx]
+        bank = trades.loc[~on_exchange].copy()
+        bank[C.TRADE_TIME] = bank['date'] + pd.to_timedelta(self.rng.integers(9 * 3600, 17 * 3600, len(bank)), unit='s')
+        bank = bank.rename(columns={'date': C.SETTLEMENT_DATE, 'qty': C.BOND_AMT_CASH,
+                                    'accrued_amt': C.ACCRUED_INST_CASH})
+
+        exchg = trades.loc[on_exchange].rename(columns={'date': C.TRADE_DATE, 'qty': C.BOND_AMT_CASH2,
+                                                        'accrued_amt': C.ACCRUED_INST_CASH2})
+
+        p = np.flatnonzero(primary)
+        distributions = pd.DataFrame({
+            C.TRADE_DATE: hold_start[p],
+            C.BOND_NAME: name[p],
+            C.BOND_CODE: code[p],
+            C.MARKET_CODE: market[p],
+            C.DIRECTION2: 1,
+            C.NET_PRICE2: cost_clean[p],
+            C.BOND_AMT_CASH2: face[p],
+            C.CHECK_STATUS: 1,
+        })
+
+        return {'trade_cashbonds': bank, 'trade_exchgcashbonds': exchg, 'ext_requestdistributions': distributions}
+
+    # ------------------------写入------------------------
+
+    def tables(self) -> Dict[str, pd.DataFrame]:
+        """
+        生成全部表。
+
+        Returns:
+            Dict[str, pd.DataFrame]: 表名 -> 数据，表名与LocalMirror.TABLES一致。
+        """
+
+        tables = {
+            'basic_agencies': self.agencies(),
+            'basic_agencies_relation': self.agencies_relation(),
+            'trade_colrepoes': self.repo(),
+            'trade_iboinfos': self.ibo(),
+            'market_irt': self.irt,
+        }
+        tables.update(self.bond_tables())
+
+        return tables
+
+    def write(self, path: str = None) -> Dict[str, int]:
+        """
+        生成全部表并写入LocalMirror格式的SQLite文件，已有的表会被替换。
+
+        Args:
+            path (str, optional): 输出目录，默认为C.LOCAL_DIR下的synthetic。
+
+        Returns:
+            Dict[str, int]: 各表的行数。
+        """
+
+        path = path if path is not None else os.path.join(C.LOCAL_DIR, 'synthetic')
+        os.makedirs(path, exist_ok=True)
+
+        counts = {}
+        for table, data in self.tables().items():
+            schema, column = LocalMirror.TABLES[table]
+            with sqlite3.connect(os.path.join(path, f"{schema}.db")) as db:
+                write_table(db, table, data, replace=True)
+                index_table(db, table, [column, *LocalMirror.INDEX_COLUMNS])
+            counts[table] = len(data)
+
+        return counts
+
+
+if __name__ == '__main__':
+    # 生成模拟数据，例如：
+    # python -m utils.synthetic --bonds 500 --trades-per-day 50 --counterparties 300 --years 2
+    # FM_DATA_DB=mirror FM_DATA_MIRROR_DIR=.fm_cache/synthetic streamlit run main.py
+    parser = argparse.ArgumentParser(description='生成与upsrod结构一致的模拟数据')
+    parser.add_argument('--bonds', type=int, default=200, help='债券数量，默认为200')
+    parser.add_argument('--trades-per-day', type=int, default=20, help='回购和拆借每个工作日的交易笔数，默认为20')
+    parser.add_argument('--counterparties', type=int, default=200, help='交易对手数量，默认为200')
+    parser.add_argument('--years', type=int, default=2, help='数据覆盖的年数，默认为2')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子，默认为0')
+    parser.add_argument('--path', default=None, help='输出目录，默认为C.LOCAL_DIR下的synthetic')
+    args = parser.parse_args()
+
+    data = SyntheticData(args.bonds, args.trades_per_day, args.counterparties, args.years, seed=args.seed)
+    for table, rows in data.write(args.path).items():
+        print(f"{table}: {rows}")
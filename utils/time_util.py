@@ -3,7 +3,232 @@
 # FileName: utils
 # Description: This file contains utility functions and classes for the project.
 
+import threading
+import time
 from datetime import datetime, timedelta, date
+from typing import Any, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.db_util import Constants as C, create_conn, get_raw
+
+
+class BusinessCalendar:
+    """
+    进程内共享的工作日日历，工作日为market_irt和basic_bondvaluations中实际出现过的日期。
+
+    只读取请求的日期附近的区间：查找前后的工作日时向前或向后多读取margin天，之后只读取已读取区间以外的部分；
+    已读取的最大工作日之后的日期，两次读取至少间隔refresh_interval秒，以便读取到新发布的数据。查询的日期上限为请求的日期，
+    不依赖当前时间，过去区间的查询按历史数据缓存。
+    日历保存为排序的datetime64[D]数组，各查找函数对日期数组按二分查找向量化计算，输入为标量时返回标量，
+    输入为Series时返回同索引的Series，其他数组返回DatetimeIndex或numpy数组。日历范围外找不到的日期返回NaT。
+
+    Attributes:
+        refresh_interval (float): 两次读取最大工作日之后日期的最小间隔（秒）。
+        margin (int): 查找前后的工作日时多读取的天数，应大于最长的连续假期。
+    """
+
+    def __init__(self, refresh_interval: float = 600, margin: int = 31) -> None:
+        """
+        构造函数
+
+        Args:
+            refresh_interval (float, optional): 两次读取最大工作日之后日期的最小间隔（秒），默认为600秒，与create_conn一致。
+            margin (int, optional): 查找前后的工作日时多读取的天数，默认为31天。
+        """
+
+        self.refresh_interval = refresh_interval
+        self.margin = margin
+        self._days = np.array([], dtype='datetime64[D]')
+        # 已读取的日期区间[_start, _end]
+        self._start = None
+        self._end = None
+        self._refreshed = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _select(start: np.datetime64, end: np.datetime64) -> str:
+        # 直接比较日期列，不使用date()，使查询可以使用索引
+        start_str, end_str = str(start), str(end + 1)
+        irt_where = f"where {C.DATE} >= '{start_str}' and {C.DATE} < '{end_str}'"
+        bv_where = f"where {C.DEAL_DATE} >= '{start_str}' and {C.DEAL_DATE} < '{end_str}'"
+
+        return f"select date({C.DATE}) as {C.DATE} from {C.MARKET_DBNAME}.market_irt {irt_where} " \
+               f"union select date({C.DEAL_DATE}) as {C.DATE} from {C.COMP_DBNAME}.basic_bondvaluations {bv_where}"
+
+    def _fetch(self, start: np.datetime64, end: np.datetime64) -> None:
+        data = get_raw(create_conn(), self._select(start, end))
+
+        days = pd.to_datetime(data[C.DATE]).dropna().to_numpy().astype('datetime64[D]') if not data.empty else \
+            np.array([], dtype='datetime64[D]')
+        self._days = np.unique(np.concatenate([self._days, days]))
+        self._start = start if self._start is None else min(self._start, start)
+        self._end = end if self._end is None else max(self._end, end)
+        self._refreshed = time.monotonic()
+
+    def days(self, since: Any = None, until: Any = None) -> np.ndarray:
+        """
+        已读取的工作日，先读取[since, until]中尚未读取的部分。
+
+        Args:
+            since (Any, optional): 需要覆盖的最早日期，默认为until。
+            until (Any, optional): 需要覆盖的最晚日期，默认为since；两者都为空时不读取。
+
+        Returns:
+            np.ndarray: 排序的datetime64[D]数组。
+        """
+
+        since = since if since is not None else until
+        until = until if until is not None else since
+
+        with self._lock:
+            if since is None:
+                return self._days
+
+            start, end = sorted([np.datetime64(pd.Timestamp(since).date(), 'D'),
+                                 np.datetime64(pd.Timestamp(until).date(), 'D')])
+
+            if self._start is None:
+                self._fetch(start, end)
+                return self._days
+
+            if start < self._start:
+                self._fetch(start, self._start - 1)
+
+            # 已读取的最大工作日之后的日期可能有新发布的数据，间隔refresh_interval后从该日起重新读取
+            last = self._days[-1] if len(self._days) else self._start
+            if end > last and time.monotonic() - self._refreshed > self.refresh_interval:
+                self._fetch(last, end)
+            elif end > self._end:
+                self._fetch(self._end + 1, end)
+
+            return self._days
+
+    @staticmethod
+    def _as_days(dates: Any) -> Tuple[np.ndarray, Any]:
+        # 转换为datetime64[D]数组，同时返回把结果数组还原为输入形式的函数
+        if isinstance(dates, pd.Series):
+            values = pd.to_datetime(dates).to_numpy().astype('datetime64[D]')
+            return values, lambda result: pd.Series(result, index=dates.index, name=dates.name)
+
+        converted = pd.to_datetime(dates)
+        if not isinstance(converted, pd.DatetimeIndex):
+            values = np.array([converted.to_datetime64() if converted is not pd.NaT else np.datetime64('NaT')])
+
+            def restore_scalar(result: np.ndarray) -> Any:
+                return pd.Timestamp(result[0]) if result.dtype.kind == 'M' else int(result[0])
+
+            return values.astype('datetime64[D]'), restore_scalar
+
+        return converted.to_numpy().astype('datetime64[D]'), \
+            lambda result: pd.DatetimeIndex(result) if result.dtype.kind == 'M' else result
+
+    @staticmethod
+    def _bounds(values: np.ndarray) -> Tuple[Any, Any]:
+        values = values[~np.isnat(values)]
+        return (values.min(), values.max()) if len(values) else (None, None)
+
+    def _lookup(self, dates: Any, side: str, offset: int) -> Any:
+        values, restore = self._as_days(dates)
+        # 向前查找时多读取之前margin天，向后查找时多读取之后margin天
+        first, last = self._bounds(values)
+        if first is not None:
+            first, last = (first - self.margin, last) if offset < 0 else (first, last + self.margin)
+        days = self.days(first, last)
+
+        idx = np.searchsorted(days, values, side=side) + offset
+        valid = (idx >= 0) & (idx < len(days)) & ~np.isnat(values)
+
+        result = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[ns]')
+        result[valid] = days[idx[valid]]
+
+        return restore(result)
+
+    def prev(self, dates: Any, inclusive: bool = False) -> Any:
+        """
+        每个日期之前的最近一个工作日。
+
+        Args:
+            dates (Any): 日期或日期数组。
+            inclusive (bool, optional): 为True时日期本身是工作日则返回其本身，默认为False。
+
+        Returns:
+            Any: 工作日，日历中没有更早的工作日时为NaT。
+        """
+
+        return self._lookup(dates, 'right' if inclusive else 'left', -1)
+
+    def next(self, dates: Any, inclusive: bool = False) -> Any:
+        """
+        每个日期之后的最近一个工作日。
+
+        Args:
+            dates (Any): 日期或日期数组。
+            inclusive (bool, optional): 为True时日期本身是工作日则返回其本身，默认为False。
+
+        Returns:
+            Any: 工作日，日历中没有更晚的工作日时为NaT。
+        """
+
+        return self._lookup(dates, 'left' if inclusive else 'right', 0)
+
+    def month_end(self, dates: Any) -> Any:
+        """
+        每个日期所在月份的最后一个工作日。
+
+        Args:
+            dates (Any): 日期或日期数组。
+
+        Returns:
+            Any: 工作日，该月没有工作日时为NaT。
+        """
+
+        values, restore = self._as_days(dates)
+        month = values.astype('datetime64[M]')
+
+        # 下月初之前的最近一个工作日，不在本月时为NaT
+        last = self.prev(pd.DatetimeIndex((month + 1).astype('datetime64[D]'))).to_numpy()
+        last = np.where(last.astype('datetime64[M]') == month, last, np.datetime64('NaT'))
+
+        return restore(last.astype('datetime64[ns]'))
+
+    def count(self, start: Any, end: Any) -> Any:
+        """
+        [start, end]之间（含两端）的工作日数量，start和end可以是日期或等长的日期数组。
+
+        Args:
+            start (Any): 开始日期。
+            end (Any): 结束日期（含）。
+
+        Returns:
+            Any: 工作日数量，start晚于end时为0。
+        """
+
+        start_values, start_restore = self._as_days(start)
+        end_values, end_restore = self._as_days(end)
+        # 一端为标量时按另一端的形式返回
+        restore = start_restore if len(start_values) >= len(end_values) else end_restore
+        days = self.days(self._bounds(start_values)[0], self._bounds(end_values)[1])
+
+        counts = np.searchsorted(days, end_values, side='right') - np.searchsorted(days, start_values, side='left')
+
+        return restore(np.maximum(counts, 0))
+
+    def clear(self) -> None:
+        """
+        清空已读取的日期，下次使用时重新读取。
+        """
+
+        with self._lock:
+            self._days = np.array([], dtype='datetime64[D]')
+            self._start = None
+            self._end = None
+            self._refreshed = 0.0
+
+
+# 进程内共享的工作日日历
+business_calendar = BusinessCalendar()
 
 
 class TimeUtil:
@@ -51,19 +276,21 @@ class TimeUtil:
         return func_this_year_start, func_last_year_start
 
     @staticmethod
-    def get_months_feday(year_num: int) -> list[tuple[date, date]]:
+    def get_months_feday(year_num: int, moment: datetime = None) -> list[tuple[date, date]]:
         """
         该函数返回一个包含元组的列表，每个元组包含指定年份中每个月的开始和结束日期（截至到前一天（含））
 
         :param year_num: 要计算每月开始和结束日期的年份。
         :type year_num: int
+        :param moment: 基准时间，默认为当前时间；回放记录的查询时应与记录时相同。
+        :type moment: datetime, optional
         :return: 一个包含元组的列表，每个元组包含表示某个月的开始和结束日期的两个日期对象。
 
         """
 
         months = []
         # 时间截点为前一天的数据
-        current_date = datetime.now() - timedelta(days=1)
+        current_date = (moment if moment is not None else datetime.now()) - timedelta(days=1)
         current_year = current_date.year
         current_month = current_date.month
 
@@ -92,6 +319,53 @@ class TimeUtil:
 
         return months
 
+    @staticmethod
+    def prev_business_day(dates: Any, inclusive: bool = False) -> Any:
+        """
+        每个日期之前的最近一个工作日，工作日为market_irt和basic_bondvaluations中有数据的日期。
+
+        :param dates: 日期或日期数组（Series、DatetimeIndex、列表等）。
+        :param inclusive: 为True时日期本身是工作日则返回其本身，默认为False。
+        :return: 与输入形式一致的工作日，没有更早的工作日时为NaT。
+        """
+
+        return business_calendar.prev(dates, inclusive)
+
+    @staticmethod
+    def next_business_day(dates: Any, inclusive: bool = False) -> Any:
+        """
+        每个日期之后的最近一个工作日。
+
+        :param dates: 日期或日期数组。
+        :param inclusive: 为True时日期本身是工作日则返回其本身，默认为False。
+        :return: 与输入形式一致的工作日，没有更晚的工作日时为NaT。
+        """
+
+        return business_calendar.next(dates, inclusive)
+
+    @staticmethod
+    def business_days_between(start: Any, end: Any) -> Any:
+        """
+        [start, end]之间（含两端）的工作日数量。
+
+        :param start: 开始日期或日期数组。
+        :param end: 结束日期或日期数组（含）。
+        :return: 工作日数量，标量或数组。
+        """
+
+        return business_calendar.count(start, end)
+
+    @staticmethod
+    def business_month_end(dates: Any) -> Any:
+        """
+        每个日期所在月份的最后一个工作日。
+
+        :param dates: 日期或日期数组。
+        :return: 与输入形式一致的工作日，该月没有工作日时为NaT。
+        """
+
+        return business_calendar.month_end(dates)
+
 
 if __name__ == '__main__':
     # Test the TimeUtil class
@@ -102,3 +376,9 @@ if __name__ == '__main__':
     # print(f"Last month ends on: {last_month_end}")
 
     print(TimeUtil.get_months_feday(2023))
+
+    # 工作日日历，例如：FM_DATA_DB=mirror python -m utils.time_util
+    today = pd.Timestamp(datetime.now().date())
+    print(f"Previous business day: {TimeUtil.prev_business_day(today)}")
+    print(f"Business days this year: {TimeUtil.business_days_between(datetime(today.year, 1, 1), today)}")
+    print(TimeUtil.business_month_end(pd.date_range(datetime(today.year, 1, 1), today, freq='MS')))
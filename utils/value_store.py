@@ -0,0 +1,329 @@
+# Author: RockMan
+# CreateTime: 2026/10/19
+# FileName: value_store
+# Description: This module contains the ValuationStore class which keeps bond valuations locally by (bond, date).
+
+import argparse
+import glob
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+import pandas as pd
+import streamlit as st
+
+from utils.db_util import Constants as C, conn_source, create_conn, get_raw, recorder
+from utils.file_util import atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+class ValuationStore:
+    """
+    债券估值（basic_bondvaluations）的本地列式存储，按(债券, 日期)保存，已有的估值不再从数据库读取。
+
+    每个数据源一个目录，估值以只追加的Parquet文件保存，每次从数据库读取的数据写入一个新文件；覆盖索引（coverage.parquet）
+    记录每支债券已读取过的日期区间，查询时只读取区间中缺失的部分，缺失区间相同的债券合并为一个查询。
+    估值历史不会变化，但最近几天的估值可能尚未发布，覆盖索引对每支债券只记录到其查询结果中的最大日期或settle_days天前，
+    较晚的日期下次仍然查询。文件数超过max_parts时合并为一个按债券代码排序的文件。
+
+    进程内按数据源和债券代码缓存估值，只从文件中读取请求过的债券；所有操作都加锁，可在多线程中使用，
+    多个进程同时写入时可能重复读取，不影响结果。
+
+    Attributes:
+        path (str): 存储目录，每个数据源一个子目录。
+        settle_days (int): 早于今天这么多天的估值视为已发布。
+        max_parts (int): 合并前的最大文件数。
+        batch_size (int): 每次查询的最大债券代码数量。
+    """
+
+    COLUMNS = [C.DATE, C.BOND_CODE, C.BOND_NAME, C.VALUE_TYPE, C.VALUE_NET_PRICE]
+
+    def __init__(self, path: str, settle_days: int = 7, max_parts: int = 64, batch_size: int = 1000) -> None:
+        """
+        构造函数
+
+        Args:
+            path (str): 存储目录。
+            settle_days (int, optional): 早于今天这么多天的估值视为已发布，默认为7天。
+            max_parts (int, optional): 合并前的最大文件数，默认为64。
+            batch_size (int, optional): 每次查询的最大债券代码数量，默认为1000。
+        """
+
+        self.path = path
+        self.settle_days = settle_days
+        self.max_parts = max_parts
+        self.batch_size = batch_size
+        # 数据源 -> 估值文件列表
+        self._parts: Dict[str, List[str]] = {}
+        # 数据源 -> {债券代码 -> 已覆盖的日期区间列表}
+        self._coverage: Dict[str, Dict[str, List[Tuple[pd.Timestamp, pd.Timestamp]]]] = {}
+        # 数据源 -> {债券代码 -> 估值}，只包含已读取过的债券
+        self._bonds: Dict[str, Dict[str, pd.DataFrame]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def usable(conn: st.connection) -> bool:
+        """
+        是否可以使用本地存储：回放数据源只能按原SQL读取记录的结果，记录查询时也按原SQL查询，使记录可以回放。
+        """
+
+        return conn_source(conn) != C.REPLAY_DBNAME and not recorder.record
+
+    def _dir(self, source: str) -> str:
+        return os.path.join(self.path, source or 'default')
+
+    def _part_file(self, source: str) -> str:
+        return os.path.join(self._dir(source), f"values-{time.time_ns()}-{os.getpid()}.parquet")
+
+    def _load(self, source: str) -> None:
+        folder = self._dir(source)
+        parts = sorted(glob.glob(os.path.join(folder, 'values-*.parquet')))
+
+        coverage = {}
+        try:
+            index = pd.read_parquet(os.path.join(folder, 'coverage.parquet'))
+            for code, start, end in index[[C.BOND_CODE, 'start', 'end']].itertuples(index=False):
+                coverage.setdefault(code, []).append((pd.Timestamp(start), pd.Timestamp(end)))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            # 覆盖索引损坏时按没有覆盖处理，只会重复读取
+            logger.warning("Failed to read valuation coverage in %s: %s", folder, e)
+
+        # 文件过多时合并，按债券代码排序，读取部分债券时可以跳过不相关的行组
+        if len(parts) > self.max_parts:
+            try:
+                frames = [pd.read_parquet(part) for part in parts]
+                data = pd.concat(frames, ignore_index=True).drop_duplicates().sort_values(
+                    [C.BOND_CODE, C.DATE], kind='stable')
+                file = self._part_file(source)
+                atomic_write(file, lambda tmp: data.to_parquet(tmp, index=False))
+                for part in parts:
+                    os.remove(part)
+                parts = [file]
+            except Exception as e:
+                logger.warning("Failed to compact valuation files in %s: %s", folder, e)
+
+        self._parts[source] = parts
+        self._coverage[source] = {code: self._merge(intervals) for code, intervals in coverage.items()}
+        self._bonds[source] = {}
+
+    def _read(self, source: str, codes: List[str]) -> None:
+        # 从文件中读取尚未读取过的债券的估值
+        bonds = self._bonds[source]
+        missing = [code for code in codes if code not in bonds]
+        if not missing:
+            return
+
+        frames = []
+        for part in self._parts[source]:
+            try:
+                frames.append(pd.read_parquet(part, filters=[(C.BOND_CODE, 'in', missing)]))
+            except Exception as e:
+                logger.warning("Failed to read valuation file %s: %s", part, e)
+
+        frames = [frame for frame in frames if not frame.empty]
+        data = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=self.COLUMNS)
+        grouped = dict(tuple(data.groupby(C.BOND_CODE, sort=False))) if not data.empty else {}
+
+        for code in missing:
+            bonds[code] = grouped[code].drop_duplicates().reset_index(drop=True) if code in grouped else \
+                pd.DataFrame(columns=self.COLUMNS)
+
+    @staticmethod
+    def _merge(intervals: List[Tuple[pd.Timestamp, pd.Timestamp]]) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+        # 合并重叠或相邻的日期区间
+        merged = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1] + pd.Timedelta(days=1):
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    @staticmethod
+    def _gaps(intervals: List[Tuple[pd.Timestamp, pd.Timestamp]], start: pd.Timestamp,
+              end: pd.Timestamp) -> Tuple[Tuple[pd.Timestamp, pd.Timestamp], ...]:
+        # [start, end]中没有被覆盖的日期区间
+        gaps = []
+        current = start
+        for a, b in intervals:
+            if b < current:
+                continue
+            if a > end:
+                break
+            if a > current:
+                gaps.append((current, a - pd.Timedelta(days=1)))
+            current = b + pd.Timedelta(days=1)
+            if current > end:
+                break
+        if current <= end:
+            gaps.append((current, end))
+        return tuple(gaps)
+
+    def _fetch(self, conn: st.connection, codes: List[str], start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        frames = []
+
+        for i in range(0, len(codes), self.batch_size):
+            codes_str = ', '.join(f"'{code}'" for code in codes[i:i + self.batch_size])
+            sql = f"select " \
+                  f"bv.{C.DEAL_DATE} as {C.DATE}, " \
+                  f"bv.{C.BOND_CODE}, " \
+                  f"bv.{C.BOND_NAME}, " \
+                  f"bv.{C.VALUE_TYPE}, " \
+                  f"bv.{C.VALUE_NET_PRICE} " \
+                  f"from {C.COMP_DBNAME}.basic_bondvaluations bv " \
+                  f"where bv.{C.BOND_CODE} in ({codes_str}) " \
+                  f"and date(bv.{C.DEAL_DATE}) >= '{start.strftime('%Y-%m-%d')}' " \
+                  f"and date(bv.{C.DEAL_DATE}) <= '{end.strftime('%Y-%m-%d')}'"
+            frames.append(get_raw(conn, sql))
+
+        return pd.concat(frames, ignore_index=True).reindex(columns=self.COLUMNS)
+
+    def _update(self, conn: st.connection, source: str, codes: List[str], start: pd.Timestamp,
+                end: pd.Timestamp) -> None:
+        coverage = self._coverage[source]
+
+        # 按缺失区间分组，缺失区间相同的债券一起查询
+        groups = {}
+        for code in codes:
+            gaps = self._gaps(coverage.get(code, []), start, end)
+            if gaps:
+                groups.setdefault(gaps, []).append(code)
+
+        if not groups:
+            return
+
+        settled = pd.Timestamp(date.today() - timedelta(days=self.settle_days))
+        fetched = []
+
+        for gaps, group in groups.items():
+            for gap_start, gap_end in gaps:
+                values = self._fetch(conn, group, gap_start, gap_end)
+                fetched.append(values)
+
+                # 最近的估值可能尚未发布，每支债券只覆盖到其自身查询结果中的最大日期或已发布的日期
+                latest = pd.to_datetime(values.groupby(C.BOND_CODE)[C.DATE].max()).dt.normalize() \
+                    if not values.empty else pd.Series(dtype='datetime64[ns]')
+                for code in group:
+                    covered_end = min(gap_end, max(latest.get(code, settled), settled))
+                    if covered_end >= gap_start:
+                        coverage[code] = self._merge(coverage.get(code, []) + [(gap_start, covered_end)])
+
+        # 只对新读取的数据去重，按债券追加到已读取的估值中
+        fetched = [frame for frame in fetched if not frame.empty]
+        new = pd.concat(fetched, ignore_index=True).drop_duplicates() if fetched else pd.DataFrame(columns=self.COLUMNS)
+        bonds = self._bonds[source]
+        for code, rows in (new.groupby(C.BOND_CODE, sort=False) if not new.empty else []):
+            kept = bonds.get(code)
+            bonds[code] = rows.reset_index(drop=True) if kept is None or kept.empty else \
+                pd.concat([kept, rows], ignore_index=True)
+
+        folder = self._dir(source)
+
+        try:
+            os.makedirs(folder, exist_ok=True)
+            if not new.empty:
+                file = self._part_file(source)
+                atomic_write(file, lambda tmp: new.to_parquet(tmp, index=False))
+                self._parts[source].append(file)
+
+            index = pd.DataFrame([(code, start, end) for code, intervals in coverage.items()
+                                  for start, end in intervals], columns=[C.BOND_CODE, 'start', 'end'])
+            atomic_write(os.path.join(folder, 'coverage.parquet'), lambda tmp: index.to_parquet(tmp, index=False))
+        except Exception as e:
+            logger.warning("Failed to write valuation store %s: %s", folder, e)
+
+    def get(self, conn: st.connection, codes: Iterable[str], start_time: date, end_time: date) -> pd.DataFrame:
+        """
+        债券在[start_time, end_time]之间的估值，先从数据库读取本地缺失的部分。
+
+        Args:
+            conn (st.connection): 数据库连接对象。
+            codes (Iterable[str]): 债券代码。
+            start_time (date): 开始日期。
+            end_time (date): 结束日期（含）。
+
+        Returns:
+            pd.DataFrame: [C.DATE, C.BOND_CODE, C.BOND_NAME, C.VALUE_TYPE, C.VALUE_NET_PRICE]，
+            按债券代码和日期排序。
+        """
+
+        codes = list(dict.fromkeys(codes))
+        start, end = pd.Timestamp(start_time), pd.Timestamp(end_time)
+        source = conn_source(conn)
+
+        if start > end or not codes:
+            return pd.DataFrame(columns=self.COLUMNS)
+
+        with self._lock:
+            if source not in self._parts:
+                self._load(source)
+            self._read(source, codes)
+            self._update(conn, source, codes, start, end)
+            frames = [self._bonds[source][code] for code in codes]
+
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame(columns=self.COLUMNS)
+
+        data = pd.concat(frames, ignore_index=True)
+        mask = (data[C.DATE] >= start) & (data[C.DATE] < end + pd.Timedelta(days=1))
+
+        return data.loc[mask].sort_values([C.BOND_CODE, C.DATE], kind='stable').reset_index(drop=True)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        已加载的各数据源中已读取的估值行数、已读取的债券数量和覆盖的债券数量。
+
+        Returns:
+            Dict[str, Dict[str, int]]: 数据源 -> {rows, loaded, bonds}
+        """
+
+        with self._lock:
+            return {source: {'rows': sum(len(frame) for frame in self._bonds[source].values()),
+                             'loaded': len(self._bonds[source]), 'bonds': len(coverage)}
+                    for source, coverage in self._coverage.items()}
+
+    def clear(self, source: str = None) -> None:
+        """
+        删除本地存储的估值和覆盖索引。
+
+        Args:
+            source (str, optional): 数据源名称，默认为全部数据源。
+        """
+
+        with self._lock:
+            sources = [source] if source is not None else \
+                [entry.name for entry in os.scandir(self.path) if entry.is_dir()] if os.path.isdir(self.path) else []
+
+            for name in sources:
+                key = name if name != 'default' else ''
+                for state in (self._parts, self._coverage, self._bonds):
+                    state.pop(key, None)
+                for file in glob.glob(os.path.join(self._dir(name), '*.parquet')):
+                    os.remove(file)
+
+
+# 本地估值存储，在进程间共享，重启后仍然有效；设置环境变量FM_DATA_VALUE_STORE=0可关闭
+valuation_store = ValuationStore(os.path.join(C.LOCAL_DIR, 'valuations')) \
+    if os.environ.get('FM_DATA_VALUE_STORE', '1') != '0' else None
+
+
+if __name__ == '__main__':
+    # 预先读取债券估值，例如：python -m utils.value_store 2300000.SH 2300002.IB --start 2024-01-01
+    parser = argparse.ArgumentParser(description='读取债券估值到本地存储')
+    parser.add_argument('codes', nargs='+', help='债券代码')
+    parser.add_argument('--start', default=(datetime.now() - timedelta(days=365)).strftime('%Y-%m-%d'),
+                        help='开始日期，默认为一年前')
+    parser.add_argument('--end', default=(datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d'),
+                        help='结束日期，默认为昨天')
+    args = parser.parse_args()
+
+    store = valuation_store if valuation_store is not None else ValuationStore(os.path.join(C.LOCAL_DIR, 'valuations'))
+    print(store.get(create_conn(), args.codes, pd.Timestamp(args.start).date(), pd.Timestamp(args.end).date()))
+    print(store.stats())
@@ -0,0 +1,181 @@
+# Author: RockMan
+# CreateTime: 2026/10/19
+# FileName: warmup
+# Description: This module precomputes the default report windows of every page into the shared caches.
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+from bond_tx import BondTx, CDTx
+from fund_tx import Repo, IBO
+from utils.db_util import Constants as C, disk_cache
+from utils.file_util import atomic_write
+from utils.summary_store import MonthlySummaryStore
+from utils.time_util import TimeUtil
+from utils.txn_factory import TxFactory
+from utils.web_data import OverviewDataHandler
+
+logger = logging.getLogger(__name__)
+
+# 预热状态文件，页面据此显示数据是否已就绪
+STATUS_FILE = os.path.join(C.LOCAL_DIR, 'warmup.json')
+
+
+def warmup_tasks(moment: datetime = None) -> List[Tuple[str, Callable[[], object]]]:
+    """
+    各页面默认查询窗口的预热任务，与页面的默认日期保持一致：
+        - 回购、拆借：上个月。
+        - 债券、存单：今年初至上月末。
+        - 业务总览：今年和上一年的月度报告。
+
+    交易对象的构造函数会执行全部查询，结果写入本地Parquet缓存；总览的已结束月份写入MonthlySummaryStore。
+
+    Args:
+        moment (datetime, optional): 基准时间，默认为当前时间。
+
+    Returns:
+        List[Tuple[str, Callable[[], object]]]: (任务名, 任务函数)的列表。
+    """
+
+    moment = moment if moment is not None else datetime.now()
+
+    _, last_month_start, last_month_end = TimeUtil.get_current_and_last_month_dates(moment)
+    this_year_start, _ = TimeUtil.get_current_and_last_year(moment)
+
+    last_month_start, last_month_end, this_year_start = \
+        last_month_start.date(), last_month_end.date(), this_year_start.date()
+
+    def overview():
+        OverviewDataHandler(moment.year, MonthlySummaryStore(), direct_monthly=True,
+                            moment=moment).all_reports_yoy(max_workers=1)
+
+    return [
+        (C.REPO, lambda: TxFactory(Repo).create_txn(last_month_start, last_month_end)),
+        (C.IBO, lambda: TxFactory(IBO).create_txn(last_month_start, last_month_end)),
+        (C.BOND, lambda: TxFactory(BondTx).create_txn(this_year_start, last_month_end)),
+        (C.CD, lambda: TxFactory(CDTx).create_txn(this_year_start, last_month_end)),
+        ('overview', overview),
+    ]
+
+
+def write_status(status: Dict) -> None:
+    """
+    写入预热状态，先写临时文件再替换。
+
+    Args:
+        status (Dict): 预热状态。
+    """
+
+    os.makedirs(os.path.dirname(STATUS_FILE), exist_ok=True)
+
+    def write(tmp: str) -> None:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(status, f, ensure_ascii=False, indent=2)
+
+    atomic_write(STATUS_FILE, write)
+
+
+def read_status() -> Dict:
+    """
+    读取预热状态。
+
+    Returns:
+        Dict: {state, started, finished, tasks}，state为'running', 'ready'或'partial'；没有预热过时返回空字典。
+    """
+
+    try:
+        with open(STATUS_FILE, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def is_ready(status: Dict = None) -> bool:
+    """
+    今天是否已完成预热。
+
+    Args:
+        status (Dict, optional): 预热状态，默认读取状态文件。
+
+    Returns:
+        bool: 今天的预热全部成功时返回True。
+    """
+
+    status = status if status is not None else read_status()
+
+    return status.get('state') == 'ready' and \
+        (status.get('finished') or '')[:10] == datetime.now().strftime('%Y-%m-%d')
+
+
+def warmup(names: List[str] = None) -> Dict:
+    """
+    执行预热，单个任务失败不影响其他任务。
+
+    Args:
+        names (List[str], optional): 要执行的任务名，默认为全部。
+
+    Returns:
+        Dict: 预热状态，同read_status。
+    """
+
+    if disk_cache is None:
+        logger.warning("FM_DATA_DISK_CACHE=0, query results will not be shared with the pages")
+
+    tasks = warmup_tasks()
+
+    # 只执行部分任务时，保留其他任务今天的结果
+    previous = read_status()
+    done = previous.get('tasks', {}) if names and (previous.get('started') or '')[:10] == \
+        datetime.now().strftime('%Y-%m-%d') else {}
+
+    status = {'state': 'running', 'started': datetime.now().isoformat(timespec='seconds'), 'finished': None,
+              'tasks': dict(done)}
+    write_status(status)
+
+    # 默认窗口的截止日通常在settle_days以内，按当日数据缓存的有效期很短，预热的结果保留到当天结束
+    tomorrow = (datetime.now() + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    hold = disk_cache.hold(tomorrow.timestamp()) if disk_cache is not None else contextlib.nullcontext()
+
+    with hold:
+        for name, task in tasks:
+            if names and name not in names:
+                continue
+
+            start = time.perf_counter()
+            try:
+                task()
+                status['tasks'][name] = {'seconds': round(time.perf_counter() - start, 2), 'error': None}
+            except Exception as e:
+                logger.exception("Warm-up task %s failed", name)
+                status['tasks'][name] = {'seconds': round(time.perf_counter() - start, 2), 'error': repr(e)}
+
+            logger.info("Warm-up task %s finished in %.2fs", name, status['tasks'][name]['seconds'])
+
+    complete = all(name in status['tasks'] and status['tasks'][name]['error'] is None for name, _ in tasks)
+    status['state'] = 'ready' if complete else 'partial'
+    status['finished'] = datetime.now().isoformat(timespec='seconds')
+    write_status(status)
+
+    return status
+
+
+if __name__ == '__main__':
+    # 上班前预热各页面的默认查询，不需要打开浏览器，例如由cron在每个工作日7点执行：
+    # python -m utils.warmup
+    # python -m utils.warmup repo ibo
+    parser = argparse.ArgumentParser(description='预热各页面默认查询窗口的缓存')
+    parser.add_argument('tasks', nargs='*', help=f"要执行的任务，默认为全部：{C.REPO}, {C.IBO}, {C.BOND}, {C.CD}, overview")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    result = warmup(args.tasks)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    raise SystemExit(0 if result['state'] == 'ready' else 1)
@@ -3,16 +3,22 @@
 # FileName: display_util
 # Description: This module contains the FundDataHandler class
 # which provides methods for displaying transaction data on a web page.
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime, date
 
-from typing import Dict, List, Type, Union
+from typing import Callable, Dict, List, Tuple, Type, Union
 
+import numpy as np
 import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 from bond_tx import SecurityTx, BondTx, CDTx
 from fund_tx import FundTx, Repo, IBO
 from utils.db_util import Constants as C
-from utils.market_util import MarketUtil
+from utils.market_util import market_rates
+from utils.profiler import stage as profile_stage
+from utils.summary_store import MonthlySummaryStore
 from utils.time_util import TimeUtil
 from utils.txn_factory import TxFactory
 
@@ -22,6 +28,9 @@ class FundDataHandler:
     """
     处理资金交易数据的工具类。
 
+    按交易方向筛选的源数据和分组结果会被缓存，一次页面渲染中每个方向只扫描一次self.tx.raw。
+    缓存以self.tx.raw对象为准：self.tx或self.tx.raw被替换时自动失效；如果原地修改了self.tx.raw，需调用clear_cache。
+
     Attributes:
         tx (FundTx): 要显示的交易对象.
         d (int): 交易方向，资金融入为4，资金融出为1
@@ -37,6 +46,11 @@ class FundDataHandler:
         self.tx = txn
         self.d = 100
 
+        # 缓存对应的源数据对象，按方向缓存的源数据切片，按(列名, 方向)缓存的分组结果
+        self._cache_raw = None
+        self._direction_raw = {}
+        self._group_cache = {}
+
     def set_direction(self, direction: str):
         self.d = 4 if direction == C.REPO or direction == C.IBO else 1
 
@@ -47,6 +61,52 @@ class FundDataHandler:
         if self.d == 100:
             raise ValueError("Direction has not been set. Please set the direction before proceeding.")
 
+    def clear_cache(self) -> None:
+        """
+        清空按方向缓存的源数据切片和分组结果.
+        """
+
+        self._cache_raw = self.tx.raw
+        self._direction_raw = {}
+        self._group_cache = {}
+
+    def raw_by_direction(self) -> pd.DataFrame:
+        """
+        当前交易方向的源数据，每个方向只筛选一次.
+
+        Returns:
+            pd.DataFrame: self.tx.raw_by_direction(self.d)的结果，不要原地修改.
+        """
+
+        self.check_set_d()
+
+        if self._cache_raw is not self.tx.raw:
+            self.clear_cache()
+
+        if self.d not in self._direction_raw:
+            self._direction_raw[self.d] = self.tx.raw_by_direction(self.d)
+
+        return self._direction_raw[self.d]
+
+    def groupby_column(self, column: str) -> pd.DataFrame:
+        """
+        当前交易方向的源数据按特定列聚合，结果按(列名, 方向)缓存.
+
+        Args:
+            column (str): 被聚合的列.
+
+        Returns:
+            pd.DataFrame: [column, C.AVG_AMT, C.INST_GROUP, C.PRODUCT, C.WEIGHT_RATE]，为缓存的副本，可以修改.
+        """
+
+        raw = self.raw_by_direction()
+        key = (column, self.d)
+
+        if key not in self._group_cache:
+            self._group_cache[key] = self.tx.groupby_column(column, self.d, raw)
+
+        return self._group_cache[key].copy()
+
     def daily_data(self) -> pd.DataFrame:
         """
         将FundTx的每日交易与资金市场利率按日期合并.
@@ -55,9 +115,9 @@ class FundDataHandler:
             pd.DataFrame: [C.AS_DT, C.TRADE_AMT, C.INST_DAYS, C.WEIGHT_RATE, C.R001, C.R007, C.SHIBOR_ON, C.SHIBOR_1W]
         """
 
-        daily = self.tx.daily_data(self.d)
         self.check_set_d()
-        market_irt = MarketUtil().get_irt(self.tx.start_time, self.tx.end_time)
+        daily = self.tx.daily_data(self.d, self.raw_by_direction())
+        market_irt = market_rates.get_irt(self.tx.start_time, self.tx.end_time)
 
         if market_irt.empty or daily.empty:
             return daily
@@ -73,12 +133,10 @@ class FundDataHandler:
         """
 
         # return self.tx.party_rank()
-        self.check_set_d()
-
-        if self.tx.raw_by_direction(self.d).empty:
+        if self.raw_by_direction().empty:
             return pd.DataFrame({})
 
-        party = self.tx.groupby_column(C.NAME, self.d)
+        party = self.groupby_column(C.NAME)
 
         return party
 
@@ -165,12 +223,10 @@ class FundDataHandler:
             pd.DataFrame: [C.TERM_TYPE, C.AVG_AMT, C.INST_GROUP, C.PRODUCT, C.WEIGHT_RATE]
         """
 
-        self.check_set_d()
-
-        if self.tx.raw_by_direction(self.d).empty:
+        if self.raw_by_direction().empty:
             return pd.DataFrame({})
 
-        term = self.tx.groupby_column(C.TERM_TYPE, self.d)
+        term = self.groupby_column(C.TERM_TYPE)
 
         return term
 
@@ -182,9 +238,7 @@ class FundDataHandler:
             Dict: {C.TRADE_NUM, C.TRADE_SUM, C.TRADE_WEIGHT_SUM, C.MAX_RATE, C.MIN_RATE}
         """
 
-        self.check_set_d()
-
-        raw = self.tx.raw_by_direction(self.d)
+        raw = self.raw_by_direction()
 
         if raw.empty:
             return {}
@@ -279,90 +333,120 @@ class FundDataHandler:
 
         }
 
-    def get_monthly_summary(self, mark_rate: float = 0) -> pd.DataFrame:
+    def get_monthly_base(self, direct: bool = False, moment: datetime = None) -> pd.DataFrame:
         """
-        按月度分组，返回月度统计数据
+        按月度分组，返回与基准利率无关的月度统计数据
 
         注意：内部对象FundTx的统计截至时间为当前时间的前一天
 
-        :param mark_rate: 用于计算套息的基准利率
-        :return: [C.DATE, C.TYPE, C.AVG_AMT, C.INST_DAYS, C.INST_GROUP, C.WEIGHT_RATE]
+        套息收入 = C.CARRY_BASE × (基准利率 - C.WEIGHT_RATE)，资金融出无套息收入，C.CARRY_BASE为0
+
+        :param direct: 为True时用FundTx.monthly_data按交易区间直接计算月度数据，不展开为每日数据
+        :param moment: 基准时间，默认为当前时间
+        :return: [C.DATE, C.TYPE, C.AVG_AMT, C.INST_DAYS, C.WEIGHT_RATE, C.WORK_DAYS, C.CARRY_BASE]
         """
 
-        # start_time = self.tx.get_stime()
         start_time = self.tx.start_time
         inst_base = self.tx.inst_base
 
         self.check_set_d()
 
-        dh = self.tx.daily_data(self.d)
+        if direct:
+            dh_monthly = self.tx.monthly_data(self.d)
+            if not dh_monthly.empty:
+                # 与按日汇总保持一致，C.AVG_AMT先存放月度积数，下面再除以天数
+                dh_monthly = dh_monthly[[C.PRODUCT, C.INST_DAYS]].rename(columns={C.PRODUCT: C.AVG_AMT})
+        else:
+            dh_monthly = self.tx.daily_data(self.d, self.raw_by_direction())
+            if not dh_monthly.empty:
+                dh_monthly.set_index(C.AS_DT, inplace=True)
+                dh_monthly.rename(columns={C.TRADE_AMT: C.AVG_AMT}, inplace=True)
+
+                # 按月度进行汇总
+                dh_monthly = dh_monthly.resample('ME').sum()
 
         # 如果无交易，则返回一个都为0的df
-        if dh.empty:
-            months = TimeUtil.get_months_feday(start_time.year)
+        if dh_monthly.empty:
+            months = TimeUtil.get_months_feday(start_time.year, moment)
 
             # 生成一个包含每个月最后一天的日期索引的DataFrame
             dates = pd.to_datetime([end for _, end in months])
-            df = pd.DataFrame(index=dates, columns=[C.TX_TYPE, C.AVG_AMT, C.INST_DAYS, C.INST_GROUP, C.WEIGHT_RATE])
-            df[[C.AVG_AMT, C.INST_DAYS, C.INST_GROUP, C.WEIGHT_RATE]] = 0
+            df = pd.DataFrame(index=dates, columns=[C.TX_TYPE, C.AVG_AMT, C.INST_DAYS, C.WEIGHT_RATE, C.WORK_DAYS,
+                                                    C.CARRY_BASE])
+            df[[C.AVG_AMT, C.INST_DAYS, C.WEIGHT_RATE, C.WORK_DAYS, C.CARRY_BASE]] = 0
             df[C.TX_TYPE] = ''
 
             df.index.name = C.DATE
 
             return df
 
-        dh.set_index(C.AS_DT, inplace=True)
-        dh.rename(columns={C.TRADE_AMT: C.AVG_AMT}, inplace=True)
+        # 统计天数，默认为当月天数
+        dh_monthly[C.WORK_DAYS] = dh_monthly.index.days_in_month
 
-        # 按月度进行汇总
-        dh_monthly = dh.resample('ME').sum()
+        # 最后一个月只统计窗口内的天数（当前月只统计到截止日），否则会以最后一个月的所有天数计算
+        last_day = pd.Timestamp(self.tx.end_time)
+        if dh_monthly.index[-1].year == last_day.year and dh_monthly.index[-1].month == last_day.month:
+            first_day = max(pd.Timestamp(self.tx.start_time), last_day.replace(day=1))
+            dh_monthly.iloc[-1, dh_monthly.columns.get_loc(C.WORK_DAYS)] = (last_day - first_day).days + 1
 
         # 计算月均余额
-        dh_monthly[C.AVG_AMT] = dh_monthly[C.AVG_AMT] / dh_monthly.index.days_in_month
+        dh_monthly[C.AVG_AMT] = dh_monthly[C.AVG_AMT] / dh_monthly[C.WORK_DAYS]
         # 计算月均加权利率
-        dh_monthly[C.WEIGHT_RATE] = (dh_monthly[C.INST_DAYS] * inst_base / dh_monthly.index.days_in_month /
+        dh_monthly[C.WEIGHT_RATE] = (dh_monthly[C.INST_DAYS] * inst_base / dh_monthly[C.WORK_DAYS] /
                                      dh_monthly[C.AVG_AMT]) * 100
 
-        # 如果没有利息，则加权利率和套息收入均为0，该代码是解决除数为0的情况
-        dh_monthly.loc[dh_monthly[C.INST_DAYS] == 0, [C.WEIGHT_RATE, C.INST_GROUP]] = 0.0
-        # 重置为0，方便下面的计算
-        dh_monthly.loc[:, C.INST_GROUP] = 0.0
+        # 如果没有利息，则加权利率为0，该代码是解决除数为0的情况
+        dh_monthly.loc[dh_monthly[C.INST_DAYS] == 0, C.WEIGHT_RATE] = 0.0
 
+        # 套息基数，只有资金融入才计算套息收入
+        dh_monthly[C.CARRY_BASE] = 0.0
         if self.d == 4:
-            # 计算套息收入
-            dh_monthly[C.INST_GROUP] = (dh_monthly[C.AVG_AMT] * (mark_rate - dh_monthly[C.WEIGHT_RATE]) /
-                                        100 * dh_monthly.index.days_in_month / inst_base)
+            dh_monthly[C.CARRY_BASE] = dh_monthly[C.AVG_AMT] * dh_monthly[C.WORK_DAYS] / inst_base / 100
 
-        last_row = dh_monthly.iloc[-1]
-        current_date = datetime.now()
+        dh_monthly[C.TX_TYPE] = ''
 
-        # 如果是当前年，则要对最后一行的日均余额进行处理，否则会以最后一个月的所有天数计算
-        if last_row.name.year == current_date.year and last_row.name.month == current_date.month:
-            # Calculate the number of days from the start of the month to the previous day
-            start_of_month = datetime(current_date.year, current_date.month, 1)
+        dh_monthly = dh_monthly[[C.TX_TYPE, C.AVG_AMT, C.INST_DAYS, C.WEIGHT_RATE, C.WORK_DAYS,
+                                 C.CARRY_BASE]].rename_axis(C.DATE)
 
-            # 重新按实际统计天数计算相关列
-            # 计算日均余额
-            days_interval = ((current_date - timedelta(days=1)).day - start_of_month.day + 1)
-            avg_amt = dh_monthly.columns.get_loc(C.AVG_AMT)
-            dh_monthly.iloc[-1, avg_amt] = dh_monthly.iloc[-1, avg_amt] / days_interval
+        return dh_monthly
 
-            # 计算加权利率
-            if dh_monthly.iloc[-1, avg_amt] != 0:
-                dh_monthly.iloc[-1, dh_monthly.columns.get_loc(C.WEIGHT_RATE)] = \
-                    ((dh_monthly.iloc[-1][C.INST_DAYS] * inst_base / days_interval /
-                      dh_monthly.iloc.iloc[-1, avg_amt]) * 100)
+    @staticmethod
+    def carry_income(monthly: pd.DataFrame, mark_rates: List[float]) -> pd.DataFrame:
+        """
+        按一组基准利率一次性计算各月的套息收入，无需重新生成交易数据
 
-            # 计算套息收入
-            if self.d == 4:
-                dh_monthly[C.INST_GROUP] = \
-                    (dh_monthly[C.AVG_AMT] * (mark_rate - dh_monthly[C.WEIGHT_RATE]) / 100 * days_interval / inst_base)
+        :param monthly: get_monthly_base或get_monthly_summary的结果，需包含[C.WEIGHT_RATE, C.CARRY_BASE]
+        :param mark_rates: 基准利率（%）的列表
+        :return: 以C.DATE为索引，每个基准利率为一列的套息收入
+        """
 
-        dh_monthly[C.TX_TYPE] = ''
+        rates = np.asarray(mark_rates, dtype=float)
+        carry_base = monthly[C.CARRY_BASE].to_numpy(dtype=float)
+        weight_rate = monthly[C.WEIGHT_RATE].to_numpy(dtype=float)
 
-        dh_monthly = dh_monthly[[C.TX_TYPE, C.AVG_AMT, C.INST_DAYS, C.INST_GROUP, C.WEIGHT_RATE]].rename_axis(C.DATE)
+        carry = carry_base[:, None] * (rates[None, :] - weight_rate[:, None])
 
-        return dh_monthly
+        return pd.DataFrame(carry, index=monthly.index, columns=rates)
+
+    def get_monthly_summary(self, mark_rate: float = 0, direct: bool = False, moment: datetime = None) -> pd.DataFrame:
+        """
+        按月度分组，返回月度统计数据
+
+        注意：内部对象FundTx的统计截至时间为当前时间的前一天
+
+        :param mark_rate: 用于计算套息的基准利率
+        :param direct: 为True时用FundTx.monthly_data按交易区间直接计算月度数据，不展开为每日数据
+        :param moment: 基准时间，默认为当前时间
+        :return: [C.DATE, C.TYPE, C.AVG_AMT, C.INST_DAYS, C.INST_GROUP, C.WEIGHT_RATE, C.WORK_DAYS, C.CARRY_BASE]
+        """
+
+        dh_monthly = self.get_monthly_base(direct, moment)
+
+        # 计算套息收入
+        dh_monthly[C.INST_GROUP] = self.carry_income(dh_monthly, [mark_rate]).iloc[:, 0]
+
+        return dh_monthly[[C.TX_TYPE, C.AVG_AMT, C.INST_DAYS, C.INST_GROUP, C.WEIGHT_RATE, C.WORK_DAYS,
+                           C.CARRY_BASE]]
 
 
 class SecurityDataHandler:
@@ -388,7 +472,10 @@ class SecurityDataHandler:
             txn : 固收交易对象
         """
         self.tx = txn
-        self.raw = self.tx.get_all_profit_data()
+
+        with profile_stage('SecurityTx.get_all_profit_data') as stage:
+            self.raw = self.tx.get_all_profit_data()
+            stage.frame(raw=self.raw)
         # self.yield_all = self.period_yield_all()
 
         # 利率债的sectype
@@ -468,12 +555,13 @@ class SecurityDataHandler:
 
         return all_trades
 
-    def get_monthly_summary(self) -> pd.DataFrame:
+    def get_monthly_summary(self, moment: datetime = None) -> pd.DataFrame:
         """
         按月度分组，返回统计数据，用于“主页”显示
 
         注意：内部对象FundTx的统计截至时间为当前时间的前一天
 
+        :param moment: 基准时间，默认为当前时间
         :return: df[C.DATE, C.AVG_AMT, C.INST_DAYS, C.CAPITAL_GAINS, C.WEIGHT_RATE]，这里的收益率是不含净价浮盈的
         """
 
@@ -482,7 +570,7 @@ class SecurityDataHandler:
 
         dh = self.period_yield_all_cum(start_time, end_time)
         if dh.empty:
-            months = TimeUtil.get_months_feday(start_time.year)
+            months = TimeUtil.get_months_feday(start_time.year, moment)
 
             # 生成一个包含每个月最后一天的日期索引的DataFrame
             dates = pd.to_datetime([end for _, end in months])
@@ -509,13 +597,14 @@ class SecurityDataHandler:
         dh_monthly.loc[(dh_monthly[C.INST_A_DAY] + dh_monthly[C.CAPITAL_GAINS]) == 0, C.WEIGHT_RATE] = 0
 
         last_row = dh_monthly.iloc[-1]
-        current_date = datetime.now()
+        current_date = moment if moment is not None else datetime.now()
 
         # 如果是当前年，则要对最后一行的日均余额进行处理，否则会统计最后一个月的所有天数
         if last_row.name.year == current_date.year and last_row.name.month == current_date.month:
-            # Calculate the number of days from the start of the month to the previous day
-            start_of_month = datetime(current_date.year, current_date.month, 1)
-            days_interval = ((current_date - timedelta(days=1)).day - start_of_month.day + 1)
+            # 统计窗口在最后一个月内的天数，当前月只统计到截止日
+            end_of_window = pd.Timestamp(end_time)
+            start_of_month = max(pd.Timestamp(start_time), end_of_window.replace(day=1))
+            days_interval = (end_of_window - start_of_month).days + 1
 
             avg_amt = dh_monthly.columns.get_loc(C.AVG_AMT)
             dh_monthly.iloc[-1, avg_amt] = dh_monthly.iloc[-1, avg_amt] / days_interval
@@ -605,26 +694,29 @@ class SecurityDataHandler:
         bonds_info = self.tx.holded_bonds_info
         bond_list = []
 
-        # 对每一种分组类型进行计算
-        for one_type in set(bonds_info[by_type].tolist()):
-            bond = self.raw[self.raw[by_type] == one_type]
+        # 对每一种分组类型进行计算，所有分组在性能分析中合计为一个阶段
+        types = set(bonds_info[by_type].tolist())
+        with profile_stage(f"cal_period_yield_cum by {by_type} ({len(types)} groups)"):
+            for one_type in types:
+                bond = self.raw[self.raw[by_type] == one_type]
 
-            # with pd.option_context('display.max_rows', None, 'display.max_columns', None):
-            #     print(bond)
+                # with pd.option_context('display.max_rows', None, 'display.max_columns', None):
+                #     print(bond)
 
-            # 对于需要计算的固定列，使用 sum 汇总
-            fixed_columns = [C.HOLD_AMT, C.CAPITAL_OCCUPY, C.CAPITAL_GAINS, C.INST_A_DAY, C.NET_PROFIT, C.TOTAL_PROFIT]
-            # 对于动态列，取第一行的值
-            dynamic_columns = [col for col in bond.columns if col not in fixed_columns + [C.DATE]]
+                # 对于需要计算的固定列，使用 sum 汇总
+                fixed_columns = [C.HOLD_AMT, C.CAPITAL_OCCUPY, C.CAPITAL_GAINS, C.INST_A_DAY, C.NET_PROFIT,
+                                 C.TOTAL_PROFIT]
+                # 对于动态列，取第一行的值
+                dynamic_columns = [col for col in bond.columns if col not in fixed_columns + [C.DATE]]
 
-            # 构建agg函数字典
-            agg_dict = {col: 'sum' for col in fixed_columns}  # 固定列使用 sum 汇总
-            agg_dict.update({col: 'first' for col in dynamic_columns})  # 动态列取 first
+                # 构建agg函数字典
+                agg_dict = {col: 'sum' for col in fixed_columns}  # 固定列使用 sum 汇总
+                agg_dict.update({col: 'first' for col in dynamic_columns})  # 动态列取 first
 
-            # 重要：由于_cal_daily_yield_cum要求日期项不能重复，先用groupby按日期聚合
-            bond = bond.groupby(C.DATE).agg(agg_dict)
-            # 分组数据计算后形成列表
-            bond_list.append(self.cal_period_yield_cum(bond, start_time, end_time))
+                # 重要：由于_cal_daily_yield_cum要求日期项不能重复，先用groupby按日期聚合
+                bond = bond.groupby(C.DATE).agg(agg_dict)
+                # 分组数据计算后形成列表
+                bond_list.append(self.cal_period_yield_cum(bond, start_time, end_time))
 
         # with pd.option_context('display.max_rows', None, 'display.max_columns', None):
         #     print(bond_list)
@@ -694,7 +786,11 @@ class SecurityDataHandler:
             C.WORK_DAYS, C.YIELD_CUM]
         """
 
-        return self.cal_period_yield_cum(self.daily_yield_all(), start_time, end_time)
+        with profile_stage('cal_period_yield_cum (all)') as stage:
+            data = self.cal_period_yield_cum(self.daily_yield_all(), start_time, end_time)
+            stage.frame(result=data)
+
+        return data
 
     def period_yield_inst_cum(self, start_time: datetime.date, end_time: datetime.date) -> pd.DataFrame:
 
@@ -717,7 +813,11 @@ class SecurityDataHandler:
             C.WORK_DAYS, C.YIELD_CUM]
         """
 
-        return self.cal_period_yield_cum(self.daily_yield_inst_rate_bond(), start_time, end_time)
+        with profile_stage('cal_period_yield_cum (inst)') as stage:
+            data = self.cal_period_yield_cum(self.daily_yield_inst_rate_bond(), start_time, end_time)
+            stage.frame(result=data)
+
+        return data
 
     def period_yield_credit_cum(self, start_time: datetime.date, end_time: datetime.date) -> pd.DataFrame:
 
@@ -740,7 +840,11 @@ class SecurityDataHandler:
             C.WORK_DAYS, C.YIELD_CUM]
         """
 
-        return self.cal_period_yield_cum(self.daily_yield_credit_bond(), start_time, end_time)
+        with profile_stage('cal_period_yield_cum (credit)') as stage:
+            data = self.cal_period_yield_cum(self.daily_yield_credit_bond(), start_time, end_time)
+            stage.frame(result=data)
+
+        return data
 
     # 1.1 保留单日收益率计算，留以后结合负债做收益计算
     @staticmethod
@@ -936,10 +1040,14 @@ class OverviewDataHandler:
     主要用于主页的环比，同比统计
     """
 
-    def __init__(self, year_num: int):
+    def __init__(self, year_num: int, store: MonthlySummaryStore = None, direct_monthly: bool = False,
+                 moment: datetime = None):
         """
         构造函数
         :param year_num: 年份
+        :param store: 已结束月份的月度统计数据存储，为None时每次都从交易数据重新计算
+        :param direct_monthly: 为True时资金交易的月度数据按交易区间直接计算，不展开为每日数据
+        :param moment: 确定统计区间的基准时间，默认为当前时间；回放记录的查询时应与记录时相同
         """
 
         self.tx_data_dict = {
@@ -952,6 +1060,9 @@ class OverviewDataHandler:
         }
 
         self.y = year_num
+        self.store = store
+        self.direct_monthly = direct_monthly
+        self.moment = moment
 
     def fund_monthly_report_yoy(self, tx_type: Union[C.REPO, C.REPL, C.IBO, C.IBL], mark_rate: float = 0,
                                 mark_rate_p: float = 0) -> pd.DataFrame:
@@ -974,22 +1085,25 @@ class OverviewDataHandler:
             return self.tx_data_dict[tx_type]
 
         current = self.fund_monthly_report(tx_type, mark_rate)
-        self.y -= 1
+        previous = self.fund_monthly_report(tx_type, mark_rate_p, self.y - 1)
 
-        # print(current)
+        merged_df = self.merge_fund_yoy(current, previous)
+        self.tx_data_dict[tx_type] = merged_df
 
-        previous = self.fund_monthly_report(tx_type, mark_rate_p)
-        self.y += 1
+        return merged_df
 
-        # print(previous)
+    @staticmethod
+    def merge_fund_yoy(current: pd.DataFrame, previous: pd.DataFrame) -> pd.DataFrame:
+        """
+        按月份合并资金交易当年和前一年的月度报告，并计算利息的同比。
 
-        # current_cols = current.columns.drop(C.TX_TYPE)
+        Args:
+            current (pd.DataFrame): 当年的月度报告，由fund_monthly_report生成。
+            previous (pd.DataFrame): 前一年的月度报告，由fund_monthly_report生成。
 
-        # 如果任意一个为空，则添加列后返回
-        # if current.empty or previous.empty:
-        #     cols = [col + '_P' for col in current.columns]
-        #     current.loc[:, cols] = 0
-        #     return current
+        Returns:
+            pd.DataFrame: [C.DATE, C.AVG_AMT, C.INST_DAYS, C.INST_GROUP, C.WEIGHT_RATE, C.TX_TYPE, [前面数值列名+'_P']]
+        """
 
         # 创建包含月份的列，以便按月份进行匹配
         current['Month'] = current.index.month
@@ -1002,25 +1116,16 @@ class OverviewDataHandler:
 
         merged_df.drop(columns=[C.TX_TYPE + '_P'], inplace=True)
 
-        # for col in current_cols:
-        #     # print(col)
-        #     merged_df[col + C.YOY] = ((merged_df[col] - merged_df[col + '_P']) /
-        #                               merged_df[col + '_P'] * 100)
-
         mask = merged_df[C.INST_DAYS + '_P'] != 0
         merged_df[C.INST_DAYS + C.YOY] = 0.0
         merged_df.loc[mask, C.INST_DAYS + C.YOY] = ((merged_df.loc[mask, C.INST_DAYS] -
                                                      merged_df.loc[mask, C.INST_DAYS + '_P']) /
                                                     merged_df.loc[mask, C.INST_DAYS + '_P'] * 100)
 
-        # merged_df[C.TOTAL_PROFIT] = merged_df[C.INST_DAYS]
-
-        self.tx_data_dict[tx_type] = merged_df
-
         return merged_df
 
     def fund_monthly_report(self, tx_type: Union[C.REPO, C.REPL, C.IBO, C.IBL],
-                            mark_rate: float = 0) -> pd.DataFrame:
+                            mark_rate: float = 0, year_num: int = None) -> pd.DataFrame:
         """
         生成资金交易的月度报告。
 
@@ -1029,6 +1134,7 @@ class OverviewDataHandler:
         Args:
             tx_type (str): 四种类型C.REPO, C.REPL, C.IBO, C.IBL。。
             mark_rate (float, optional): 用于计算套利收入的基准利率，默认为 0。
+            year_num (int, optional): 统计年份，默认为self.y。
 
         Returns:
             pd.DataFrame: 包含月度汇总报告的 Dict，列包括:
@@ -1038,29 +1144,30 @@ class OverviewDataHandler:
         if tx_type not in [C.REPO, C.REPL, C.IBO, C.IBL]:
             return pd.DataFrame({})
 
-        months = TimeUtil.get_months_feday(self.y)
+        year_num = self.y if year_num is None else year_num
+        months = TimeUtil.get_months_feday(year_num, self.moment)
 
-        start_time = months[0][0]
-        end_time = months[-1][1]
+        def build(start_time: datetime.date, end_time: datetime.date) -> pd.DataFrame:
+            tx_hl = None
 
-        tx_hl = None
+            if tx_type in [C.REPO, C.REPL]:
+                tx_hl = FundDataHandler(TxFactory(Repo).create_txn(start_time, end_time))
 
-        if tx_type in [C.REPO, C.REPL]:
-            tx_hl = FundDataHandler(TxFactory(Repo).create_txn(start_time, end_time))
+            if tx_type in [C.IBO, C.IBL]:
+                tx_hl = FundDataHandler(TxFactory(IBO).create_txn(start_time, end_time))
 
-        if tx_type in [C.IBO, C.IBL]:
-            tx_hl = FundDataHandler(TxFactory(IBO).create_txn(start_time, end_time))
+            tx_hl.set_direction(tx_type)
 
-        tx_hl.set_direction(tx_type)
+            return tx_hl.get_monthly_summary(mark_rate, self.direct_monthly, self.moment)
 
-        tx_data = tx_hl.get_monthly_summary(mark_rate)
-        tx_data[C.TX_TYPE] = tx_type
+        # 只有资金融入的套息收入与基准利率有关
+        rate = mark_rate if tx_type in [C.REPO, C.IBO] else None
 
-        return tx_data
+        return self._monthly_report(tx_type, year_num, months, build, rate)
 
     # def create_fundtx(self, direction: str) -> None:
 
-    def security_monthly_report(self, tx_type: Union[C.BOND, C.CD]) -> pd.DataFrame:
+    def security_monthly_report(self, tx_type: Union[C.BOND, C.CD], year_num: int = None) -> pd.DataFrame:
         """
         生成固收交易的月度报告。
 
@@ -1068,15 +1175,12 @@ class OverviewDataHandler:
 
         Args:
             txn_type (str): 交易类型，C.BOND或C.CD。
+            year_num (int, optional): 统计年份，默认为self.y。
 
         Returns:
             pd.DataFrame: 包含月度汇总报告的 DataFrame，列包括:
                           [C.DATE, C.AVG_AMT, C.INST_DAYS, C.CAPITAL_GAINS, C.WEIGHT_RATE]，收益率是不含净价浮盈的
         """
-        months = TimeUtil.get_months_feday(self.y)
-        start_time = months[0][0]
-        end_time = months[-1][1]
-
         if tx_type == C.BOND:
             txn_type = BondTx
         elif tx_type == C.CD:
@@ -1084,12 +1188,101 @@ class OverviewDataHandler:
         else:
             return pd.DataFrame({})
 
-        txn_data = SecurityDataHandler(txn_type(start_time, end_time)).get_monthly_summary()
-        txn_data[C.TX_TYPE] = tx_type
+        year_num = self.y if year_num is None else year_num
+        months = TimeUtil.get_months_feday(year_num, self.moment)
+
+        def build(start_time: datetime.date, end_time: datetime.date) -> pd.DataFrame:
+            return SecurityDataHandler(txn_type(start_time, end_time)).get_monthly_summary(self.moment)
+
+        return self._monthly_report(tx_type, year_num, months, build)
+
+    def _monthly_report(self, tx_type: str, year_num: int, months: List[Tuple[date, date]],
+                        build: Callable[[date, date], pd.DataFrame], mark_rate: float = None) -> pd.DataFrame:
+        """
+        生成某类业务某年的月度报告。
+
+        如果设置了self.store，已结束的月份从存储中读取，只重新计算缺失的月份（通常只有当前未结束的月份），
+        计算结果中已结束的月份写回存储。
+
+        Args:
+            tx_type (str): 交易类型。
+            year_num (int): 统计年份。
+            months (List[Tuple[date, date]]): 该年各月的起止日期，由TimeUtil.get_months_feday生成。
+            build (Callable[[date, date], pd.DataFrame]): 按起止日期计算月度统计数据的函数。
+            mark_rate (float, optional): 套息收入的基准利率，不为None时按该利率重新计算C.INST_GROUP。
+
+        Returns:
+            pd.DataFrame: 以C.DATE为索引的月度统计数据，包含C.TX_TYPE列。
+        """
 
-        # txn_data.index.name = C.DATE
+        if self.store is None:
+            tx_data = build(months[0][0], months[-1][1])
+            tx_data[C.TX_TYPE] = tx_type
 
-        return txn_data
+            return tx_data
+
+        month_nums = [start.month for start, _ in months]
+
+        stored = self.store.load(tx_type, year_num)
+        if not stored.empty:
+            stored = stored.loc[stored.index.month.isin(month_nums)]
+
+            # 旧格式的数据没有套息基数，无法按基准利率重新计算，视为缺失
+            if mark_rate is not None and C.CARRY_BASE not in stored.columns:
+                stored = pd.DataFrame({})
+
+        missing = [(start, end) for start, end in months if stored.empty or start.month not in stored.index.month]
+
+        if not missing:
+            return self._apply_carry(stored, mark_rate)
+
+        # 缺失的月份按一个连续区间计算，再取出缺失的月份
+        fresh = build(missing[0][0], missing[-1][1])
+        fresh = fresh.loc[fresh.index.month.isin([start.month for start, _ in missing])]
+        fresh[C.TX_TYPE] = tx_type
+
+        # 只保存在计算区间内已结束的月份，按过去的基准时间计算时，基准时间所在的月份不完整
+        self.store.save(tx_type, year_num, fresh, missing[-1][1])
+
+        tx_data = fresh if stored.empty else pd.concat([stored, fresh]).sort_index()
+
+        return self._apply_carry(tx_data, mark_rate)
+
+    @staticmethod
+    def _apply_carry(tx_data: pd.DataFrame, mark_rate: float = None) -> pd.DataFrame:
+        """
+        按基准利率重新计算套息收入C.INST_GROUP。存储中的套息收入可能是按其他基准利率计算的，
+        而C.CARRY_BASE和C.WEIGHT_RATE与基准利率无关。
+
+        Args:
+            tx_data (pd.DataFrame): 资金交易的月度统计数据。
+            mark_rate (float, optional): 基准利率，为None时不做处理。
+
+        Returns:
+            pd.DataFrame: tx_data。
+        """
+
+        if mark_rate is not None and not tx_data.empty:
+            tx_data[C.INST_GROUP] = FundDataHandler.carry_income(tx_data, [mark_rate]).iloc[:, 0]
+
+        return tx_data
+
+    def carry_sensitivity(self, tx_type: Union[C.REPO, C.IBO], mark_rates: List[float]) -> pd.DataFrame:
+        """
+        按一组基准利率测算year_num年各月的套息收入，使用已生成的月度报告，不重新生成交易数据。
+
+        Args:
+            tx_type (str): C.REPO或C.IBO。
+            mark_rates (List[float]): 基准利率（%）的列表。
+
+        Returns:
+            pd.DataFrame: 以C.DATE为索引，每个基准利率为一列的套息收入。
+        """
+
+        if self.tx_data_dict[tx_type].empty:
+            self.fund_monthly_report_yoy(tx_type)
+
+        return FundDataHandler.carry_income(self.tx_data_dict[tx_type], mark_rates)
 
     def security_monthly_report_yoy(self, tx_type: Union[C.BOND, C.CD]) -> pd.DataFrame:
         """
@@ -1107,18 +1300,25 @@ class OverviewDataHandler:
             return self.tx_data_dict[tx_type]
 
         current = self.security_monthly_report(tx_type)
-        self.y -= 1
+        previous = self.security_monthly_report(tx_type, self.y - 1)
 
-        # print(current)
+        merged_df = self.merge_security_yoy(current, previous)
+        self.tx_data_dict[tx_type] = merged_df
 
-        previous = self.security_monthly_report(tx_type)
-        self.y += 1
+        return merged_df
+
+    @staticmethod
+    def merge_security_yoy(current: pd.DataFrame, previous: pd.DataFrame) -> pd.DataFrame:
+        """
+        按月份合并固收交易当年和前一年的月度报告，并计算总收益的同比和收益率的变动。
+
+        Args:
+            current (pd.DataFrame): 当年的月度报告，由security_monthly_report生成。
+            previous (pd.DataFrame): 前一年的月度报告，由security_monthly_report生成。
 
-        # 如果任意一个为空，则添加列后返回
-        # if current.empty or previous.empty:
-        #     cols = [col + '_P' for col in current.columns]
-        #     current.loc[:, cols] = 0
-        #     return current
+        Returns:
+            pd.DataFrame: [C.DATE, C.AVG_AMT, C.INST_DAYS, C.CAPITAL_GAINS, C.WEIGHT_RATE,C.TX_TYPE, [前面数值列名+'_P']]
+        """
 
         # 创建包含月份的列，以便按月份进行匹配
         current['Month'] = current.index.month
@@ -1131,11 +1331,6 @@ class OverviewDataHandler:
 
         merged_df.drop(columns=[C.TX_TYPE + '_P'], inplace=True)
 
-        # for col in current_cols:
-        #     # print(col)
-        #     merged_df[col + C.YOY] = ((merged_df[col] - merged_df[col + '_P']) /
-        #                               merged_df[col + '_P'] * 100)
-
         merged_df[C.TOTAL_PROFIT] = merged_df[C.INST_DAYS] + merged_df[C.CAPITAL_GAINS]
         merged_df[C.TOTAL_PROFIT + '_P'] = merged_df[C.INST_DAYS + '_P'] + merged_df[C.CAPITAL_GAINS + '_P']
 
@@ -1147,10 +1342,68 @@ class OverviewDataHandler:
 
         merged_df[C.WEIGHT_RATE + '_SUB'] = (merged_df[C.WEIGHT_RATE] - merged_df[C.WEIGHT_RATE + '_P']) * 100
 
-        self.tx_data_dict[tx_type] = merged_df
-
         return merged_df
 
+    def all_reports_yoy(self, mark_rate: float = 0, mark_rate_p: float = 0, max_workers: int = 6,
+                        executor: str = 'thread') -> Dict[str, pd.DataFrame]:
+        """
+        并行生成6类业务year_num年和前一年的月度报告，合并后写入self.tx_data_dict。
+
+        12个报告（6类业务 × 2年）相互独立，分别提交到线程池或进程池中执行，页面总耗时接近最慢的单个报告。
+        在Streamlit页面中运行时，线程池的worker使用页面脚本的ScriptRunContext，与页面共用连接和缓存；
+        子进程中没有Streamlit运行时，此时不使用进程池，改用线程池。
+        基准利率只作用于资金融入（C.REPO, C.IBO）的套息收入，与fund_monthly_report_yoy的调用方式一致。
+
+        Args:
+            mark_rate (float, optional): 基准年份的测算利率，默认为 0。
+            mark_rate_p (float, optional): 基准年份前一年的测算利率，默认为 0。
+            max_workers (int, optional): 并行的worker数量，默认为 6，为1时按顺序执行。
+            executor (str, optional): 'thread'使用线程池，'process'使用进程池，默认为'thread'。
+
+        Returns:
+            Dict[str, pd.DataFrame]: self.tx_data_dict，key为交易类型，value同fund_monthly_report_yoy和
+            security_monthly_report_yoy的返回值。
+        """
+
+        if executor not in ['thread', 'process']:
+            raise ValueError("executor must be 'thread' or 'process'.")
+
+        # 已生成的报告不再重复计算
+        pending = [tx_type for tx_type, df in self.tx_data_dict.items() if df.empty]
+
+        tasks = []
+        for tx_type in pending:
+            current_rate, previous_rate = (mark_rate, mark_rate_p) if tx_type in [C.REPO, C.IBO] else (0, 0)
+            tasks.append((tx_type, self.y, current_rate, self.store, self.direct_monthly, self.moment))
+            tasks.append((tx_type, self.y - 1, previous_rate, self.store, self.direct_monthly, self.moment))
+
+        if executor == 'process' and st.runtime.exists():
+            executor = 'thread'
+
+        if max_workers <= 1:
+            reports = [_monthly_report_task(*task) for task in tasks]
+        else:
+            if executor == 'thread':
+                # 没有ScriptRunContext的线程调用st.connection和st.cache_*时会告警
+                ctx = get_script_run_ctx(suppress_warning=True)
+                pool = ThreadPoolExecutor(max_workers=max_workers, initializer=add_script_run_ctx, initargs=(None, ctx))
+            else:
+                pool = ProcessPoolExecutor(max_workers=max_workers)
+            with pool as ex:
+                futures = [ex.submit(_monthly_report_task, *task) for task in tasks]
+                reports = [future.result() for future in futures]
+
+        # 任务按[当年, 前一年]成对提交，按顺序取出合并
+        for i, tx_type in enumerate(pending):
+            current, previous = reports[2 * i], reports[2 * i + 1]
+
+            if tx_type in [C.REPO, C.REPL, C.IBO, C.IBL]:
+                self.tx_data_dict[tx_type] = self.merge_fund_yoy(current, previous)
+            else:
+                self.tx_data_dict[tx_type] = self.merge_security_yoy(current, previous)
+
+        return self.tx_data_dict
+
     def asset_debt_data(self) -> pd.DataFrame:
         """
         生成资产负债的收入或支出数据
@@ -1188,6 +1441,35 @@ class OverviewDataHandler:
         return data
 
 
+def _monthly_report_task(tx_type: str, year_num: int, mark_rate: float = 0, store: MonthlySummaryStore = None,
+                         direct_monthly: bool = False, moment: datetime = None) -> pd.DataFrame:
+    """
+    生成单个业务单个年份的月度报告，供OverviewDataHandler.all_reports_yoy提交到线程池或进程池。
+
+    定义在模块层级，以便进程池可以序列化。
+
+    Args:
+        tx_type (str): 交易类型，C.REPO, C.REPL, C.IBO, C.IBL, C.BOND或C.CD。
+        year_num (int): 统计年份。
+        mark_rate (float, optional): 用于计算套利收入的基准利率，默认为 0。
+        store (MonthlySummaryStore, optional): 已结束月份的月度统计数据存储。
+        direct_monthly (bool, optional): 资金交易的月度数据是否按交易区间直接计算。
+        moment (datetime, optional): 确定统计区间的基准时间，默认为当前时间。
+
+    Returns:
+        pd.DataFrame: 同fund_monthly_report或security_monthly_report的返回值。
+    """
+
+    overview = OverviewDataHandler(year_num, store, direct_monthly, moment)
+
+    if tx_type in [C.REPO, C.REPL, C.IBO, C.IBL]:
+        return overview.fund_monthly_report(tx_type, mark_rate)
+    elif tx_type in [C.BOND, C.CD]:
+        return overview.security_monthly_report(tx_type)
+    else:
+        raise ValueError('Unknown tx_type')
+
+
 if __name__ == '__main__':
     # dh = fundtx_monthly_report(2023, IBO, '同业拆入', 2)
     # dh = security_monthly_report(2023, BondTx)
@@ -424,3 +424,68 @@ def main_page_all_profit(df: pd.DataFrame):
     )
 
     return c
+
+
+def profile_waterfall(stages: pd.DataFrame) -> Bar:
+    """
+    性能分析的瀑布图，每个阶段一行，横轴为时间（秒），透明的柱体为阶段的开始时间，实际柱体为阶段的耗时。
+
+    :param stages: StageProfiler.to_frame()的结果
+    """
+    # 按开始时间从上到下排列，嵌套的阶段按层级缩进
+    stages = stages.iloc[::-1]
+    y_data = [f"{'  ' * depth}{i}. {name}" for i, (depth, name) in
+              zip(range(len(stages), 0, -1), stages[['depth', 'stage']].values.tolist())]
+
+    bar = (
+        Bar()
+        .add_xaxis(y_data)
+        .add_yaxis("开始",
+                   stages['start'].apply(lambda x: '%.3f' % x).values.tolist(),
+                   stack="waterfall",
+                   itemstyle_opts=opts.ItemStyleOpts(color="rgba(0, 0, 0, 0)"),
+                   label_opts=opts.LabelOpts(is_show=False))
+        .add_yaxis("耗时（秒）",
+                   stages['seconds'].apply(lambda x: '%.3f' % x).values.tolist(),
+                   stack="waterfall",
+                   color="#37a2da",
+                   label_opts=opts.LabelOpts(position="right"))
+        .reversal_axis()
+        .set_global_opts(
+            tooltip_opts=opts.TooltipOpts(is_show=True, trigger="axis", axis_pointer_type="shadow"),
+            legend_opts=opts.LegendOpts(is_show=False),
+            xaxis_opts=opts.AxisOpts(name="秒"),
+            yaxis_opts=opts.AxisOpts(axislabel_opts=opts.LabelOpts(font_size=10)),
+            datazoom_opts=[opts.DataZoomOpts(type_="inside", orient="vertical")],
+        )
+    )
+
+    return bar
+
+
+def profile_memory_bar(stages: pd.DataFrame) -> Bar:
+    """
+    性能分析中各阶段的内存峰值增量和产生的DataFrame的内存占用（MB）。
+
+    :param stages: StageProfiler.to_frame()的结果
+    """
+    stages = stages.iloc[::-1]
+    y_data = [f"{i}. {name}" for i, name in zip(range(len(stages), 0, -1), stages['stage'].tolist())]
+
+    bar = (
+        Bar()
+        .add_xaxis(y_data)
+        .add_yaxis("内存峰值增量（MB）", stages['peak_mb'].apply(lambda x: '%.2f' % x).values.tolist(),
+                   color="#e06343")
+        .add_yaxis("DataFrame占用（MB）", stages['frames_mb'].apply(lambda x: '%.2f' % x).values.tolist(),
+                   color="#37a2da")
+        .reversal_axis()
+        .set_series_opts(label_opts=opts.LabelOpts(position="right"))
+        .set_global_opts(
+            tooltip_opts=opts.TooltipOpts(is_show=True, trigger="axis", axis_pointer_type="shadow"),
+            xaxis_opts=opts.AxisOpts(name="MB"),
+            yaxis_opts=opts.AxisOpts(axislabel_opts=opts.LabelOpts(font_size=10)),
+        )
+    )
+
+    return bar